@@ -0,0 +1,494 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Benchmarks of the rubisco hot paths.
+Run `python -m rubisco.bench --help` for usage. The results are printed as
+JSON, and can be compared with a saved baseline to catch regressions.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from rubisco.config import APP_VERSION, DEFAULT_CHARSET, USER_REPO_CONFIG
+from rubisco.kernel.project_config import _load_config, load_project_config
+from rubisco.kernel.workflow import Workflow, compile_workflow
+from rubisco.lib.fileutil import copy_recursive, rm_recursive
+from rubisco.lib.variable import (AutoFormatDict, format_str, pop_variables,
+                                  push_variables)
+from rubisco.shared.ktrigger import (IKernelTrigger, bind_ktrigger_interface,
+                                     call_ktrigger, ktriggers)
+
+__all__ = [
+    "Timer",
+    "benchmark",
+    "benchmarks",
+    "run_benchmarks",
+    "compare_results",
+]
+
+
+class Timer:
+    """Accumulate the time spent in `with` blocks."""
+
+    elapsed: float
+
+    def __init__(self) -> None:
+        self.elapsed = 0.0
+        self._start = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.elapsed += time.perf_counter() - self._start
+
+
+# Benchmark's name -> (function, unit). The function prepares its data in
+# the current directory (a temporary directory), measures the hot path with
+# the timer, and returns the number of processed units.
+BenchmarkFunc = Callable[[Timer, float], int]
+benchmarks: dict[str, tuple[BenchmarkFunc, str]] = {}
+
+
+def benchmark(name: str, unit: str) -> Callable[[BenchmarkFunc], Any]:
+    """Register a benchmark.
+
+    Args:
+        name (str): The benchmark name.
+        unit (str): The unit of the returned count. e.g. "calls", "bytes".
+
+    Returns:
+        Callable[[BenchmarkFunc], Any]: The decorator.
+    """
+
+    def _decorator(func: BenchmarkFunc) -> BenchmarkFunc:
+        benchmarks[name] = (func, unit)
+        return func
+
+    return _decorator
+
+
+def _make_tree(root: Path, count: int, size: int) -> int:
+    """Create a tree of small compressible files.
+
+    Args:
+        root (Path): The tree root.
+        count (int): The number of files.
+        size (int): The size of each file.
+
+    Returns:
+        int: The total size.
+    """
+
+    for idx in range(count):
+        sub = root / f"dir{idx % 16}"
+        sub.mkdir(parents=True, exist_ok=True)
+        line = f"{idx:08d} rubisco benchmark data.\n".encode(DEFAULT_CHARSET)
+        data = (line * (size // len(line) + 1))[:size]
+        (sub / f"file{idx}.txt").write_bytes(data)
+    return count * size
+
+
+@benchmark("variable.format_str", "calls")
+def bench_format_str(timer: Timer, scale: float) -> int:
+    """Format templates with global and extra variables."""
+
+    count = int(20000 * scale)
+    templates = [
+        f"${{{{ bench.root }}}}/build-{idx}/${{{{ bench.name }}}}.o"
+        for idx in range(100)
+    ]
+    push_variables("bench.root", "/tmp/project")
+    push_variables("bench.name", "main")
+    try:
+        with timer:
+            for idx in range(count):
+                format_str(templates[idx % 100], fmt={"unused": "value"})
+    finally:
+        pop_variables("bench.root")
+        pop_variables("bench.name")
+    return count
+
+
+@benchmark("variable.AutoFormatDict", "gets")
+def bench_auto_format_dict(timer: Timer, scale: float) -> int:
+    """Get formatted values from a nested AutoFormatDict."""
+
+    keys = int(1000 * scale)
+    data = AutoFormatDict(
+        {
+            f"key{idx}": {"path": f"${{{{ bench.root }}}}/{idx}", "n": idx}
+            for idx in range(keys)
+        },
+    )
+    push_variables("bench.root", "/tmp/project")
+    try:
+        with timer:
+            for _round in range(10):
+                for idx in range(keys):
+                    item = data.get(f"key{idx}", valtype=dict)
+                    item.get("path", valtype=str)
+                    item.get("n", valtype=int)
+    finally:
+        pop_variables("bench.root")
+    return keys * 10 * 3
+
+
+def _hooks(prefix: str, count: int) -> dict[str, Any]:
+    return {
+        f"{prefix}{idx}": {
+            "vars": {"target": f"{prefix}{idx}"},
+            "exec": "echo ${{ target }}",
+        }
+        for idx in range(count)
+    }
+
+
+@benchmark("project_config.load", "hooks")
+def bench_project_config(timer: Timer, scale: float) -> int:
+    """Load a large project configuration."""
+
+    count = int(500 * scale)
+    config = {
+        "name": "bench",
+        "version": "1.0.0",
+        "maintainer": ["bench"],
+        "hooks": _hooks("hook", count),
+        "settings": {f"option{idx}": [idx, str(idx)] for idx in range(count)},
+    }
+    USER_REPO_CONFIG.write_text(json.dumps(config), encoding=DEFAULT_CHARSET)
+    with timer:
+        project = load_project_config(Path.cwd())
+        del project  # Pop the pushed variables.
+    return count
+
+
+@benchmark("project_config.includes", "files")
+def bench_project_includes(timer: Timer, scale: float) -> int:
+    """Load and merge a configuration with many included files."""
+
+    count = int(50 * scale)
+    includes = []
+    for idx in range(count):
+        sub = Path(f"sub{idx}")
+        sub.mkdir()
+        (sub / USER_REPO_CONFIG).write_text(
+            json.dumps({"hooks": _hooks(f"sub{idx}-", 20)}),
+            encoding=DEFAULT_CHARSET,
+        )
+        includes.append(str(sub))
+    USER_REPO_CONFIG.write_text(
+        json.dumps({"name": "bench", "includes": includes}),
+        encoding=DEFAULT_CHARSET,
+    )
+    with timer:
+        _load_config(USER_REPO_CONFIG, [])
+    return count + 1
+
+
+def _workflow_data(count: int) -> dict[str, Any]:
+    return {
+        "id": "bench",
+        "name": "Benchmark",
+        "steps": [
+            {"id": f"s{idx}", "echo": "${{ bench.root }}"}
+            for idx in range(count)
+        ],
+    }
+
+
+@benchmark("workflow.compile", "steps")
+def bench_workflow_compile(timer: Timer, scale: float) -> int:
+    """Compile workflows to plans."""
+
+    count = int(500 * scale)
+    data = _workflow_data(count)
+    with timer:
+        compile_workflow(data)
+    return count
+
+
+@benchmark("workflow.dispatch", "steps")
+def bench_workflow_dispatch(timer: Timer, scale: float) -> int:
+    """Run a compiled workflow of trivial steps."""
+
+    count = int(500 * scale)
+    plan = compile_workflow(_workflow_data(count))
+    push_variables("bench.root", "/tmp/project")
+    try:
+        with timer:
+            workflow = Workflow(plan)
+            workflow.run()
+            del workflow  # Pop the pushed variables.
+    finally:
+        pop_variables("bench.root")
+    return count
+
+
+class _CountKTrigger(IKernelTrigger):
+    calls = 0
+
+    def on_output(self, msg: str) -> None:
+        self.calls += 1
+
+
+@benchmark("ktrigger.call", "calls")
+def bench_call_ktrigger(timer: Timer, scale: float) -> int:
+    """Dispatch KTriggers to a bound instance."""
+
+    count = int(50000 * scale)
+    if "bench" not in ktriggers:
+        bind_ktrigger_interface("bench", _CountKTrigger())
+    with timer:
+        for _idx in range(count):
+            call_ktrigger(IKernelTrigger.on_output, msg="")
+    return count
+
+
+@benchmark("archive.compress", "bytes")
+def bench_archive_compress(timer: Timer, scale: float) -> int:
+    """Compress a tree of small files to a tar.gz archive."""
+
+    from rubisco.lib.archive import \
+        compress  # pylint: disable=import-outside-toplevel
+
+    size = _make_tree(Path("src"), int(500 * scale), 8192)
+    with timer:
+        compress(Path("src"), Path("src.tar.gz"), Path("src"))
+    return size
+
+
+@benchmark("archive.extract", "bytes")
+def bench_archive_extract(timer: Timer, scale: float) -> int:
+    """Extract a tar.gz archive of small files."""
+
+    from rubisco.lib.archive import \
+        compress  # pylint: disable=import-outside-toplevel
+    from rubisco.lib.archive import \
+        extract  # pylint: disable=import-outside-toplevel
+
+    size = _make_tree(Path("src"), int(500 * scale), 8192)
+    compress(Path("src"), Path("src.tar.gz"), Path("src"))
+    with timer:
+        extract(Path("src.tar.gz"), Path("dest"))
+    return size
+
+
+@benchmark("fileutil.copy_recursive", "files")
+def bench_copy_recursive(timer: Timer, scale: float) -> int:
+    """Copy a tree of many small files."""
+
+    count = int(2000 * scale)
+    _make_tree(Path("src"), count, 256)
+    with timer:
+        copy_recursive(Path("src"), Path("dest"))
+    return count
+
+
+@benchmark("fileutil.rm_recursive", "files")
+def bench_rm_recursive(timer: Timer, scale: float) -> int:
+    """Remove a tree of many small files."""
+
+    count = int(2000 * scale)
+    _make_tree(Path("src"), count, 256)
+    with timer:
+        rm_recursive(Path("src"))
+    return count
+
+
+def run_benchmarks(
+    patterns: list[str] | None = None,
+    repeat: int = 5,
+    scale: float = 1.0,
+    progress: Callable[[str], None] | None = None,
+) -> dict[str, Any]:
+    """Run the benchmarks.
+
+    Every run is in a new temporary directory, which is the current
+    directory while it is running.
+
+    Args:
+        patterns (list[str] | None, optional): Glob patterns of the
+            benchmark names. Defaults to None, which means all.
+        repeat (int, optional): Runs of each benchmark. Defaults to 5.
+        scale (float, optional): Scale of the data sizes. Defaults to 1.0.
+        progress (Callable[[str], None] | None, optional): Called with the
+            benchmark name before it is run. Defaults to None.
+
+    Returns:
+        dict[str, Any]: The results. It is JSON serializable.
+    """
+
+    results: dict[str, Any] = {}
+    cwd = Path.cwd()
+    for name, (func, unit) in benchmarks.items():
+        if patterns and not any(
+            fnmatch.fnmatchcase(name, pattern) for pattern in patterns
+        ):
+            continue
+        if progress:
+            progress(name)
+        times = []
+        count = 0
+        for _run in range(repeat):
+            timer = Timer()
+            with tempfile.TemporaryDirectory() as temp:
+                os.chdir(temp)
+                try:
+                    count = func(timer, scale)
+                finally:
+                    os.chdir(cwd)
+            times.append(timer.elapsed)
+        best = min(times)
+        results[name] = {
+            "unit": unit,
+            "count": count,
+            "min": best,
+            "median": statistics.median(times),
+            "rate": count / best if best else None,
+        }
+
+    return {
+        "rubisco": str(APP_VERSION),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare_results(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    threshold: float = 0.1,
+) -> dict[str, Any]:
+    """Compare the results with a baseline.
+
+    Args:
+        results (dict[str, Any]): The results of `run_benchmarks()`.
+        baseline (dict[str, Any]): The baseline results.
+        threshold (float, optional): Allowed slowdown. e.g. 0.1 means a
+            benchmark is regressed if it is more than 10% slower. Defaults
+            to 0.1.
+
+    Returns:
+        dict[str, Any]: Benchmark's name -> {"baseline", "ratio",
+            "regression"}. The ratio is the time divided by the baseline
+            time. Benchmarks missing in the baseline are skipped.
+    """
+
+    comparison: dict[str, Any] = {}
+    for name, result in results["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("min") or base["count"] != result["count"]:
+            continue
+        ratio = result["min"] / base["min"]
+        comparison[name] = {
+            "baseline": base["min"],
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold,
+        }
+
+    return comparison
+
+
+def main() -> None:
+    """Benchmark entry point."""
+
+    parser = argparse.ArgumentParser(
+        prog="python -m rubisco.bench",
+        description=__doc__.strip().splitlines()[0],
+    )
+    parser.add_argument(
+        "patterns",
+        nargs="*",
+        help="Glob patterns of the benchmarks to run. Defaults to all.",
+    )
+    parser.add_argument("--list", action="store_true", help="List and exit.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Data size.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        help="Save the results to a file. It can be used as a baseline.",
+    )
+    parser.add_argument(
+        "--baseline",
+        type=Path,
+        help="Compare with a baseline and exit with 1 on regressions.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed slowdown against the baseline. Defaults to 0.1.",
+    )
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (func, _unit) in benchmarks.items():
+            print(f"{name}: {(func.__doc__ or '').strip()}")
+        return
+
+    results = run_benchmarks(
+        args.patterns,
+        max(args.repeat, 1),
+        args.scale,
+        lambda name: print(f"Running {name} ...", file=sys.stderr),
+    )
+    regressed = False
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(DEFAULT_CHARSET))
+        results["comparison"] = compare_results(
+            results,
+            baseline,
+            args.threshold,
+        )
+        for name, item in results["comparison"].items():
+            if item["regression"]:
+                regressed = True
+                print(
+                    f"Regression: {name} is {item['ratio']:.2f}x slower.",
+                    file=sys.stderr,
+                )
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding=DEFAULT_CHARSET)
+    print(text)
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
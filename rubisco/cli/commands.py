@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Rubisco CLI built-in commands which can run outside a project.
+"""
+
+import argparse
+from pathlib import Path
+
+import rich
+
+from rubisco.cli.output import output_step
+from rubisco.lib.download_cache import download_cache
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.fileutil import human_readable_size
+from rubisco.lib.l10n import _
+from rubisco.lib.variable import format_str, make_pretty
+from rubisco.shared.extention import compile_extention, extention_index
+from rubisco.shared.trace import summarize_trace
+
+__all__ = [
+    "manage_cache",
+    "manage_extentions",
+    "run_builtin_command",
+    "summarize",
+]
+
+
+def manage_cache(action: str, max_size: int | None) -> None:
+    """Manage the download cache.
+
+    Args:
+        action (str): "info", "list", "prune" or "clear".
+        max_size (int | None): The size limit to prune to.
+    """
+
+    if action == "list":
+        for url, entry in sorted(download_cache.entries().items()):
+            rich.print(
+                f"{entry['sha256'][:12]} "
+                f"{human_readable_size(entry.get('size', 0)):>10} {url}",
+            )
+    elif action == "prune":
+        removed = download_cache.prune(max_size)
+        output_step(
+            format_str(
+                _("Removed ${{size}} from the download cache."),
+                fmt={"size": human_readable_size(removed)},
+            )
+        )
+    elif action == "clear":
+        download_cache.clear()
+        output_step(_("Download cache cleared."))
+
+    rich.print(
+        format_str(
+            _(
+                "Download cache: [underline]${{path}}[/underline] "
+                "(${{count}} entries, ${{size}} / ${{max_size}})"
+            ),
+            fmt={
+                "path": str(download_cache.root),
+                "count": str(len(download_cache.entries())),
+                "size": human_readable_size(download_cache.size()),
+                "max_size": human_readable_size(download_cache.max_size),
+            },
+        )
+    )
+
+
+def manage_extentions(
+    action: str,
+    path: Path | None,
+    output: Path | None,
+) -> None:
+    """Manage the extensions.
+
+    Args:
+        action (str): "list" or "compile".
+        path (Path | None): The extension directory to compile.
+        output (Path | None): The bundle path.
+    """
+
+    if action == "list":
+        for ext_path, entry in sorted(extention_index.entries().items()):
+            rich.print(
+                f"{entry['name']} {entry['version']} "
+                f"[underline]{ext_path}[/underline]",
+            )
+        return
+
+    if path is None:
+        raise RUValueException(
+            _("Please specify the extension directory to compile."),
+        )
+    bundle = compile_extention(path, output or Path(path.absolute().name))
+    output_step(
+        format_str(
+            _("Extension bundle saved to [underline]${{path}}[/underline]."),
+            fmt={"path": make_pretty(bundle.absolute())},
+        )
+    )
+
+
+def summarize(file: Path, top: int) -> None:
+    """Print the wall time breakdowns of a trace.
+
+    Args:
+        file (Path): The trace file.
+        top (int): The number of entries to show in each section.
+    """
+
+    summary = summarize_trace(file)
+    rich.print(
+        format_str(
+            _("Total wall time: ${{time}}s"),
+            fmt={"time": f"{summary['wall']:.3f}"},
+        ),
+    )
+    sections = {
+        "hooks": _("Hooks"),
+        "workflows": _("Workflows"),
+        "steps": _("Steps"),
+        "processes": _("Processes"),
+    }
+    for kind, title in sections.items():
+        entries = summary[kind][:top]
+        if not entries:
+            continue
+        rich.print(f"\n[bold]{title}[/bold]")
+        for entry in entries:
+            name = entry["name"]
+            if entry["key"] != name:
+                name = f"{name} [dark_gray]({entry['key']})[/dark_gray]"
+            rich.print(
+                f"{entry['total']:10.3f}s {entry['count']:5d}x "
+                f"{entry['max']:9.3f}s  {name}",
+            )
+
+
+def run_builtin_command(args: argparse.Namespace) -> None:
+    """Run a built-in command which can run outside a project.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+    """
+
+    if args.command == "cache":
+        manage_cache(args.action, args.max_size)
+    elif args.command == "ext":
+        manage_extentions(args.action, args.path, args.output)
+    elif args.command == "trace":
+        summarize(args.file, args.top)
@@ -26,12 +26,10 @@ import argparse
 import atexit
 import sys
 from pathlib import Path
-from typing import Any, Iterable
+from typing import TYPE_CHECKING, Any, Iterable
 
 import colorama
 import rich
-import rich.live
-import rich.progress
 from rich_argparse import RichHelpFormatter
 
 from rubisco.cli.input import ask_yesno
@@ -39,18 +37,24 @@ from rubisco.cli.output import (output_error, output_hint, output_step,
                                 output_warning, pop_level, push_level,
                                 show_exception)
 from rubisco.config import (APP_NAME, APP_VERSION, DEFAULT_CHARSET,
-                            DEFAULT_LOG_KEEP_LINES, LOG_FILE, USER_REPO_CONFIG)
-from rubisco.kernel.project_config import ProjectConfigration  # noqa: E501
-from rubisco.kernel.project_config import load_project_config
-from rubisco.kernel.workflow import Step, Workflow
+                            DEFAULT_LOG_KEEP_LINES, LOG_FILE,
+                            RUSAGE_SUMMARY_TOP, USER_REPO_CONFIG)
 from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.fileutil import human_readable_size
 from rubisco.lib.l10n import _, locale_language, locale_language_name
 from rubisco.lib.log import logger
-from rubisco.lib.process import Process
 from rubisco.lib.variable import format_str, make_pretty
-from rubisco.shared.extention import IRUExtention, load_all_extentions
 from rubisco.shared.ktrigger import (IKernelTrigger, bind_ktrigger_interface,
-                                     call_ktrigger)
+                                     call_ktrigger, flush_ktriggers,
+                                     set_async_dispatch)
+
+# The kernel is imported when a command needs it, so "--version" and the
+# built-in commands start fast.
+if TYPE_CHECKING:
+    from rubisco.kernel.project_config import ProjectConfigration
+    from rubisco.kernel.workflow import Step, Workflow
+    from rubisco.lib.process import Process, ProcessUsage
+    from rubisco.shared.extention import IRUExtention
 
 __all__ = ["main"]
 
@@ -147,9 +151,45 @@ class RUHelpFormatter(RichHelpFormatter):
         return help_str
 
 
+# The options before the command. They are shared with `command_peeker`.
+global_options = argparse.ArgumentParser(add_help=False)
+
+global_options.add_argument(
+    "--debug",
+    action="store_true",
+    help=_("Run rubisco in debug mode."),
+)
+
+global_options.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help=_(
+        "The number of concurrent jobs, shared with make by a jobserver. "
+        "Defaults to the number of CPUs."
+    ),
+)
+
+global_options.add_argument(
+    "--trace",
+    metavar="DEST",
+    default=None,
+    help=_("Write a JSON-lines trace to a file, or to 'fd:N'."),
+)
+
+global_options.add_argument(
+    "--chrome-trace",
+    metavar="FILE",
+    type=Path,
+    default=None,
+    help=_("Write a Chrome trace for Perfetto (https://ui.perfetto.dev)."),
+)
+
 arg_parser = argparse.ArgumentParser(
     description="Rubisco CLI",
     formatter_class=RUHelpFormatter,
+    parents=[global_options],
 )
 
 arg_parser.register("action", "version", _VersionAction)
@@ -161,23 +201,12 @@ arg_parser.add_argument(
     version="",
 )
 
-arg_parser.add_argument(
-    "--debug",
-    action="store_true",
-    help=_("Run rubisco in debug mode."),
-)
-
-arg_parser.add_argument(
-    "command",
-    action="store",
-    nargs=1,
-    help=_("Command to run."),
-)
-
 hook_commands = arg_parser.add_subparsers(
     title=_("Available commands"),
     dest="command",
-    metavar="",
+    metavar="command",
+    required=True,
+    help=_("Command to run."),
 )
 
 hook_commands.add_parser(
@@ -185,7 +214,107 @@ hook_commands.add_parser(
     help=_("Show project information."),
 )
 
-project_config: ProjectConfigration | None = None
+cache_command = hook_commands.add_parser(
+    "cache",
+    help=_("Manage the download cache."),
+    formatter_class=RUHelpFormatter,
+)
+
+cache_command.add_argument(
+    "action",
+    nargs="?",
+    choices=["info", "list", "prune", "clear"],
+    default="info",
+    help=_("Show, list, prune or clear the download cache."),
+)
+
+cache_command.add_argument(
+    "--max-size",
+    type=int,
+    default=None,
+    help=_("The size limit in bytes to prune to."),
+)
+
+ext_command = hook_commands.add_parser(
+    "ext",
+    help=_("Manage extensions."),
+    formatter_class=RUHelpFormatter,
+)
+
+ext_command.add_argument(
+    "action",
+    choices=["list", "compile"],
+    help=_("List the extensions, or compile an extension to a bundle."),
+)
+
+ext_command.add_argument(
+    "path",
+    nargs="?",
+    type=Path,
+    default=None,
+    help=_("The extension directory to compile."),
+)
+
+ext_command.add_argument(
+    "-o",
+    "--output",
+    type=Path,
+    default=None,
+    help=_("The bundle path. Defaults to '<name>.rbz' in the cwd."),
+)
+
+trace_command = hook_commands.add_parser(
+    "trace",
+    help=_("Inspect a trace written by '--trace'."),
+    formatter_class=RUHelpFormatter,
+)
+
+trace_command.add_argument(
+    "action",
+    choices=["summarize"],
+    help=_("Print the wall time of every hook, workflow and step."),
+)
+
+trace_command.add_argument(
+    "file",
+    type=Path,
+    help=_("The trace file."),
+)
+
+trace_command.add_argument(
+    "--top",
+    type=int,
+    default=10,
+    help=_("The number of entries to show in each section."),
+)
+
+# Hooks cannot override the built-in commands.
+BUILTIN_COMMANDS = frozenset(hook_commands.choices)
+# The built-in commands which can run outside a project.
+PROJECT_FREE_COMMANDS = frozenset(["cache", "ext", "trace"])
+
+# Find the command before the project hooks are added to `arg_parser`.
+command_peeker = argparse.ArgumentParser(
+    add_help=False,
+    parents=[global_options],
+    exit_on_error=False,
+)
+
+command_peeker.register("action", "version", _VersionAction)
+
+command_peeker.add_argument(
+    "-v",
+    "--version",
+    action="version",
+    version="",
+)
+
+command_peeker.add_argument("command", nargs="?", default=None)
+
+# The arguments of the command. Its options are not global options.
+command_peeker.add_argument("arguments", nargs=argparse.REMAINDER)
+
+project_config: "ProjectConfigration | None" = None
 
 
 class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
@@ -193,14 +322,16 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
 ):  # Rubisco CLI kernel trigger.
     """Rubisco kernel trigger."""
 
-    cur_progress: rich.progress.Progress | None = None
-    tasks: dict[str, rich.progress.TaskID] = {}
+    # rich.progress and rich.live are imported when they are used.
+    cur_progress: "rich.progress.Progress | None" = None
+    tasks: "dict[str, rich.progress.TaskID]" = {}
     task_types: dict[str, int] = {}
-    task_totals: dict[str, int] = {}
-    live: rich.live.Live | None = None
+    live: "rich.live.Live | None" = None
     _speedtest_hosts: dict[str, str] = {}
+    # The processes of every running hook.
+    _hook_usages: "list[list[tuple[str, ProcessUsage]]]" = []
 
-    def pre_exec_process(self, proc: Process):
+    def pre_exec_process(self, proc: "Process"):
         output_step(
             format_str(
                 _("Executing: [cyan]${{cmd}}[/cyan] ..."),
@@ -211,11 +342,47 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
 
     def post_exec_process(
         self,
-        proc: Process,
+        proc: "Process",
         retcode: int,
         raise_exc: bool,
+        usage: "ProcessUsage | None" = None,
     ) -> None:
         print(colorama.Fore.RESET, end="", flush=True)
+        if usage is not None and self._hook_usages:
+            cmd = proc.origin_cmd.strip()
+            if "\n" in cmd:
+                cmd = cmd.split("\n", 1)[0] + " ..."
+            self._hook_usages[-1].append((cmd, usage))
+
+    def pre_run_hook(self, hook: Any) -> None:
+        self._hook_usages.append([])
+
+    def post_run_hook(self, hook: Any) -> None:
+        if not self._hook_usages:
+            return
+        usages = self._hook_usages.pop()
+        if len(usages) < 2:  # Nothing to compare.
+            return
+        usages.sort(key=lambda item: (item[1].cpu, item[1].wall), reverse=True)
+        rich.print(
+            "\n[bold]"
+            + format_str(
+                _("Heaviest commands of hook '${{name}}':"),
+                fmt={"name": hook.name},
+            )
+            + "[/bold]",
+        )
+        rich.print(
+            f"{_('CPU'):>10} {_('Wall'):>10} {_('Max RSS'):>11} "
+            f"{_('I/O'):>11}  {_('Command')}",
+        )
+        for cmd, usage in usages[:RUSAGE_SUMMARY_TOP]:
+            io_size = (usage.read_bytes or 0) + (usage.write_bytes or 0)
+            rich.print(
+                f"{usage.cpu:9.3f}s {usage.wall:9.3f}s "
+                f"{human_readable_size(usage.max_rss or 0):>11} "
+                f"{human_readable_size(io_size):>11}  [cyan]{cmd}[/cyan]",
+            )
 
     def file_exists(self, path: Path):
         if not ask_yesno(
@@ -244,18 +411,22 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
             title = _("[yellow]Extracting[/yellow]")
         elif task_type == IKernelTrigger.TASK_COMPRESS:
             title = _("[yellow]Compressing[/yellow]")
+        elif task_type == IKernelTrigger.TASK_SYNC:
+            title = _("[yellow]Syncing[/yellow]")
         else:
             title = _("[yellow]Processing[/yellow]")
 
         if task_name in self.tasks:
             self.cur_progress.update(self.tasks[task_name], completed=0)
         if self.cur_progress is None:
-            self.cur_progress = rich.progress.Progress()
+            from rich.progress import \
+                Progress  # pylint: disable=import-outside-toplevel
+
+            self.cur_progress = Progress()
             self.cur_progress.start()
         task_id = self.cur_progress.add_task(title, total=total)
         self.tasks[task_name] = task_id
         self.task_types[task_name] = task_type
-        self.task_totals[task_name] = total
 
     def on_progress(
         self,
@@ -264,12 +435,17 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
         delta: bool = False,
         more_data: dict[str, Any] | None = None,
     ):
+        # The progress of some extractions is in bytes, so the number of
+        # members is sent with the paths.
+        members = more_data.get("members") if more_data else None
         if (
             self.task_types[task_name] == IKernelTrigger.TASK_EXTRACT
-            and self.task_totals[task_name] < 2500
+            and members is not None
+            and members < 2500
         ):
-            path = str((more_data["dest"] / more_data["path"]).absolute())
-            rich.print(f"[underline]{path}[/underline]")
+            for data in more_data.get("merged", [more_data]):
+                path = str((data["dest"] / data["path"]).absolute())
+                rich.print(f"[underline]{path}[/underline]")
         if delta:
             self.cur_progress.update(self.tasks[task_name], advance=current)
         else:
@@ -282,7 +458,6 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
         self.cur_progress.remove_task(self.tasks[task_name])
         del self.tasks[task_name]
         del self.task_types[task_name]
-        del self.task_totals[task_name]
         if not self.tasks:
             self.cur_progress.stop()
             self.cur_progress = None
@@ -351,8 +526,11 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
 
     def pre_speedtest(self, host: str):
         if self.live is None:
+            from rich.live import \
+                Live  # pylint: disable=import-outside-toplevel
+
             output_step(_("Performing websites speed test ..."))
-            self.live = rich.live.Live()
+            self.live = Live()
             self.live.start()
             self._speedtest_hosts.clear()
         self._speedtest_hosts[host] = _("[yellow]Testing[/yellow] ...")
@@ -378,7 +556,7 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
             self.live.stop()
             self.live = None
 
-    def pre_run_workflow_step(self, step: Step) -> None:
+    def pre_run_workflow_step(self, step: "Step") -> None:
         if step.name.strip():
             output_step(
                 format_str(
@@ -390,10 +568,21 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
             )
         push_level()
 
-    def post_run_workflow_step(self, step: Step) -> None:
+    def post_run_workflow_step(self, step: "Step") -> None:
         pop_level()
 
-    def pre_run_workflow(self, workflow: Workflow) -> None:
+    def on_skip_workflow_step(self, step: "Step") -> None:
+        output_step(
+            format_str(
+                _(
+                    "Skipped: [white]${{name}}[/white] [black](${{id}})[/black] "  # noqa: E501
+                    "is up to date.",
+                ),
+                fmt={"name": make_pretty(step.name, _("<Unnamed>")), "id": step.id},  # noqa: E501
+            )
+        )
+
+    def pre_run_workflow(self, workflow: "Workflow") -> None:
         output_step(
             format_str(
                 _(
@@ -405,7 +594,7 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
         )
         push_level()
 
-    def post_run_workflow(self, workflow: Workflow) -> None:
+    def post_run_workflow(self, workflow: "Workflow") -> None:
         pop_level()
         output_step(
             format_str(
@@ -461,7 +650,7 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
             )
         )
 
-    def on_extention_loaded(self, instance: IRUExtention):
+    def on_extention_loaded(self, instance: "IRUExtention"):
         output_step(
             format_str(
                 _("Extension '${{name}}' loaded."),
@@ -469,7 +658,7 @@ class RubiscoKTrigger(  # pylint: disable=too-many-public-methods
             )
         )
 
-    def on_show_project_info(self, project: ProjectConfigration):
+    def on_show_project_info(self, project: "ProjectConfigration"):
         rich.print(
             format_str(
                 _(
@@ -576,9 +765,24 @@ def load_project():
 
     global project_config  # pylint: disable=global-statement
 
+    from rubisco.kernel.project_config import \
+        load_project_config  # pylint: disable=import-outside-toplevel
+
     try:
         project_config = load_project_config(Path.cwd())
         for hook_name in project_config.hooks.keys():  # Bind all hooks.
+            if hook_name in BUILTIN_COMMANDS:
+                call_ktrigger(
+                    IKernelTrigger.on_warning,
+                    message=format_str(
+                        _(
+                            "Hook '${{name}}' is ignored, because it has "
+                            "the same name as a built-in command."
+                        ),
+                        fmt={"name": make_pretty(hook_name)},
+                    ),
+                )
+                continue
             bind_hook(hook_name)
             hook_commands.add_parser(
                 hook_name,
@@ -603,6 +807,22 @@ def load_project():
         ) from exc
 
 
+def peek_args() -> argparse.Namespace | None:
+    """Parse the global options and the command in argv without the project
+    hooks.
+
+    Returns:
+        argparse.Namespace | None: The parsed arguments. None if argv is
+            invalid.
+    """
+
+    try:
+        args, _unknown = command_peeker.parse_known_args()
+    except argparse.ArgumentError:
+        return None  # `arg_parser` reports it later.
+    return args
+
+
 def clean_log():
     """
     Clean the log file.
@@ -621,39 +841,101 @@ def clean_log():
         logger.warning("Failed to clean log file.", exc_info=True)
 
 
+def parse_args(peeked: argparse.Namespace | None) -> argparse.Namespace:
+    """Load the extensions and the project if the command needs them, and
+    parse argv.
+
+    Args:
+        peeked (argparse.Namespace | None): The result of `peek_args()`.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+
+    if peeked is not None and peeked.command in PROJECT_FREE_COMMANDS:
+        return arg_parser.parse_args()
+
+    from rubisco.shared.extention import \
+        load_all_extentions  # pylint: disable=import-outside-toplevel
+
+    try:
+        load_all_extentions()
+        load_project()
+    finally:
+        args = arg_parser.parse_args()
+    return args
+
+
+def run_command(args: argparse.Namespace) -> None:
+    """Run the command in the parsed arguments.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from rubisco.lib.jobserver import job_slots
+    from rubisco.lib.tracing import enable_tracing
+    from rubisco.shared.trace import TraceKTrigger, open_trace
+
+    if args.trace:
+        bind_ktrigger_interface(
+            "trace",
+            TraceKTrigger(open_trace(args.trace)),
+        )
+    if args.chrome_trace:
+        enable_tracing()
+    if args.jobs:
+        job_slots.resize(args.jobs)
+    job_slots.enable_jobserver()
+
+    if args.command == "info":
+        call_ktrigger(
+            IKernelTrigger.on_show_project_info,
+            project=project_config,
+        )
+    elif args.command in PROJECT_FREE_COMMANDS:
+        from rubisco.cli.commands import run_builtin_command
+
+        run_builtin_command(args)
+    else:
+        call_hook(args.command)
+
+
 def main() -> None:
     """Main entry point."""
 
+    args: argparse.Namespace | None = None
     try:
         clean_log()
         logger.info("Rubisco CLI version %s started.", str(APP_VERSION))
         colorama.init()
+        peeked = peek_args()  # It exits for "--version".
         bind_ktrigger_interface("rubisco", RubiscoKTrigger())
-        load_all_extentions()
-
-        try:
-            load_project()
-        finally:
-            args = arg_parser.parse_args()
-
-        op_command = args.command[0]
-        if op_command == "info":
-            call_ktrigger(
-                IKernelTrigger.on_show_project_info,
-                project=project_config,
-            )
-        else:
-            call_hook(op_command)
+        # Render progress and messages on the UI thread, so a slow terminal
+        # does not slow down the work. Keep it synchronous for debugging.
+        set_async_dispatch(peeked is None or not peeked.debug)
+        args = parse_args(peeked)
+        run_command(args)
 
     except SystemExit as exc:
         raise exc from None  # Do not show traceback.
     except KeyboardInterrupt as exc:
+        flush_ktriggers()
         show_exception(exc)
         sys.exit(1)
     except Exception as exc:  # pylint: disable=broad-exception-caught
         logger.critical("An unexpected error occurred.", exc_info=True)
+        flush_ktriggers()
         show_exception(exc)
         sys.exit(1)
+    finally:
+        flush_ktriggers()
+        if args and args.chrome_trace:
+            from rubisco.lib.tracing import \
+                export_chrome_trace  # pylint: disable=import-outside-toplevel
+
+            export_chrome_trace(args.chrome_trace)
 
 
 if __name__ == "__main__":
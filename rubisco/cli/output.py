@@ -22,7 +22,8 @@
 C++ Plus Rubisco CLI output utils.
 """
 
-import json5 as json
+import json
+
 import rich
 
 from rubisco.lib.exceptions import RUException
@@ -160,7 +161,7 @@ def show_exception(exc: Exception, as_warn: bool = False) -> None:
         perror(_("Interrupted by user."))
     elif isinstance(exc, OSError):
         perror(message)
-    elif isinstance(exc, json.JSON5DecodeError):
+    elif isinstance(exc, json.JSONDecodeError):
         perror(_("JSON5 decode error."))
         perror(message)
         output_hint(_("Is may caused by a invalid JSON5 configuration file."))
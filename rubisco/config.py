@@ -41,12 +41,28 @@ DEFAULT_CHARSET = "UTF-8"
 # Miscellaneous configurations.
 TIMEOUT = 15
 COPY_BUFSIZE = 1024 * 1024 if os.name == "nt" else 64 * 1024
+DOWNLOAD_SEGMENTS = 4
+DOWNLOAD_SEGMENT_MIN_SIZE = 4 * 1024 * 1024
+MIRROR_LATENCY_TTL = 6 * 60 * 60  # Seconds.
+MIRROR_LATENCY_ALPHA = 0.3  # Weight of the new sample.
+PROGRESS_REFRESH_RATE = 20  # Hz.
+KTRIGGER_QUEUE_SIZE = 1024
+GIT_SYNC_JOBS = 8
+GIT_SYNC_HOST_LIMIT = 4  # Concurrent connections to one host.
+GIT_SYNC_RETRIES = 2
+POPEN_CAPTURE_LIMIT = 4 * 1024 * 1024  # Bytes kept in memory per stream.
+PROCESS_TERMINATE_TIMEOUT = 5  # Seconds before a process is killed.
+RUSAGE_SUMMARY_TOP = 5  # Commands listed after a hook is finished.
+# Longer scripts are run from a file. An argument is limited to 128KiB on
+# Linux.
+INLINE_SCRIPT_LIMIT = 64 * 1024
 
 # Lib onfigurations.
 WORKSPACE_LIB_DIR = Path(".rubisco")
 WORKSPACE_CONFIG_DIR = WORKSPACE_LIB_DIR
 WORKSPACE_CONFIG_FILE = WORKSPACE_LIB_DIR / "config.json"
 WORKSPACE_EXTENTIONS_DIR = WORKSPACE_LIB_DIR / "extentions"
+WORKSPACE_CACHE_DIR = WORKSPACE_LIB_DIR / "cache"
 USER_REPO_CONFIG = Path("repo.json")
 if os.name == "nt":
     local_appdata = Path(os.getenv("LOCALAPPDATA"))
@@ -59,6 +75,11 @@ else:
     USER_CONFIG_DIR = Path("~/.config/rubisco").expanduser()
 USER_CONFIG_FILE = USER_CONFIG_DIR / "config.json"
 USER_EXTENTIONS_DIR = USER_LIB_DIR / "extentions"
+USER_EXTENTIONS_INDEX_FILE = USER_LIB_DIR / "cache" / "extentions.json"
+USER_DOWNLOAD_CACHE_DIR = USER_LIB_DIR / "cache" / "downloads"
+USER_MIRROR_LATENCY_FILE = USER_LIB_DIR / "cache" / "mirror-latency.json"
+USER_WORKFLOW_CACHE_DIR = USER_LIB_DIR / "cache" / "workflows"
+DOWNLOAD_CACHE_MAX_SIZE = 4 * 1024 * 1024 * 1024
 # Will override in Windows later.
 GLOBAL_LIB_DIR = Path("/usr/local/lib/rubisco")
 GLOBAL_CONFIG_DIR = Path("/etc/rubisco")
@@ -22,10 +22,9 @@
 Rubisco config file loader.
 """
 
-import json5 as json
-
 from rubisco.config import (DEFAULT_CHARSET, GLOBAL_CONFIG_FILE,
                             USER_CONFIG_FILE, WORKSPACE_CONFIG_FILE)
+from rubisco.lib.jsonfile import load_json5
 from rubisco.lib.log import logger
 from rubisco.lib.variable import AutoFormatDict
 
@@ -37,7 +36,7 @@ try:
     logger.info("Loading global configuration %s ...", GLOBAL_CONFIG_FILE)
     if GLOBAL_CONFIG_FILE.exists():
         with GLOBAL_CONFIG_FILE.open("r", encoding=DEFAULT_CHARSET) as f:
-            config.merge(AutoFormatDict(json.load(f)))
+            config.merge(AutoFormatDict(load_json5(f)))
 except:  # pylint: disable=bare-except  # noqa: E722
     logger.exception("Failed to load global configuration: %s")
 
@@ -45,7 +44,7 @@ try:
     logger.info("Loading user configuration %s ...", USER_CONFIG_FILE)
     if USER_CONFIG_FILE.exists():
         with USER_CONFIG_FILE.open("r", encoding=DEFAULT_CHARSET) as f:
-            config.merge(AutoFormatDict(json.load(f)))
+            config.merge(AutoFormatDict(load_json5(f)))
 except:  # pylint: disable=bare-except  # noqa: E722
     logger.exception("Failed to load user configuration: %s")
 
@@ -56,6 +55,6 @@ try:
     )
     if WORKSPACE_CONFIG_FILE.exists():
         with WORKSPACE_CONFIG_FILE.open("r", encoding=DEFAULT_CHARSET) as f:
-            config.merge(AutoFormatDict(json.load(f)))
+            config.merge(AutoFormatDict(load_json5(f)))
 except:  # pylint: disable=bare-except  # noqa: E722
     logger.exception("Failed to load workspace configuration: %s")
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Step fingerprints for incremental workflow execution.
+A step with inputs or outputs is skipped if its resolved parameters and the
+content of its inputs are unchanged since its last successful run, and all
+its outputs exist.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+from rubisco.config import COPY_BUFSIZE, DEFAULT_CHARSET, WORKSPACE_CACHE_DIR
+from rubisco.lib.log import logger
+from rubisco.lib.variable import AutoFormatDict, AutoFormatList
+
+__all__ = ["FingerprintStore", "fingerprints", "resolve_object"]
+
+FINGERPRINTS_FILE = WORKSPACE_CACHE_DIR / "fingerprints.json"
+
+
+def resolve_object(obj: Any) -> Any:
+    """Format all the values of a object recursively.
+
+    Args:
+        obj (Any): The object to resolve.
+
+    Returns:
+        Any: The resolved object. It only contains builtin types.
+    """
+
+    if isinstance(obj, AutoFormatDict):
+        return {str(key): resolve_object(value) for key, value in obj.items()}
+    if isinstance(obj, AutoFormatList):
+        return [resolve_object(value) for value in obj]
+    return obj
+
+
+def _glob_files(patterns: list[str]) -> list[Path]:
+    """Get all files matched by the patterns. Directories are walked.
+
+    Args:
+        patterns (list[str]): Glob patterns.
+
+    Returns:
+        list[Path]: Sorted file paths.
+    """
+
+    files: set[Path] = set()
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            path = Path(path)
+            if path.is_dir():
+                files.update(sub for sub in path.rglob("*") if sub.is_file())
+            elif path.is_file():
+                files.add(path)
+
+    return sorted(files)
+
+
+class FingerprintStore:
+    """
+    Persistent fingerprints of the successful steps. The content hash of a
+    file is cached by its size and modification time. The output variables
+    of a step are recorded with its fingerprint, so they can be restored
+    when it is skipped. Changes are kept in memory until `flush()`.
+    """
+
+    path: Path
+    _steps: dict[str, str]
+    _variables: dict[str, dict[str, Any]]
+    _files: dict[str, list]
+    _loaded: bool
+    _dirty: bool
+    _lock: threading.RLock
+
+    def __init__(self, path: Path) -> None:
+        """Create a fingerprint store.
+
+        Args:
+            path (Path): The store file path. It will be loaded lazily.
+        """
+
+        self.path = path
+        self._steps = {}
+        self._variables = {}
+        self._files = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> None:
+        """Load the store file if it is not loaded."""
+
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with self.path.open("r", encoding=DEFAULT_CHARSET) as f:
+                data = json.load(f)
+            self._steps = dict(data.get("steps", {}))
+            self._variables = dict(data.get("variables", {}))
+            self._files = dict(data.get("files", {}))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError):
+            logger.warning(
+                "Invalid fingerprints file: %s",
+                str(self.path),
+                exc_info=True,
+            )
+
+    def _save(self) -> None:
+        """Save the store file atomically."""
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.path.with_suffix(f".{os.getpid()}.tmp")
+            with temp_file.open("w", encoding=DEFAULT_CHARSET) as f:
+                json.dump(
+                    {
+                        "steps": self._steps,
+                        "variables": self._variables,
+                        "files": self._files,
+                    },
+                    f,
+                )
+            os.replace(temp_file, self.path)
+        except OSError:
+            logger.warning(
+                "Failed to save fingerprints file: %s",
+                str(self.path),
+                exc_info=True,
+            )
+
+    def file_hash(self, path: Path) -> str:
+        """Get the content hash of a file.
+
+        Args:
+            path (Path): The file path.
+
+        Returns:
+            str: The SHA-256 hex digest of the file.
+        """
+
+        stat = path.stat()
+        key = str(path.absolute())
+        with self._lock:
+            self._load()
+            cached = self._files.get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        hasher = hashlib.sha256()
+        with path.open("rb") as f:
+            while buf := f.read(COPY_BUFSIZE):
+                hasher.update(buf)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._files[key] = [stat.st_size, stat.st_mtime_ns, digest]
+            self._dirty = True
+
+        return digest
+
+    def fingerprint(
+        self,
+        params: Any,
+        inputs: list[str],
+    ) -> tuple[str, str]:
+        """Get the fingerprint of a step.
+
+        Args:
+            params (Any): The resolved parameters of the step. It must be
+                JSON serializable.
+            inputs (list[str]): The input glob patterns.
+
+        Returns:
+            tuple[str, str]: The key of the step and the digest of its inputs.
+        """
+
+        key = hashlib.sha256(
+            json.dumps(params, sort_keys=True, default=str).encode(
+                DEFAULT_CHARSET,
+            )
+        ).hexdigest()
+
+        hasher = hashlib.sha256()
+        for path in _glob_files(inputs):
+            hasher.update(str(path).encode(DEFAULT_CHARSET))
+            hasher.update(b"\0")
+            hasher.update(self.file_hash(path).encode(DEFAULT_CHARSET))
+            hasher.update(b"\n")
+
+        return key, hasher.hexdigest()
+
+    def is_up_to_date(
+        self,
+        fingerprint: tuple[str, str],
+        outputs: list[str],
+    ) -> bool:
+        """Check if a step is up to date.
+
+        Args:
+            fingerprint (tuple[str, str]): The fingerprint of the step.
+            outputs (list[str]): The output glob patterns. All of them must
+                match at least one path.
+
+        Returns:
+            bool: True if the step can be skipped.
+        """
+
+        key, digest = fingerprint
+        with self._lock:
+            self._load()
+            if self._steps.get(key) != digest:
+                return False
+
+        return all(glob.glob(output, recursive=True) for output in outputs)
+
+    def record(
+        self,
+        fingerprint: tuple[str, str],
+        variables: dict[str, Any] | None = None,
+    ) -> None:
+        """Record a successful step.
+
+        Args:
+            fingerprint (tuple[str, str]): The fingerprint of the step.
+            variables (dict[str, Any] | None, optional): The output
+                variables of the step. Values which are not JSON
+                serializable are dropped. Defaults to None.
+        """
+
+        saved = {}
+        for name, value in (variables or {}).items():
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            saved[name] = value
+
+        key, digest = fingerprint
+        with self._lock:
+            self._load()
+            self._steps[key] = digest
+            if saved:
+                self._variables[key] = saved
+            else:
+                self._variables.pop(key, None)
+            self._dirty = True
+
+    def flush(self) -> None:
+        """Forget the hashes of the removed files and save the store file if
+        it is changed.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            self._files = {
+                path: value
+                for path, value in self._files.items()
+                if Path(path).exists()
+            }
+            self._save()
+            self._dirty = False
+
+    def recorded_variables(
+        self,
+        fingerprint: tuple[str, str],
+    ) -> dict[str, Any]:
+        """Get the output variables recorded with a step.
+
+        Args:
+            fingerprint (tuple[str, str]): The fingerprint of the step.
+
+        Returns:
+            dict[str, Any]: The variables. Empty if nothing is recorded.
+        """
+
+        with self._lock:
+            self._load()
+            return dict(self._variables.get(fingerprint[0], {}))
+
+
+# The workspace fingerprint store.
+fingerprints = FingerprintStore(FINGERPRINTS_FILE)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        store = FingerprintStore(temp / "fingerprints.json")
+        src = temp / "src.txt"
+        dst = temp / "dst.txt"
+        src.write_text("hello", encoding=DEFAULT_CHARSET)
+        inputs_ = [str(src)]
+        outputs_ = [str(dst)]
+
+        # Test: A new step is not up to date.
+        fp = store.fingerprint({"copy": "src"}, inputs_)
+        assert not store.is_up_to_date(fp, outputs_)
+
+        # Test: Recorded step with existing outputs is up to date.
+        dst.write_text("hello", encoding=DEFAULT_CHARSET)
+        store.record(fp)
+        assert not store.path.exists()
+        store.flush()
+        store = FingerprintStore(temp / "fingerprints.json")
+        assert store.is_up_to_date(store.fingerprint({"copy": "src"}, inputs_), outputs_)  # noqa: E501
+
+        # Test: Changed parameters or inputs or missing outputs.
+        assert not store.is_up_to_date(
+            store.fingerprint({"copy": "other"}, inputs_),
+            outputs_,
+        )
+        src.write_text("changed", encoding=DEFAULT_CHARSET)
+        assert not store.is_up_to_date(
+            store.fingerprint({"copy": "src"}, inputs_),
+            outputs_,
+        )
+        dst.unlink()
+        assert not store.is_up_to_date(fp, outputs_)
+
+        # Test: Output variables are recorded with the fingerprint.
+        store.record(fp, {"retcode": 0, "stdout": "hi", "exc": object()})
+        store.flush()
+        store = FingerprintStore(temp / "fingerprints.json")
+        assert store.recorded_variables(fp) == {"retcode": 0, "stdout": "hi"}
+
+        # Test: The hashes of the removed files are forgotten on flush.
+        store.record(store.fingerprint({"copy": "src"}, inputs_))
+        src.unlink()
+        store.flush()
+        with store.path.open("r", encoding=DEFAULT_CHARSET) as f_:
+            assert str(src.absolute()) not in json.load(f_)["files"]
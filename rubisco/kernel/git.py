@@ -22,12 +22,24 @@
 Mirrorlist for extention installer.
 """
 
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from urllib.parse import urlsplit
 
+from rubisco.config import (DEFAULT_CHARSET, GIT_SYNC_HOST_LIMIT,
+                            GIT_SYNC_JOBS, GIT_SYNC_RETRIES)
 from rubisco.kernel.mirrorlist import get_url
+from rubisco.lib.exceptions import RUShellExecutionException, RUValueException
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
-from rubisco.lib.process import Process, popen
+from rubisco.lib.process import Process, ProcessUsage
+from rubisco.lib.tracing import span
 from rubisco.lib.variable import format_str, make_pretty
 from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
@@ -36,13 +48,146 @@ __all__ = [
     "git_has_remote",
     "git_set_remote",
     "git_get_remote",
+    "git_get_branch",
     "git_update",
+    "git_sync",
+    "GitSyncTarget",
     "is_git_repo",
 ]
 
+# Git environments which change the repository discovery. We let git itself
+# find the repository if any of them is set.
+GIT_DISCOVERY_ENVS = ("GIT_DIR", "GIT_WORK_TREE", "GIT_CEILING_DIRECTORIES")
+
+
+def _run_git(args: list[str], cwd: Path) -> tuple[int, str]:
+    """Run a git query directly, without a shell.
+
+    Args:
+        args (list[str]): Git arguments.
+        cwd (Path): The working directory.
+
+    Returns:
+        tuple[int, str]: The return code and the stdout. The return code is
+            127 if git is not installed.
+    """
+
+    logger.debug("Git query: %s in '%s'", repr(args), str(cwd))
+    with span(" ".join(["git", *args]), "process", cwd=cwd) as span_args:
+        try:
+            res = subprocess.run(
+                ["git", *args],
+                cwd=cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=False,
+            )
+        except FileNotFoundError:
+            logger.warning("Git is not installed.")
+            return 127, ""
+        span_args["retcode"] = res.returncode
+    return res.returncode, res.stdout.decode(DEFAULT_CHARSET, "replace")
+
+
+def _find_git_dir(path: Path) -> Path | None:
+    """Find the git directory of a work tree from its `.git` entry.
+
+    Args:
+        path (Path): The work tree root.
+
+    Returns:
+        Path | None: The git directory. None if `path` has no `.git`.
+    """
+
+    dot_git = path / ".git"
+    if dot_git.is_dir():
+        return dot_git
+    if dot_git.is_file():  # Worktrees and submodules: "gitdir: <path>".
+        try:
+            content = dot_git.read_text(encoding=DEFAULT_CHARSET).strip()
+        except OSError:
+            return None
+        if content.startswith("gitdir:"):
+            return (path / content[7:].strip()).resolve()
+    return None
+
+
+def _common_dir(git_dir: Path) -> Path:
+    """Get the directory which holds the shared files (e.g. config).
+
+    Args:
+        git_dir (Path): The git directory.
+
+    Returns:
+        Path: The common directory. It is `git_dir` unless it is a worktree.
+    """
+
+    try:
+        common = (git_dir / "commondir").read_text(encoding=DEFAULT_CHARSET)
+    except OSError:
+        return git_dir
+    return (git_dir / common.strip()).resolve()
+
+
+# Repository's git directory -> (config file stat, remote name -> URL).
+_remotes_cache: dict[Path, tuple[tuple[int, int], dict[str, str]]] = {}
+_remotes_lock = threading.Lock()
+
+
+def _git_remotes(path: Path) -> dict[str, str]:
+    """Get all the remote URLs of a repository with one git query.
+    The result is cached until the repository config is changed.
+
+    Args:
+        path (Path): Path to the repository.
+
+    Returns:
+        dict[str, str]: Remote name -> URL.
+    """
+
+    git_dir = _find_git_dir(path)
+    config = _common_dir(git_dir) / "config" if git_dir else None
+    stat_key = (0, 0)
+    if config is not None:
+        try:
+            stat = config.stat()
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            with _remotes_lock:
+                cached = _remotes_cache.get(config)
+            if cached and cached[0] == stat_key:
+                return cached[1]
+        except OSError:
+            config = None
+
+    retcode, stdout = _run_git(
+        ["config", "--null", "--get-regexp", r"^remote\..*\.url$"],
+        path,
+    )
+    remotes: dict[str, str] = {}
+    if retcode == 0:
+        for item in stdout.split("\0"):
+            key, _sep, url = item.partition("\n")
+            if key.startswith("remote.") and key.endswith(".url"):
+                remotes.setdefault(key[7:-4], url)
+    if config is not None:
+        with _remotes_lock:
+            _remotes_cache[config] = (stat_key, remotes)
+    return remotes
+
+
+def _forget_remotes(path: Path) -> None:
+    git_dir = _find_git_dir(path)
+    if git_dir:
+        with _remotes_lock:
+            _remotes_cache.pop(_common_dir(git_dir) / "config", None)
+
 
 def is_git_repo(path: Path) -> bool:
     """Check if a directory is a git repository.
+    The `.git` entries of the directory and its parents are checked
+    directly. Git is only run if the discovery is changed by the
+    environment or the path is inside a git directory.
 
     Args:
         path (Path): Path to the directory.
@@ -54,22 +199,53 @@ def is_git_repo(path: Path) -> bool:
     if not path.exists():
         return False
 
-    _stdout, _stderr, retcode = popen(
-        ["git", "rev-parse", "--is-inside-work-tree"],
-        cwd=path,
-        stderr=False,
-        stdout=False,
-        strict=False,
-    )
-    return retcode == 0
+    path = path.absolute()
+    if ".git" in path.parts or any(
+        env in os.environ for env in GIT_DISCOVERY_ENVS
+    ):
+        retcode, _stdout = _run_git(
+            ["rev-parse", "--is-inside-work-tree"],
+            path,
+        )
+        return retcode == 0
+
+    for directory in (path, *path.parents):
+        git_dir = _find_git_dir(directory)
+        if git_dir is not None:
+            return (git_dir / "HEAD").is_file()
+    return False
+
+
+def git_get_branch(path: Path) -> str | None:
+    """Get the current branch of a repository from its HEAD.
 
+    Args:
+        path (Path): Path to the repository root.
+
+    Returns:
+        str | None: The branch name. None if HEAD is detached or the
+            repository is not found.
+    """
+
+    git_dir = _find_git_dir(path)
+    if git_dir is None:
+        return None
+    try:
+        head = (git_dir / "HEAD").read_text(encoding=DEFAULT_CHARSET).strip()
+    except OSError:
+        return None
+    if head.startswith("ref: refs/heads/"):
+        return head[16:]
+    return None
 
-def git_update(path: Path, branch: str = "main"):
+
+def git_update(path: Path, branch: str = "main", quiet: bool = False):
     """Update a git repository.
 
     Args:
         path (Path): Path to the repository.
         branch (str, optional): Branch to update. Defaults to "main".
+        quiet (bool, optional): Hide the git output. Defaults to False.
     """
 
     if not path.exists():
@@ -85,7 +261,10 @@ def git_update(path: Path, branch: str = "main"):
 
     logger.info("Updating repository '%s'...", str(path))
     call_ktrigger(IKernelTrigger.on_update_git_repo, path=path, branch=branch)
-    Process(["git", "pull", "--verbose"], cwd=path).run()
+    Process(
+        ["git", "pull", "--quiet" if quiet else "--verbose"],
+        cwd=path,
+    ).run()
     logger.info("Repository '%s' updated.", str(path))
 
 
@@ -96,6 +275,7 @@ def git_clone(  # pylint: disable=too-many-arguments
     shallow: bool = True,
     strict: bool = False,
     use_fastest: bool = True,
+    quiet: bool = False,
 ):
     """Clone a git repository.
 
@@ -108,6 +288,7 @@ def git_clone(  # pylint: disable=too-many-arguments
             exists. If False, the repository will be updated. Defaults to
             False.
         use_fastest (bool, optional): Use the fastest mirror. Defaults to True.
+        quiet (bool, optional): Hide the git output. Defaults to False.
     """
 
     if is_git_repo(path):
@@ -123,7 +304,7 @@ def git_clone(  # pylint: disable=too-many-arguments
                 )
             )
         logger.warning("Repository already exists, Updating...")
-        git_update(path, branch)
+        git_update(path, branch, quiet)
         return
 
     old_url = url
@@ -136,7 +317,15 @@ def git_clone(  # pylint: disable=too-many-arguments
         path=path,
         branch=branch,
     )
-    cmd = ["git", "clone", "--verbose", "--branch", branch, url, str(path)]
+    cmd = [
+        "git",
+        "clone",
+        "--quiet" if quiet else "--verbose",
+        "--branch",
+        branch,
+        url,
+        str(path),
+    ]
     if shallow:
         cmd.append("--depth")
         cmd.append("1")
@@ -144,9 +333,20 @@ def git_clone(  # pylint: disable=too-many-arguments
     logger.info("Repository '%s' cloned.", str(path))
 
     if old_url != url:  # Reset the origin URL to official.
-        git_set_remote(path, "origin", get_url(old_url, use_fastest=False))
-        git_set_remote(path, "mirror", url)
-        git_branch_set_upstream(path, branch, "origin")
+        # The clone has only "origin", and the upstream of the branch is
+        # already "origin/<branch>". So the remotes are not queried.
+        Process(
+            [
+                "git",
+                "remote",
+                "set-url",
+                "origin",
+                get_url(old_url, use_fastest=False),
+            ],
+            cwd=path,
+        ).run()
+        Process(["git", "remote", "add", "mirror", url], cwd=path).run()
+        _forget_remotes(path)
 
 
 def git_has_remote(path: Path, remote: str) -> bool:
@@ -160,14 +360,7 @@ def git_has_remote(path: Path, remote: str) -> bool:
         bool: True if the remote repository exists.
     """
 
-    _stdout, _stderr, retcode = popen(
-        ["git", "remote", "get-url", remote],
-        cwd=path,
-        stderr=False,
-        stdout=False,
-        strict=False,
-    )
-    return retcode == 0
+    return remote in _git_remotes(path)
 
 
 def git_get_remote(path: Path, remote: str = "origin") -> str:
@@ -178,14 +371,10 @@ def git_get_remote(path: Path, remote: str = "origin") -> str:
         remote (str, optional): Remote name. Defaults to "origin".
 
     Returns:
-        str: Remote URL.
+        str: Remote URL. Empty if the remote does not exist.
     """
 
-    return popen(
-        ["git", "remote", "get-url", remote],
-        cwd=path,
-        stderr=False,
-    )[0]
+    return _git_remotes(path).get(remote, "")
 
 
 def git_set_remote(path: Path, remote: str, url: str):
@@ -197,10 +386,11 @@ def git_set_remote(path: Path, remote: str, url: str):
         url (str): Remote URL.
     """
 
-    if git_has_remote(path, remote):
-        Process(["git", "remote", "set-url", remote, url], cwd=path).run()
-        return
-    Process(["git", "remote", "add", remote, url], cwd=path).run()
+    action = "set-url" if git_has_remote(path, remote) else "add"
+    try:
+        Process(["git", "remote", action, remote, url], cwd=path).run()
+    finally:
+        _forget_remotes(path)
 
 
 def git_branch_set_upstream(path: Path, branch: str, remote: str = "origin"):
@@ -218,6 +408,174 @@ def git_branch_set_upstream(path: Path, branch: str, remote: str = "origin"):
     ).run()
 
 
+@dataclass
+class GitSyncTarget:
+    """A repository to clone or update by `git_sync()`."""
+
+    url: str  # "user/repo@site" or a git URL.
+    path: Path | None = None  # Defaults to the repository name.
+    branch: str = "main"
+    shallow: bool = True
+
+
+def _repo_dir_name(url: str) -> Path:
+    """Get the default clone directory of a repository.
+
+    Args:
+        url (str): "user/repo@site" or a git URL.
+
+    Returns:
+        Path: The repository name.
+    """
+
+    name = re.split(r"[/:\\]", url.rstrip("/"))[-1]
+    name = name.split("@", 1)[0] if "@" in name else name
+    return Path(name.removesuffix(".git"))
+
+
+def _url_host(url: str) -> str:
+    """Get the host of a git URL.
+
+    Args:
+        url (str): A git URL. e.g. "https://host/repo", "git@host:repo".
+
+    Returns:
+        str: The host. Empty for local paths.
+    """
+
+    host = urlsplit(url).hostname
+    if host:
+        return host
+    matched = re.match(r"^[^/:]*@([^/:]+):", url)  # SCP-like syntax.
+    return matched.group(1) if matched else ""
+
+
+def git_sync(  # pylint: disable=too-many-arguments,too-many-locals
+    targets: list[GitSyncTarget],
+    jobs: int = GIT_SYNC_JOBS,
+    per_host: int = GIT_SYNC_HOST_LIMIT,
+    retries: int = GIT_SYNC_RETRIES,
+    backoff: float = 1.0,
+    use_fastest: bool = True,
+    strict: bool = True,
+) -> list[Exception | None]:
+    """Clone or update many repositories concurrently.
+    The mirrors are selected once per site before syncing. Failed git
+    commands are retried with exponential backoff.
+
+    Args:
+        targets (list[GitSyncTarget]): The repositories.
+        jobs (int, optional): The number of concurrent syncs. Defaults to
+            `GIT_SYNC_JOBS`.
+        per_host (int, optional): The number of concurrent syncs from one
+            host. Defaults to `GIT_SYNC_HOST_LIMIT`.
+        retries (int, optional): Retries of a failed sync. Defaults to
+            `GIT_SYNC_RETRIES`.
+        backoff (float, optional): Seconds to wait before the first retry.
+            It is doubled for every retry. Defaults to 1.0.
+        use_fastest (bool, optional): Use the fastest mirror. Defaults to
+            True.
+        strict (bool, optional): Raise an exception if any repository
+            failed to sync. Defaults to True.
+
+    Returns:
+        list[Exception | None]: The error of every target. None if it is
+            synced.
+
+    Raises:
+        RUValueException: If any repository failed to sync in strict mode.
+    """
+
+    # Select mirrors in this thread. They are memoized for the workers.
+    hosts = [
+        _url_host(get_url(target.url, use_fastest=use_fastest))
+        for target in targets
+    ]
+    host_slots = {
+        host: threading.BoundedSemaphore(max(per_host, 1))
+        for host in set(hosts)
+    }
+    quiet = jobs > 1 and len(targets) > 1
+    task_name = _("Syncing repositories ...")
+
+    def _sync(target: GitSyncTarget, host: str) -> None:
+        path = target.path or _repo_dir_name(target.url)
+        for attempt in range(retries + 1):
+            try:
+                with host_slots[host]:
+                    git_clone(
+                        target.url,
+                        path,
+                        target.branch,
+                        target.shallow,
+                        use_fastest=use_fastest,
+                        quiet=quiet,
+                    )
+                break
+            except RUShellExecutionException:
+                if attempt == retries:
+                    raise
+                logger.warning(
+                    "Failed to sync '%s', retrying (%d/%d) ...",
+                    target.url,
+                    attempt + 1,
+                    retries,
+                    exc_info=True,
+                )
+                time.sleep(backoff * 2**attempt)
+        call_ktrigger(
+            IKernelTrigger.on_progress,
+            task_name=task_name,
+            current=1,
+            delta=True,
+            more_data={"path": path},
+        )
+
+    call_ktrigger(
+        IKernelTrigger.on_new_task,
+        task_name=task_name,
+        task_type=IKernelTrigger.TASK_SYNC,
+        total=len(targets),
+    )
+    with ThreadPoolExecutor(max(jobs, 1), "git-sync") as executor:
+        futures = [
+            executor.submit(_sync, target, host)
+            for target, host in zip(targets, hosts)
+        ]
+        try:
+            errors = [future.exception() for future in futures]
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+
+    failed = [
+        (target, exc) for target, exc in zip(targets, errors) if exc
+    ]
+    for target, exc in failed:
+        logger.error("Failed to sync '%s'.", target.url, exc_info=exc)
+    if failed and strict:
+        raise RUValueException(
+            format_str(
+                _("Failed to sync ${{count}} repositories: ${{repos}}"),
+                fmt={
+                    "count": str(len(failed)),
+                    "repos": ", ".join(target.url for target, _exc in failed),
+                },
+            ),
+        ) from failed[0][1]
+    for target, exc in failed:
+        call_ktrigger(
+            IKernelTrigger.on_warning,
+            message=format_str(
+                _("Failed to sync '${{repo}}': ${{exc}}"),
+                fmt={"repo": target.url, "exc": str(exc)},
+            ),
+        )
+
+    return list(errors)
+
+
 if __name__ == "__main__":
     import shutil
 
@@ -273,7 +631,11 @@ if __name__ == "__main__":
             print(colorama.Fore.LIGHTBLACK_EX, end="", flush=True)
 
         def post_exec_process(
-            self, proc: Process, retcode: int, raise_exc: bool
+            self,
+            proc: Process,
+            retcode: int,
+            raise_exc: bool,
+            usage: ProcessUsage | None = None,
         ) -> None:
             print(colorama.Fore.RESET, end="")
             if retcode != 0:
@@ -287,6 +649,70 @@ if __name__ == "__main__":
     Process(["git", "init"], cwd=git_repo.path).run()
     assert is_git_repo(git_repo.path) is True
     assert is_git_repo(non_git_repo.path) is False
+    (git_repo.path / "sub").mkdir()
+    assert is_git_repo(git_repo.path / "sub") is True
+
+    # Test: Remotes and the branch are read without running git commands.
+    git_set_remote(git_repo.path, "origin", "https://example.com/a.git")
+    git_set_remote(git_repo.path, "mirror", "https://example.org/a.git")
+    assert git_get_remote(git_repo.path) == "https://example.com/a.git"
+    git_set_remote(git_repo.path, "origin", "https://example.com/b.git")
+    assert git_get_remote(git_repo.path) == "https://example.com/b.git"
+    assert git_has_remote(git_repo.path, "mirror") is True
+    assert git_has_remote(git_repo.path, "upstream") is False
+    assert git_get_remote(git_repo.path, "upstream") == ""
+    Process(["git", "checkout", "-q", "-b", "dev"], cwd=git_repo.path).run()
+    assert git_get_branch(git_repo.path) == "dev"
+    assert git_get_branch(non_git_repo.path) is None
+
+    # Test: A worktree-like ".git" file.
+    (non_git_repo.path / ".git").write_text(
+        f"gitdir: {git_repo.path / '.git'}\n",
+        encoding=DEFAULT_CHARSET,
+    )
+    assert is_git_repo(non_git_repo.path) is True
+    assert git_get_branch(non_git_repo.path) == "dev"
+    assert git_has_remote(non_git_repo.path, "mirror") is True
+    (non_git_repo.path / ".git").unlink()
+
+    # Test: Sync local repositories concurrently.
+    sources = []
+    for idx in range(3):
+        source = non_git_repo.path / f"source{idx}.git"
+        source.mkdir()
+        for git_args in (
+            ["init", "-q", "-b", "main"],
+            ["-c", "user.name=T", "-c", "user.email=t@t", "commit", "-q",
+             "--allow-empty", "-m", "init"],
+        ):
+            assert _run_git(git_args, source)[0] == 0
+        sources.append(source)
+    assert _repo_dir_name("cppp-project/cppp-reiconv@github") == Path(
+        "cppp-reiconv",
+    )
+    assert _repo_dir_name("https://example.com/a/b.git") == Path("b")
+    assert _url_host("git@example.com:a/b.git") == "example.com"
+    assert _url_host("/local/path") == ""
+    sync_targets = [
+        GitSyncTarget(str(src), non_git_repo.path / f"clone{idx}")
+        for idx, src in enumerate(sources)
+    ]
+    assert git_sync(sync_targets, jobs=3) == [None, None, None]
+    assert all(is_git_repo(t.path) for t in sync_targets)  # type: ignore
+    sync_targets.append(
+        GitSyncTarget(
+            str(non_git_repo.path / "missing"),
+            non_git_repo.path / "missing-clone",
+        ),
+    )
+    errors_ = git_sync(sync_targets, jobs=2, backoff=0, strict=False)
+    assert errors_[:3] == [None, None, None]  # Updated.
+    assert isinstance(errors_[3], RUShellExecutionException)
+    try:
+        git_sync(sync_targets[3:], retries=0)
+        assert False, "Should raise a RUValueException."
+    except RUValueException:
+        pass
 
     # Test: Clone a repository shallowly.
     git_clone(
@@ -25,60 +25,294 @@ e.g:
 """
 
 import asyncio
+import json
+import os
 import re
+import threading
+import time
+import uuid
+from pathlib import Path
 
-import json5 as json
+import aiohttp
 from urllib3.util import parse_url
 
 from rubisco.config import (DEFAULT_CHARSET, GLOBAL_CONFIG_DIR,
-                            USER_CONFIG_DIR, WORKSPACE_CONFIG_DIR)
+                            MIRROR_LATENCY_ALPHA, MIRROR_LATENCY_TTL,
+                            USER_CONFIG_DIR, USER_MIRROR_LATENCY_FILE,
+                            WORKSPACE_CONFIG_DIR)
+from rubisco.kernel.config_file import config
 from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.jsonfile import load_json5
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
-from rubisco.lib.speedtest import C_INTMAX, url_speedtest
+from rubisco.lib.speedtest import (C_INTMAX, new_speedtest_session,
+                                   url_speedtest)
 from rubisco.lib.variable import AutoFormatDict, format_str
 from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
-__all__ = ["get_url"]
+__all__ = ["get_url", "find_fastest_mirror", "MirrorLatencyDB"]
 
 WORKSPACE_MIRRORLIST_FILE = WORKSPACE_CONFIG_DIR / "mirrorlist.json"
 USER_MIRRORLIST_FILE = USER_CONFIG_DIR / "mirrorlist.json"
 GLOBAL_MIRRORLIST_FILE = GLOBAL_CONFIG_DIR / "mirrorlist.json"
 
 mirrorlist: AutoFormatDict = AutoFormatDict()
+_mirrorlist_loaded = False  # pylint: disable=invalid-name
+
+
+def _load_mirrorlist() -> None:
+    """Load the mirrorlist files on first use."""
+
+    global _mirrorlist_loaded  # pylint: disable=global-statement
+
+    if _mirrorlist_loaded:
+        return
+    _mirrorlist_loaded = True
+    for mirrorlist_file in [
+        GLOBAL_MIRRORLIST_FILE,
+        USER_MIRRORLIST_FILE,
+        WORKSPACE_MIRRORLIST_FILE,
+    ]:
+        if mirrorlist_file.exists():
+            try:
+                with mirrorlist_file.open("r", encoding=DEFAULT_CHARSET) as f:
+                    file_data: dict = load_json5(f)
+                    lower_data = {
+                        k.lower() if isinstance(k, str) else k: v
+                        for k, v in file_data.items()
+                    }
+                    mirrorlist.merge(lower_data)
+            except (OSError, ValueError) as exc:
+                logger.warning(
+                    "Failed to load mirrorlist file: %s: %s",
+                    mirrorlist_file,
+                    exc,
+                )
+
+
+class MirrorLatencyDB:
+    """
+    Persistent latencies of the mirror hosts.
+    Every record has the exponentially-weighted average latency (us), the
+    time of the last probe and the number of consecutive failures.
+    """
+
+    path: Path
+    _records: dict[str, dict] | None
+    _lock: threading.RLock
+
+    def __init__(self, path: Path) -> None:
+        """Create a latency database.
+
+        Args:
+            path (Path): The database file. It will be loaded lazily.
+        """
 
-for mirrorlist_file in [
-    GLOBAL_MIRRORLIST_FILE,
-    USER_MIRRORLIST_FILE,
-    WORKSPACE_MIRRORLIST_FILE,
-]:
-    if mirrorlist_file.exists():
+        self.path = path
+        self._records = None
+        self._lock = threading.RLock()
+
+    def _read(self) -> dict[str, dict]:
         try:
-            with mirrorlist_file.open("r", encoding=DEFAULT_CHARSET) as f:
-                file_data: dict = json.load(f)
-                lower_data = {
-                    k.lower() if isinstance(k, str) else k: v
-                    for k, v in file_data.items()
-                }
-                mirrorlist.merge(lower_data)
-        except (OSError, json.JSON5DecodeError) as exc_:
-            logger.warning(
-                "Failed to load mirrorlist file: %s: %s", mirrorlist_file, exc_
+            with self.path.open("r", encoding=DEFAULT_CHARSET) as f:
+                records = json.load(f)
+            if isinstance(records, dict):
+                return records
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            logger.warning("Invalid mirror latency database.", exc_info=True)
+        return {}
+
+    def get(self, host: str) -> dict | None:
+        """Get the record of a host.
+
+        Args:
+            host (str): The host URL.
+
+        Returns:
+            dict | None: The record. None if it is never probed.
+        """
+
+        with self._lock:
+            if self._records is None:
+                self._records = self._read()
+            return self._records.get(host)
+
+    def update(self, host: str, latency: int) -> None:
+        """Add a probe result.
+
+        Args:
+            host (str): The host URL.
+            latency (int): The latency (us). C_INTMAX means failure.
+        """
+
+        with self._lock:
+            # Merge the results of other processes.
+            self._records = self._read()
+            record = self._records.setdefault(
+                host,
+                {"latency": None, "time": 0, "failures": 0},
             )
+            record["time"] = time.time()
+            if latency >= C_INTMAX:
+                record["failures"] += 1
+            elif record["latency"] is None:
+                record["latency"] = latency
+                record["failures"] = 0
+            else:
+                record["latency"] = int(
+                    MIRROR_LATENCY_ALPHA * latency
+                    + (1 - MIRROR_LATENCY_ALPHA) * record["latency"]
+                )
+                record["failures"] = 0
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = self.path.with_name(
+                    f"{self.path.name}.{uuid.uuid4().hex}.tmp",
+                )
+                with temp_file.open("w", encoding=DEFAULT_CHARSET) as f:
+                    json.dump(self._records, f)
+                os.replace(temp_file, self.path)
+            except OSError:
+                logger.warning(
+                    "Failed to save mirror latency database.",
+                    exc_info=True,
+                )
+
+
+latency_db = MirrorLatencyDB(USER_MIRROR_LATENCY_FILE)
+
+# The fastest mirror of every (host, protocol) in this process.
+_fastest_mirrors: dict[tuple[str, str], str] = {}
+_refreshing: set[tuple[str, str]] = set()
+_refreshing_lock = threading.Lock()
+
+
+def _mirror_host(url: str) -> str:
+    parsed_url = parse_url(url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}"  # Host only.
+
+
+def _latency_ttl() -> float:
+    return config.get("mirror-latency-ttl", MIRROR_LATENCY_TTL, valtype=int)
+
+
+async def _probe_mirrors(
+    mlist: AutoFormatDict,
+    quiet: bool = False,
+) -> dict[str, int]:
+    """Probe the hosts of all mirrors with a shared session.
+    If it is not quiet, it returns after a short grace period after the
+    first successful probe, and unfinished probes are not recorded.
+    Otherwise, it waits for all probes.
 
+    Args:
+        mlist (AutoFormatDict): The mirrorlist.
+        quiet (bool, optional): Do not call kernel triggers and wait for
+            all probes. Defaults to False.
 
-async def _speedtest(future: asyncio.Future, mirror: str, url: str):
-    try:
-        parsed_url = parse_url(url)
-        url = f"{parsed_url.scheme}://{parsed_url.host}"  # Host only.
-        call_ktrigger(IKernelTrigger.pre_speedtest, host=url)
-        speed = await url_speedtest(url)
-        if future.done():
+    Returns:
+        dict[str, int]: The latency of the probed hosts.
+    """
+
+    hosts = {_mirror_host(murl) for murl in mlist.values()}
+    results: dict[str, int] = {}
+
+    async def _probe(host: str, session: aiohttp.ClientSession) -> None:
+        if not quiet:
+            call_ktrigger(IKernelTrigger.pre_speedtest, host=host)
+        try:
+            speed = await url_speedtest(host, session)
+        except asyncio.exceptions.CancelledError:
+            if not quiet:
+                call_ktrigger(IKernelTrigger.post_speedtest, host=host, speed=-1)  # noqa: E501
+            raise
+        results[host] = speed
+        latency_db.update(host, speed)
+        if not quiet:
+            call_ktrigger(IKernelTrigger.post_speedtest, host=host, speed=speed)  # noqa: E501
+
+    async with new_speedtest_session() as session:
+        pending = {
+            asyncio.ensure_future(_probe(host, session)) for host in hosts
+        }
+        while pending and (
+            quiet or all(speed >= C_INTMAX for speed in results.values())
+        ):
+            _, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        if pending:  # Give the others a chance to finish.
+            fastest = min(results.values())
+            _, pending = await asyncio.wait(
+                pending,
+                timeout=max(fastest * 2 / 1e6, 0.2),
+            )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return results
+
+
+def _pick_mirror(mlist: AutoFormatDict) -> tuple[str, bool]:
+    """Pick the fastest mirror by the latency database.
+
+    Args:
+        mlist (AutoFormatDict): The mirrorlist.
+
+    Returns:
+        tuple[str, bool]: The mirror name ("" if no mirror is known) and
+            whether all the records are fresh.
+    """
+
+    now = time.time()
+    ttl = _latency_ttl()
+    fresh = True
+    best, best_latency = "", C_INTMAX
+    for mirror, murl in mlist.items():
+        record = latency_db.get(_mirror_host(murl))
+        if record is None:
+            fresh = False
+            continue
+        if now - record["time"] > ttl:
+            fresh = False
+        if record["failures"] or record["latency"] is None:
+            continue
+        if record["latency"] < best_latency:
+            best, best_latency = mirror, record["latency"]
+
+    return best, fresh
+
+
+def _refresh_in_background(host: str, protocol: str) -> None:
+    """Re-probe the mirrors of a host in a daemon thread.
+
+    Args:
+        host (str): The host.
+        protocol (str): Connection protocol.
+    """
+
+    key = (host, protocol)
+    with _refreshing_lock:
+        if key in _refreshing:
             return
-        call_ktrigger(IKernelTrigger.post_speedtest, host=url, speed=speed)
-        future.set_result(mirror)
-    except asyncio.exceptions.CancelledError:
-        call_ktrigger(IKernelTrigger.post_speedtest, host=url, speed=-1)
+        _refreshing.add(key)
+
+    def _refresh() -> None:
+        try:
+            asyncio.run(
+                _probe_mirrors(get_mirrorlist(host, protocol), quiet=True),
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.warning("Failed to refresh mirror latency.", exc_info=True)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=_refresh, daemon=True).start()
 
 
 def get_mirrorlist(
@@ -96,6 +330,7 @@ def get_mirrorlist(
         dict: The mirrorlist.
     """
 
+    _load_mirrorlist()
     host = host.lower()
 
     mlist1 = mirrorlist.get(host, valtype=dict | str)
@@ -123,6 +358,8 @@ async def find_fastest_mirror(
     protocol: str = "http",
 ) -> str:
     """Find the fastest mirror in mirrorlist.
+    The latency database is used if it has records of the mirrors. Stale
+    records are refreshed in the background.
 
     Args:
         host (str): The host you want to find.
@@ -133,24 +370,26 @@ async def find_fastest_mirror(
         str: The mirror name.
     """
 
+    key = (host.lower(), protocol)
+    if key in _fastest_mirrors:
+        return _fastest_mirrors[key]
+
     try:
         mlist: AutoFormatDict = get_mirrorlist(host, protocol)
-        future = asyncio.get_event_loop().create_future()
-        tasks: list[asyncio.Task] = []
-        for mirror, murl in mlist.items():
-            task = asyncio.ensure_future(_speedtest(future, mirror, murl))
-            tasks.append(task)
-        # Waiting for fastest mirror (future result is set).
-        await future
-        for task in tasks:
-            task.cancel("Fastest mirror found.")
-        fastest = future.result()
-        if fastest == C_INTMAX:
-            return "official"
-        return fastest
     except KeyError:
         return "official"
 
+    fastest, fresh = _pick_mirror(mlist)
+    if not fastest:
+        await _probe_mirrors(mlist)
+        fastest, fresh = _pick_mirror(mlist)
+        fastest = fastest or "official"
+    if not fresh:
+        _refresh_in_background(host, protocol)
+
+    _fastest_mirrors[key] = fastest
+    return fastest
+
 
 def get_url(
     remote: str,
@@ -176,8 +415,10 @@ def get_url(
     )  # user/repo@website.
     if matched:
         user, repo, website = matched.groups()
-        if use_fastest:
-            mirror = asyncio.run(find_fastest_mirror(website))
+        if use_fastest and (website.lower(), protocol) in _fastest_mirrors:
+            mirror = _fastest_mirrors[(website.lower(), protocol)]
+        elif use_fastest:
+            mirror = asyncio.run(find_fastest_mirror(website, protocol))
         else:
             mirror = "official"
         try:
@@ -221,6 +462,80 @@ if __name__ == "__main__":
     kt = _TestKTrigger()
     bind_ktrigger_interface("Test", kt)
 
+    # Test: Pick the fastest mirror of local servers and reuse the result.
+    import tempfile
+
+    from rubisco.lib.testserver import \
+        QuietHTTPRequestHandler  # pylint: disable=ungrouped-imports
+    from rubisco.lib.testserver import \
+        start_test_server  # pylint: disable=ungrouped-imports
+
+    class _Handler(QuietHTTPRequestHandler):
+        delay = 0.0
+        count = 0
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Reply an empty page after the delay."""
+
+            type(self).count += 1
+            time.sleep(self.delay)
+            self.send_response(200)
+            self.end_headers()
+
+    class _SlowHandler(_Handler):
+        delay = 0.5
+
+    servers = []
+    for handler in [_SlowHandler, _Handler]:
+        servers.append(start_test_server(handler))
+    path_ = "/${{ user }}/${{ repo }}"
+    mirrorlist.merge(
+        {
+            "test": {
+                "http": {
+                    "official": (
+                        f"http://127.0.0.1:{servers[0].server_port}{path_}"
+                    ),
+                    "fast": (
+                        f"http://127.0.0.1:{servers[1].server_port}{path_}"
+                    ),
+                },
+            },
+        },
+    )
+    with tempfile.TemporaryDirectory() as temp:
+        latency_db.path = Path(temp) / "latency.json"
+        assert get_url("a/b@test").endswith("/a/b")
+        assert asyncio.run(find_fastest_mirror("test")) == "fast"
+        assert _Handler.count == 1
+
+        # Test: The unrecorded slow mirror is probed in the background.
+        _fastest_mirrors.clear()
+        assert asyncio.run(find_fastest_mirror("test")) == "fast"
+        while _refreshing:
+            time.sleep(0.05)
+        assert _Handler.count == 2
+        assert latency_db.get(f"http://127.0.0.1:{servers[0].server_port}")  # noqa: E501
+
+        # Test: Use the database in a new process without probing.
+        _fastest_mirrors.clear()
+        latency_db = MirrorLatencyDB(latency_db.path)
+        assert asyncio.run(find_fastest_mirror("test")) == "fast"
+        assert not _refreshing
+        assert _Handler.count == 2
+        record_ = latency_db.get(f"http://127.0.0.1:{servers[1].server_port}")  # noqa: E501
+        assert record_ and record_["failures"] == 0
+
+        # Test: Stale records are refreshed in the background.
+        _fastest_mirrors.clear()
+        record_["time"] = 0
+        assert asyncio.run(find_fastest_mirror("test")) == "fast"
+        while _refreshing:
+            time.sleep(0.05)
+        assert _Handler.count == 3
+    for server in servers:
+        server.shutdown()
+
     # Test: Find the fastest mirror.
     rich.print(asyncio.run(find_fastest_mirror("github")))
 
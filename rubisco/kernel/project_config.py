@@ -25,18 +25,19 @@ Project configuration loader.
 from pathlib import Path
 from typing import Any
 
-import json5 as json
-
 from rubisco.config import APP_VERSION, USER_REPO_CONFIG
 from rubisco.kernel.workflow import run_inline_workflow, run_workflow
 from rubisco.lib.exceptions import RUValueException
 from rubisco.lib.fileutil import glob_path, resolve_path
+from rubisco.lib.jsonfile import load_json5
 from rubisco.lib.l10n import _
 from rubisco.lib.process import Process
+from rubisco.lib.tracing import span
 from rubisco.lib.variable import (AutoFormatDict, assert_iter_types,
                                   format_str, make_pretty, pop_variables,
                                   push_variables)
 from rubisco.lib.version import Version
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
 __all__ = [
     "ProjectConfigration",
@@ -66,44 +67,50 @@ class ProjectHook:  # pylint: disable=too-few-public-methods
             {},
             valtype=dict,
         )
+        call_ktrigger(IKernelTrigger.pre_run_hook, hook=self)
         try:
             for name, val in variables.items():  # Push all variables first.
                 push_variables(name, val)
 
-            cmd = self._raw_data.get("exec", None, valtype=str | list | None)
-            workflow = self._raw_data.get("run", None, valtype=str | None)
-            inline_wf = self._raw_data.get(
-                "workflow",
-                None,
-                valtype=dict | AutoFormatDict | list | None,
-            )
+            with span(self.name, "hook"):
+                self._run()
+        finally:
+            for name in variables.keys():
+                pop_variables(name)
+            call_ktrigger(IKernelTrigger.post_run_hook, hook=self)
+
+    def _run(self) -> None:
+        cmd = self._raw_data.get("exec", None, valtype=str | list | None)
+        workflow = self._raw_data.get("run", None, valtype=str | None)
+        inline_wf = self._raw_data.get(
+            "workflow",
+            None,
+            valtype=dict | AutoFormatDict | list | None,
+        )
 
-            if not cmd and not workflow and not inline_wf:
-                raise RUValueException(
-                    format_str(
-                        _("Hook '${{name}}' is invalid."),
-                        fmt={"name": make_pretty(self.name)},
-                    ),
-                    hint=_(
-                        "A workflow [yellow]SHOULD[/yellow] contain at "
-                        "least 'exec', 'run' and 'workflow'."
-                    ),
-                )
+        if not cmd and not workflow and not inline_wf:
+            raise RUValueException(
+                format_str(
+                    _("Hook '${{name}}' is invalid."),
+                    fmt={"name": make_pretty(self.name)},
+                ),
+                hint=_(
+                    "A workflow [yellow]SHOULD[/yellow] contain at "
+                    "least 'exec', 'run' and 'workflow'."
+                ),
+            )
 
-            # Then, run inline workflow.
-            if inline_wf:
-                run_inline_workflow(inline_wf)
+        # Then, run inline workflow.
+        if inline_wf:
+            run_inline_workflow(inline_wf)
 
-            # Then, run workflow.
-            if workflow:
-                run_workflow(Path(workflow))
+        # Then, run workflow.
+        if workflow:
+            run_workflow(Path(workflow))
 
-            # Finally, execute shell command.
-            if cmd:
-                Process(cmd).run()
-        finally:
-            for name in variables.keys():
-                pop_variables(name)
+        # Finally, execute shell command.
+        if cmd:
+            Process(cmd).run()
 
 
 class ProjectConfigration:  # pylint: disable=too-many-instance-attributes
@@ -137,7 +144,7 @@ class ProjectConfigration:  # pylint: disable=too-many-instance-attributes
 
     def _load(self):
         with self.config_file.open() as file:
-            self.config = AutoFormatDict(json.load(file))
+            self.config = AutoFormatDict(load_json5(file))
 
         self.name = self.config.get("name", valtype=str)
         self.version = Version(self.config.get("version", valtype=str))
@@ -244,7 +251,7 @@ class ProjectConfigration:  # pylint: disable=too-many-instance-attributes
 def _load_config(config_file: Path, loaded_list: list[Path]) -> AutoFormatDict:
     config_file = config_file.resolve()
     with config_file.open() as file:
-        config = AutoFormatDict(json.load(file))
+        config = AutoFormatDict(load_json5(file))
         if not isinstance(config, AutoFormatDict):
             raise RUValueException(
                 format_str(
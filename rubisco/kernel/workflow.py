@@ -18,33 +18,39 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+
 """
 Workflow support.
 Workflow is a ordered list of steps. Each step only contains one action.
 """
 
-import glob
+import heapq
 import os
-import shutil
-import sys
-import uuid
-from abc import abstractmethod
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
 from pathlib import Path
 
-import json5 as json
-import yaml
-
 from rubisco.config import DEFAULT_CHARSET
-from rubisco.lib.archive import compress, extract
+from rubisco.kernel.fingerprint import fingerprints
+from rubisco.kernel.workflow_plan import (StepPlan, WorkflowPlan,
+                                          compile_workflow, get_step_type,
+                                          load_workflow,
+                                          push_workflow_variables,
+                                          register_lazy_step_type,
+                                          register_step_type)
+from rubisco.kernel.workflow_steps import (CompressStep, CopyFileStep,
+                                           EchoStep, ExtentionLoadStep,
+                                           ExtractStep, FetchExtractStep,
+                                           MkdirStep, MklinkStep, MoveFileStep,
+                                           OutputStep, PopenStep, RemoveStep,
+                                           ShellExecStep, Step,
+                                           WorkflowRunStep, _set_extloader)
 from rubisco.lib.exceptions import RUValueException
-from rubisco.lib.fileutil import (check_file_exists, copy_recursive,
-                                  rm_recursive)
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
-from rubisco.lib.process import Process, popen
-from rubisco.lib.variable import (AutoFormatDict, assert_iter_types,
-                                  format_str, make_pretty, pop_variables,
-                                  push_variables)
+from rubisco.lib.tracing import span
+from rubisco.lib.variable import (AutoFormatDict, format_str, get_variable,
+                                  pop_variables, variables)
 from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
 __all__ = [
@@ -62,691 +68,202 @@ __all__ = [
     "MklinkStep",
     "CompressStep",
     "ExtractStep",
+    "FetchExtractStep",
+    "StepPlan",
+    "WorkflowPlan",
     "Workflow",
+    "compile_workflow",
+    "load_workflow",
+    "register_lazy_step_type",
     "register_step_type",
     "run_inline_workflow",
     "run_workflow",
     "_set_extloader",
 ]
 
-try:  # Avoid circular import.
-    from rubisco.shared.extention import load_extention
-except ImportError:
-    load_extention = NotImplemented
-
-
-def _set_extloader(extloader):  # Avoid circular import.
-    global load_extention  # pylint: disable=global-statement
 
-    load_extention = extloader
-
-
-class Step:  # pylint: disable=too-many-instance-attributes
-    """A step in the workflow."""
+class Workflow:  # pylint: disable=too-many-instance-attributes
+    """A workflow."""
 
     id: str
-    parent_workflow: "Workflow"
     name: str
-    next: "Step | None"
-    raw_data: AutoFormatDict
-    global_id: str
-    strict: bool
-    suc: bool
+    first_step: Step | None
+    plan: WorkflowPlan
+    parallel: bool
+    jobs: int
 
-    def __init__(self, data: AutoFormatDict, parent_workflow: "Workflow"):
-        """Create a new step.
+    pushed_variables: list[str]
+
+    def __init__(self, data: AutoFormatDict | WorkflowPlan) -> None:
+        """Create a new workflow.
 
         Args:
-            data (AutoFormatDict): The step json data.
-            parent_workflow (Workflow): The parent workflow.
+            data (AutoFormatDict | WorkflowPlan): The workflow json data or
+                its compiled plan.
         """
 
-        self.suc = False
-
-        self.parent_workflow = parent_workflow
-        self.raw_data = data
-        self.name = data.get("name", "", valtype=str)
-        self.strict = data.get("strict", True, valtype=bool)
-        self.next = None
-        self.id = data.get("id", valtype=str)  # Always exists.
-        self.global_id = f"{self.parent_workflow.id}.{self.id}"
-
-        self.init()
+        self.pushed_variables = []
+        self.first_step = None
 
-        call_ktrigger(
-            IKernelTrigger.pre_run_workflow_step,
-            step=self,
-        )
+        if not isinstance(data, WorkflowPlan):
+            data = compile_workflow(data)
+        self.plan = data
 
-        try:
-            self.run()
-        except Exception as exc:  # pylint: disable=broad-exception-caught
-            if self.strict:
-                raise exc from None
-            logger.warning("Step %s failed.", self.name, exc_info=True)
-            call_ktrigger(
-                IKernelTrigger.on_error,
-                message=format_str(
-                    _("Step '${{step}}' failed: ${{exc}}"),
-                    fmt={
-                        "step": make_pretty(self.name, _("<Unnamed>")),
-                        "exc": f"{type(exc).__name__}: {str(exc)}",
-                    },
-                ),
-            )
+        self.pushed_variables = push_workflow_variables(self.plan.variables)
 
-        self.suc = True
+        self.id = format_str(self.plan.id)
+        self.name = format_str(self.plan.name)
+        self.parallel = self.plan.parallel
+        jobs = self.plan.jobs
+        if not jobs or jobs < 1:
+            jobs = get_variable("nproc") or 1
+        self.jobs = int(jobs)
 
-    def __str__(self):
-        """Return the name of the step.
+    @property
+    def raw_data(self) -> AutoFormatDict:
+        """The workflow json data.
 
         Returns:
-            str: The name of the step.
+            AutoFormatDict: The workflow json data.
         """
 
-        return self.name
+        return AutoFormatDict(self.plan.data)
 
-    def __repr__(self):
-        """Return the representation of the step.
+    def _run_step(self, step_plan: StepPlan) -> Step:
+        """Create and execute a step.
+
+        Args:
+            step_plan (StepPlan): The compiled step.
 
         Returns:
-            str: The repr of the step.
+            Step: The executed step.
         """
 
-        return f"<{self.__class__.__name__} {self.name}>"
+        step_cls = get_step_type(step_plan.step_type, step_plan.name)
+        with span(
+            step_plan.name or step_plan.id,
+            "step",
+            id=f"{self.id}.{step_plan.id}",
+            type=step_plan.step_type,
+        ):
+            step = step_cls(AutoFormatDict(step_plan.data), self)
+            step.execute()
+        return step
+
+    def _run_steps_parallel(  # pylint: disable=too-many-locals
+        self,
+    ) -> list[Step]:
+        """Run the steps as a dependency graph.
+
+        A step is started once all the steps it needs have finished. At most
+        `jobs` steps run at the same time. The first failed step stops
+        scheduling new steps, the running steps are waited and the exception
+        is raised. Post-run triggers are called in the declaration order.
 
-    @abstractmethod
-    def init(self) -> None:
-        """
-        Initialize the step.
-        """
-
-    @abstractmethod
-    def run(self) -> None:
-        """
-        Run the step.
+        Returns:
+            list[Step]: The finished steps in declaration order.
         """
 
-
-# Built-in step types.
-class ShellExecStep(Step):
-    """A shell execution step."""
-
-    cmd: str
-    cwd: Path
-    fail_on_error: bool
-
-    def init(self):
-        self.cmd = self.raw_data.get("run", valtype=str | list)
-        if isinstance(self.cmd, list):
-            assert_iter_types(
-                self.cmd,
-                str,
-                RUValueException(
-                    _("The shell command list must be a list of strings.")
-                ),
-            )
-
-        self.cwd = Path(self.raw_data.get("cwd", "", valtype=str))
-        self.fail_on_error = self.raw_data.get(
-            "fail-on-error",
-            True,
-            valtype=bool,
-        )
-
-    def run(self):
-        retcode = Process(self.cmd, self.cwd).run(self.fail_on_error)
-        push_variables(f"{self.global_id}.retcode", retcode)
-
-
-class MkdirStep(Step):
-    """Make directories."""
-
-    paths: list[Path]
-
-    def init(self):
-        paths = self.raw_data.get("mkdir", valtype=str | list)
-        if isinstance(paths, list):
-            assert_iter_types(
-                paths,
-                str,
-                RUValueException(
-                    _(
-                        "The paths must be a list of strings.",
-                    )
-                ),
-            )
-            self.paths = [Path(path) for path in paths]
-        else:
-            self.paths = [Path(paths)]
-
-    def run(self):
-        for path in self.paths:
-            call_ktrigger(IKernelTrigger.on_mkdir, path=path)
-            os.makedirs(path, exist_ok=True)
-
-
-class PopenStep(Step):
-    """Read the output of a shell command."""
-
-    cmd: str
-    cwd: Path
-    fail_on_error: bool
-    stdout: bool
-    stderr: int
-
-    def init(self):
-        self.cmd = self.raw_data.get("popen", valtype=str)
-
-        self.cwd = Path(self.raw_data.get("cwd", "", valtype=str))
-        self.fail_on_error = self.raw_data.get(
-            "fail-on-error",
-            True,
-            valtype=bool,
-        )
-        self.stdout = self.raw_data.get("stdout", True, valtype=bool)
-        stderr_mode = self.raw_data.get("stderr", True, valtype=bool | str)
-        if stderr_mode is True:
-            self.stderr = 1
-        elif stderr_mode is False:
-            self.stderr = 0
-        else:
-            self.stderr = 2
-
-    def run(self):
-        stdout, stderr, retcode = popen(
-            self.cmd, self.cwd, self.stdout, self.stderr, self.fail_on_error
-        )
-        push_variables(f"{self.global_id}.stdout", stdout)
-        push_variables(f"{self.global_id}.stderr", stderr)
-        push_variables(f"{self.global_id}.retcode", retcode)
-
-
-class OutputStep(Step):
-    """Output a message."""
-
-    msg: str
-
-    def init(self):
-        msg = self.raw_data.get("output", None)
-        if msg is None:
-            msg = self.raw_data.get("echo", None)
-
-        self.msg = str(msg)
-
-    def run(self):
-        call_ktrigger(IKernelTrigger.on_output, msg=self.msg)
-
-
-EchoStep = OutputStep
-
-
-class MoveFileStep(Step):
-    """Move a file."""
-
-    src: Path
-    dst: Path
-
-    def init(self):
-        self.src = Path(self.raw_data.get("move", valtype=str))
-        self.dst = Path(self.raw_data.get("to", valtype=str))
-
-    def run(self):
-        call_ktrigger(IKernelTrigger.on_move_file, src=self.src, dst=self.dst)
-        check_file_exists(self.dst)
-        shutil.move(self.src, self.dst)
-
-
-class CopyFileStep(Step):
-    """Copy files or directories."""
-
-    srcs: Path
-    dst: Path
-    overwrite: bool
-    keep_symlinks: bool
-    excludes: list[str] | None
-
-    def init(self):
-        srcs = self.raw_data.get("copy", valtype=str | list)
-        self.dst = Path(self.raw_data.get("to", valtype=str))
-
-        if isinstance(srcs, str):
-            self.srcs = [Path(srcs)]
-        else:
-            assert_iter_types(
-                srcs,
-                str,
-                RUValueException(_("The copy item must be a string.")),
-            )
-            self.srcs = [Path(src) for src in srcs]
-
-        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
-        self.keep_symlinks = self.raw_data.get(
-            "keep-symlinks",
-            False,
-            valtype=bool,
-        )
-        self.excludes = self.raw_data.get(
-            "excludes",
-            None,
-            valtype=list | None,
-        )
-
-    def run(self):
-        if self.overwrite and self.dst.exists():
-            rm_recursive(self.dst, strict=True)
-        if self.dst.is_dir():
-            check_file_exists(self.dst)
-
-        for src_glob in self.srcs:
-            for src in glob.glob(str(src_glob)):
-                src = Path(src)
-                call_ktrigger(IKernelTrigger.on_copy, src=src, dst=self.dst)
-                copy_recursive(
-                    src,
-                    self.dst,
-                    not self.overwrite,
-                    self.keep_symlinks,
-                    self.overwrite,
-                    self.excludes,
-                )
-
-
-class RemoveStep(Step):
-    """
-    Remove a file or directory.
-    This step is dangerous. Use it with caution!
-    """
-
-    globs: list[str]
-    excludes: list[str]
-    include_hidden: bool
-
-    def init(self):
-        remove = self.raw_data.get("remove", valtype=str | list)
-        if isinstance(remove, str):
-            self.globs = [remove]
-        else:
-            assert_iter_types(
-                remove,
-                str,
-                RUValueException(_("The remove item must be a string.")),
-            )
-            self.globs = remove
-
-        self.include_hidden = self.raw_data.get(
-            "include-hidden",
-            False,
-            valtype=bool,
-        )
-        self.excludes = self.raw_data.get("excludes", [], valtype=list)
-
-    def run(self):
-        for glob_partten in self.globs:
-            if sys.version_info >= (3, 10):
-                paths = glob.glob(  # pylint: disable=unexpected-keyword-arg
-                    glob_partten,
-                    recursive=True,
-                    include_hidden=self.include_hidden,
-                )
-            else:
-                paths = glob.glob(
-                    glob_partten,
-                    recursive=True,
+        steps = self.plan.steps
+        pending = [set(step.needs) for step in steps]
+        dependents: list[list[int]] = [[] for _step in steps]
+        for idx, step in enumerate(steps):
+            for need in step.needs:
+                dependents[need].append(idx)
+
+        ready = [idx for idx, needs in enumerate(pending) if not needs]
+        heapq.heapify(ready)
+        finished: dict[int, Step] = {}
+        running: dict[Future, int] = {}
+        first_exc: Exception | None = None
+        emitted = 0
+
+        with ThreadPoolExecutor(
+            max_workers=self.jobs,
+            thread_name_prefix=f"workflow-{self.id}",
+        ) as executor:
+            while ready or running:
+                while ready and first_exc is None and len(running) < self.jobs:
+                    idx = heapq.heappop(ready)
+                    running[executor.submit(self._run_step, steps[idx])] = idx
+                if not running:
+                    break
+
+                done, _not_done = wait_futures(
+                    running,
+                    return_when=FIRST_COMPLETED,
                 )
-            for path in paths:
-                path = Path(path)
-                call_ktrigger(IKernelTrigger.on_remove, path=path)
-                rm_recursive(path, strict=True)
-
-
-class ExtentionLoadStep(Step):
-    """
-    Load a Rubisco Excention manually.
-    """
-
-    path: Path
-
-    def init(self):
-        self.path = Path(self.raw_data.get("extention", valtype=str))
-
-    def run(self):
-        load_extention(self.path, strict=True)
-
-
-class WorkflowRunStep(Step):
-    """
-    Run another workflow.
-    """
-
-    path: Path
-    fail_fast: bool
-
-    def init(self):
-        self.path = Path(self.raw_data.get("workflow", valtype=str))
-
-        self.fail_fast = self.raw_data.get("fail-fast", True, valtype=bool)
-
-    def run(self):
-        exc = run_workflow(self.path, self.fail_fast)
-        if exc:
-            push_variables(f"{self.global_id}.exception", exc)
-
-
-class MklinkStep(Step):
-    """
-    Make a symbolic link.
-    """
-
-    src: Path
-    dst: Path
-    symlink: bool
-
-    def init(self):
-        self.src = Path(self.raw_data.get("mklink", valtype=str))
-        self.dst = Path(self.raw_data.get("to", valtype=str))
-
-        self.symlink = self.raw_data.get("symlink", True, valtype=bool)
-
-    def run(self):
-        call_ktrigger(
-            IKernelTrigger.on_mklink,
-            src=self.src,
-            dst=self.dst,
-            symlink=self.symlink,
-        )
-
-        if self.symlink:
-            os.symlink(self.src, self.dst)
-        else:
-            os.link(self.src, self.dst)
-
-
-class CompressStep(Step):
-    """
-    Make a compressed archive.
-    """
-
-    src: Path
-    dst: Path
-    start: Path | None
-    excludes: list[str] | None
-    compress_format: str | None
-    compress_level: int | None
-    overwrite: bool
-
-    def init(self):
-        self.src = Path(self.raw_data.get("compress", valtype=str))
-        self.dst = Path(self.raw_data.get("to", valtype=str))
-        _start = self.raw_data.get("start", None, valtype=str | None)
-        self.start = Path(_start) if _start else None
-        self.excludes = self.raw_data.get(
-            "excludes",
-            None,
-            valtype=list | None,
-        )
-        self.compress_format = self.raw_data.get(
-            "format",
-            None,
-            valtype=str | list | None,
-        )
-        self.compress_level = self.raw_data.get(
-            "level",
-            None,
-            valtype=int | None,
-        )
-        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
-
-    def run(self):
-        if isinstance(self.compress_format, list):
-            assert_iter_types(
-                self.compress_format,
-                str,
-                RUValueException(
-                    _("Compress format must be a list of string or a string.")
-                ),
-            )
-            for fmt in self.compress_format:
-                if fmt == "gzip":
-                    ext = ".gz"
-                elif fmt == "bzip2":
-                    ext = ".bz2"
-                elif fmt == "lzma":
-                    ext = ".xz"
-                elif fmt == "tgz":
-                    ext = ".tar.gz"
-                elif fmt == "tbz2":
-                    ext = ".tar.bz2"
-                elif fmt == "txz":
-                    ext = ".tar.xz"
-                else:
-                    ext = f".{fmt}"
-
-                dst = Path(str(self.dst) + ext)
-                compress(
-                    self.src,
-                    dst,
-                    self.start,
-                    self.excludes,
-                    fmt,
-                    self.compress_level,
-                    self.overwrite,
-                )
-        else:
-            compress(
-                self.src,
-                self.dst,
-                self.start,
-                self.excludes,
-                self.compress_format,
-                self.compress_level,
-                self.overwrite,
-            )
-
-
-class ExtractStep(Step):
-    """
-    Extract a compressed archive.
-    """
-
-    src: Path
-    dst: Path
-    compress_format: str | None
-    overwrite: bool
-    password: str | None
-
-    def init(self):
-        self.src = Path(self.raw_data.get("extract", valtype=str))
-        self.dst = Path(self.raw_data.get("to", valtype=str))
-        self.compress_format = self.raw_data.get(
-            "type",
-            None,
-            valtype=str | None,
-        )
-        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
-        self.password = self.raw_data.get("password", None, valtype=str | None)
-
-    def run(self):
-        extract(
-            self.src,
-            self.dst,
-            self.compress_format,
-            self.overwrite,
-            self.password,
-        )
-
-
-step_types = {
-    "shell": ShellExecStep,
-    "mkdir": MkdirStep,
-    "output": OutputStep,
-    "echo": EchoStep,
-    "popen": PopenStep,
-    "move": MoveFileStep,
-    "copy": CopyFileStep,
-    "remove": RemoveStep,
-    "load-extention": ExtentionLoadStep,
-    "run-workflow": WorkflowRunStep,
-    "mklink": MklinkStep,
-    "compress": CompressStep,
-    "extract": ExtractStep,
-}
-
-# Type is optional. If not provided, it will be inferred from the step data.
-step_contribute = {
-    ShellExecStep: ["run"],
-    MkdirStep: ["mkdir"],
-    PopenStep: ["popen"],
-    OutputStep: ["output"],
-    EchoStep: ["echo"],
-    MoveFileStep: ["move", "to"],
-    CopyFileStep: ["copy", "to"],
-    RemoveStep: ["remove"],
-    ExtentionLoadStep: ["extention"],
-    WorkflowRunStep: ["workflow"],
-    MklinkStep: ["mklink", "to"],
-    CompressStep: ["compress", "to"],
-    ExtractStep: ["extract", "to"],
-}
-
-
-class Workflow:
-    """A workflow."""
-
-    id: str
-    name: str
-    first_step: Step
-    raw_data: AutoFormatDict
-
-    pushed_variables: list[str]
-
-    def __init__(self, data: AutoFormatDict) -> None:
-        """Create a new workflow.
-
-        Args:
-            data (AutoFormatDict): The workflow json data.
-        """
-
-        self.pushed_variables = []
-        pairs = data.get("vars", [], valtype=list)
-        for pair in pairs:
-            assert_iter_types(
-                pairs,
-                dict,
-                RUValueException(
-                    _("Workflow variables must be a list of name and value.")
-                ),
-            )
-            for key, val in pair.items():
-                self.pushed_variables.append(str(key))
-                push_variables(str(key), val)
-
-        self.id = data.get(
-            "id",
-            str(uuid.uuid4()),
-            valtype=str,
-        )
-        self.name = data.get("name", valtype=str)
-        self.raw_data = data
-
-    def _parse_steps(self, steps: list[AutoFormatDict]) -> None:
-        """Parse the steps.
+                for future in done:
+                    idx = running.pop(future)
+                    try:
+                        finished[idx] = future.result()
+                    except Exception as exc:  # pylint: disable=broad-exception-caught  # noqa: E501
+                        logger.error("Step '%s' failed.", steps[idx].id)
+                        if first_exc is None:
+                            first_exc = exc
+                        continue
+                    for dependent in dependents[idx]:
+                        pending[dependent].discard(idx)
+                        if not pending[dependent]:
+                            heapq.heappush(ready, dependent)
+
+                emitted = self._post_run_finished(finished, emitted)
+
+        if first_exc is not None:
+            raise first_exc
+
+        return [finished[idx] for idx in range(len(steps))]
+
+    def _post_run_finished(
+        self,
+        finished: dict[int, Step],
+        emitted: int,
+    ) -> int:
+        """Call the post-run triggers of the finished steps in declaration
+        order. A step is held back until all the steps before it finish.
 
         Args:
-            steps (list[AutoFormatDict]): The steps dict data.
+            finished (dict[int, Step]): The finished steps by index.
+            emitted (int): The number of steps whose triggers are called.
 
         Returns:
-            Step: The first step.
+            int: The new number of steps whose triggers are called.
         """
 
-        first_step = None
-        prev_step = None
-
-        step_ids = []
-
-        for step_data in steps:
-            if not isinstance(step_data, dict):
-                raise RUValueException(_("A workflow step must be a dict."))
-            step_id = step_data.get(
-                "id",
-                str(uuid.uuid4()),
-                valtype=str,
-            )
-            step_name = step_data.get("name", "", valtype=str)
-            step_type = step_data.get("type", "", valtype=str)
-            step_cls: type = None
-
-            step_data["id"] = step_id
-            if step_id in step_ids:
-                raise RUValueException(
-                    format_str(
-                        _("Step id '${{step_id}}' is duplicated."),
-                        fmt={"step_id": make_pretty(step_id)},
-                    )
-                )
-            step_ids.append(step_id)
-
-            if not step_type:
-                for cls, contribute in step_contribute.items():
-                    is_match = all(
-                        step_data.get(contribute_item, None) is not None
-                        for contribute_item in contribute  # All items exist.
-                    )
-                    if is_match:
-                        step_cls = cls
-                        break
-            else:
-                step_cls = step_types.get(step_type, None)
-                if step_cls is None:
-                    raise RUValueException(
-                        format_str(
-                            _(
-                                "Unknown step type: '${{step_type}}' of step "
-                                "'${{step_name}}'. Please check the workflow."
-                            ),
-                            fmt={
-                                "step_type": make_pretty(step_type),
-                                "step_name": make_pretty(step_name),
-                            },
-                        ),
-                        hint=_(
-                            "Please check typo or use 'type' attribute manually.",  # noqa: E501
-                        ),
-                    )
-
-            if step_cls is None:
-                raise RUValueException(
-                    format_str(
-                        _(
-                            "The type of step '${{step}}'[black](${{step_id}})"
-                            "[/black] in workflow '${{workflow}}'[black]("
-                            "${{workflow_id}})[/black] is not provided and "
-                            "could not be inferred.",
-                        ),
-                        fmt={
-                            "step": make_pretty(step_name, _("<Unnamed>")),
-                            "workflow": make_pretty(self.name, _("<Unnamed>")),
-                            "step_id": step_id,
-                            "workflow_id": self.id,
-                        },
-                    )
-                )
-            step = step_cls(step_data, self)
-            if step.suc:
+        while emitted < len(self.plan.steps) and emitted in finished:
+            if finished[emitted].suc:
                 call_ktrigger(
                     IKernelTrigger.post_run_workflow_step,
-                    step=step,
+                    step=finished[emitted],
                 )
+            emitted += 1
+
+        return emitted
 
-            if prev_step is not None:
-                prev_step.next = step
+    def _run_steps(self) -> Step | None:
+        """Run all the steps.
 
-            if first_step is None:
-                first_step = step
+        Returns:
+            Step | None: The first step.
+        """
+
+        if self.parallel:
+            steps_list = self._run_steps_parallel()
+        else:
+            steps_list = []
+            for step_plan in self.plan.steps:
+                step = self._run_step(step_plan)
+                if step.suc:
+                    call_ktrigger(
+                        IKernelTrigger.post_run_workflow_step,
+                        step=step,
+                    )
+                steps_list.append(step)
 
-            prev_step = step
+        for prev_step, step in zip(steps_list, steps_list[1:]):
+            prev_step.next = step
 
-        return first_step
+        return steps_list[0] if steps_list else None
 
     def __str__(self):
         """Return the name of the workflow.
@@ -783,9 +300,11 @@ class Workflow:
             IKernelTrigger.pre_run_workflow,
             workflow=self,
         )
-        self.first_step = self._parse_steps(
-            self.raw_data.get("steps", valtype=list),
-        )
+        try:
+            with span(self.name or self.id, "workflow", id=self.id):
+                self.first_step = self._run_steps()
+        finally:
+            fingerprints.flush()
         call_ktrigger(
             IKernelTrigger.post_run_workflow,
             workflow=self,
@@ -800,42 +319,15 @@ class Workflow:
             pop_variables(name)
 
 
-def register_step_type(name: str, cls: type, contributes: list[str]) -> None:
-    """Register a step type.
-
-    Args:
-        name (str): The name of the step type.
-        cls (type): The class of the step type.
-        contributes (list[str]): The contributes of the step type.
-    """
-
-    if name in step_types:
-        call_ktrigger(
-            IKernelTrigger.on_warning,
-            message=format_str(
-                _(
-                    "Step type '${{name}}' registered multiple times. It's unsafe.",  # noqa: E501
-                ),
-                fmt={"name": make_pretty(name)},
-            ),
-        )
-    step_types[name] = cls
-    if cls not in step_contribute:
-        step_contribute[cls] = contributes
-    logger.info(
-        "Step type %s registered with contributes %s",
-        name,
-        contributes,
-    )
-
-
 def run_inline_workflow(
-    data: AutoFormatDict | list[AutoFormatDict], fail_fast: bool = True
+    data: AutoFormatDict | list[AutoFormatDict] | WorkflowPlan,
+    fail_fast: bool = True,
 ) -> Exception | None:
     """Run a inline workflow
 
     Args:
-        data (AutoFormatDict | list[AutoFormatDict]): Workflow data.
+        data (AutoFormatDict | list[AutoFormatDict] | WorkflowPlan): Workflow
+            data or its compiled plan.
         fail_fast (bool, optional): Raise an exception if run failed.
             Defaults to True.
 
@@ -847,8 +339,8 @@ def run_inline_workflow(
     if isinstance(data, list):
         data = AutoFormatDict({"name": _("<Inline Workflow>"), "steps": data})
 
-    wf = Workflow(data)
     try:
+        wf = Workflow(data)
         wf.run()
     except Exception as exc:  # pylint: disable=broad-exception-caught
         if fail_fast:
@@ -881,29 +373,161 @@ def run_workflow(file: Path, fail_fast: bool = True) -> Exception | None:
             exception. Return None if succeed.
     """
 
-    with open(file, encoding=DEFAULT_CHARSET) as f:
-        if file.suffix.lower() in [".json", ".json5"]:
-            workflow = json.load(f)
-        elif file.suffix.lower() in [".yaml", ".yml"]:
-            workflow = yaml.safe_load(f)
-        else:
-            raise RUValueException(
-                format_str(
-                    _(
-                        "The suffix of '[underline]${{path}}[/underline]' "
-                        "is invalid."
-                    ),
-                    fmt={"path": make_pretty(file.absolute())},
-                ),
-                hint=_("We only support '.json', '.json5', '.yaml', '.yml'."),
-            )
-
-        return run_inline_workflow(AutoFormatDict(workflow), fail_fast)
+    return run_inline_workflow(load_workflow(file), fail_fast)
 
 
 if __name__ == "__main__":
     import rich
 
+    from rubisco.lib.exceptions import RUShellExecutionException
+
     rich.print(f"{__file__}: {__doc__.strip()}")
 
-    run_workflow(Path("workflow.yaml"))
+    # Test: Parallel workflow with needs.
+    run_inline_workflow(
+        AutoFormatDict(
+            {
+                "name": "Parallel test",
+                "id": "parallel",
+                "parallel": True,
+                "jobs": 4,
+                "steps": [
+                    {"id": "a", "popen": "sleep 0.2 && echo a"},
+                    {"id": "b", "popen": "sleep 0.2 && echo b"},
+                    {
+                        "id": "c",
+                        "needs": ["a", "b"],
+                        "popen": "echo ${{ parallel.a.stdout }}",
+                    },
+                ],
+            }
+        )
+    )
+
+    # Test: Cycle in needs.
+    try:
+        run_inline_workflow(
+            AutoFormatDict(
+                {
+                    "name": "Cycle test",
+                    "parallel": True,
+                    "steps": [
+                        {"id": "a", "needs": "b", "echo": "a"},
+                        {"id": "b", "needs": "a", "echo": "b"},
+                    ],
+                }
+            )
+        )
+        assert False, "Should raise RUValueException."
+    except RUValueException as exc_:
+        rich.print("Exception caught:", exc_)
+
+    # Test: Fail fast.
+    try:
+        run_inline_workflow(
+            AutoFormatDict(
+                {
+                    "name": "Fail fast test",
+                    "parallel": True,
+                    "steps": [
+                        {"id": "a", "run": "exit 1"},
+                        {"id": "b", "needs": "a", "echo": "unreachable"},
+                    ],
+                }
+            )
+        )
+        assert False, "Should raise RUShellExecutionException."
+    except RUShellExecutionException as exc_:
+        rich.print("Exception caught:", exc_)
+
+    # Test: Concurrent shell commands.
+    par_wf = Workflow(
+        AutoFormatDict(
+            {
+                "id": "shpar",
+                "name": "Parallel shell test",
+                "steps": [
+                    {
+                        "id": "s",
+                        "run-parallel": ["echo a", "exit 2"],
+                        "fail-on-error": False,
+                    },
+                ],
+            }
+        )
+    )
+    par_wf.run()
+    assert list(get_variable("shpar.s.retcodes")) == [0, 2]
+    assert get_variable("shpar.s.retcode") == 2
+    assert get_variable("shpar.s.rusage.wall") >= 0
+
+    # Test: A large popen output is spilled to a file.
+    spill_wf = Workflow(
+        AutoFormatDict(
+            {
+                "id": "spill",
+                "name": "Spill test",
+                "steps": [
+                    {
+                        "id": "big",
+                        "popen": "yes rubisco | head -n 100000",
+                        "capture-limit": 1024,
+                    },
+                ],
+            }
+        )
+    )
+    spill_wf.run()
+    assert len(get_variable("spill.big.stdout")) == 1024
+    spill_file = Path(get_variable("spill.big.stdout-file"))
+    assert spill_file.stat().st_size == len("rubisco\n") * 100000
+    assert get_variable("spill.big.stderr-file") == ""
+    if os.name != "nt":
+        assert get_variable("spill.big.rusage.max-rss") > 0
+
+    # Test: A skipped step restores its output variables.
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as temp_:
+        fingerprints.path = Path(temp_) / "fingerprints.json"
+        built_ = Path(temp_) / "built.txt"
+        inc_data = AutoFormatDict(
+            {
+                "id": "inc",
+                "name": "Incremental test",
+                "steps": [
+                    {
+                        "id": "build",
+                        "popen": f"echo x >> {built_} && echo built",
+                        "outputs": str(built_),
+                    },
+                    {"id": "use", "echo": "${{ inc.build.stdout }}"},
+                ],
+            }
+        )
+        for _run in range(2):
+            Workflow(inc_data).run()
+            assert pop_variables("inc.build.stdout") == "built\n"
+            assert pop_variables("inc.build.retcode") == 0
+            assert "inc.build.stdout" not in variables
+        assert built_.read_text(encoding=DEFAULT_CHARSET) == "x\n"
+
+    # Test: Step ids and needs can use the workflow's variables.
+    run_inline_workflow(
+        AutoFormatDict(
+            {
+                "id": "vars",
+                "name": "Variables test",
+                "vars": [{"sid": "first"}],
+                "parallel": True,
+                "steps": [
+                    {"id": "${{ sid }}", "popen": "echo one"},
+                    {"id": "last", "needs": ["${{ sid }}"], "echo": "two"},
+                ],
+            }
+        )
+    )
+    assert get_variable("vars.first.stdout") == "one\n"
+
+    if Path("workflow.yaml").exists():
+        run_workflow(Path("workflow.yaml"))
@@ -0,0 +1,719 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Workflow compiling and caching.
+A workflow is compiled to a plan before it runs. The plan is picklable and
+can be executed many times.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from rubisco.config import (APP_VERSION, DEFAULT_CHARSET,
+                            USER_WORKFLOW_CACHE_DIR)
+from rubisco.kernel.workflow_steps import (lazy_step_types, step_contribute,
+                                           step_type_name, step_types)
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.jsonfile import loads_json5
+from rubisco.lib.l10n import _
+from rubisco.lib.log import logger
+from rubisco.lib.variable import (AutoFormatDict, AutoFormatList,
+                                  assert_iter_types, format_str, make_pretty,
+                                  pop_variables, push_variables, variables)
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
+
+__all__ = [
+    "StepPlan",
+    "WorkflowPlan",
+    "compile_workflow",
+    "get_step_type",
+    "load_workflow",
+    "push_workflow_variables",
+    "register_lazy_step_type",
+    "register_step_type",
+]
+
+# Inferred step types cache. Key is the set of the step's non-null keys.
+_inferred_step_types: dict[frozenset[str], type | None] = {}
+
+
+@dataclass(frozen=True)
+class StepPlan:
+    """A compiled step. It is picklable and never changed after compiling."""
+
+    id: str
+    name: str
+    step_type: str  # The key in `step_types`.
+    data: dict[str, Any]  # Raw (unformatted) step data.
+    needs: tuple[int, ...]  # Indexes of the needed steps.
+
+
+@dataclass(frozen=True)
+class WorkflowPlan:  # pylint: disable=too-many-instance-attributes
+    """A compiled workflow. It is picklable and never changed after compiling.
+
+    The variables in the step data are not formatted until the step is
+    executed, so a plan can be executed many times.
+    """
+
+    id: str  # Unformatted.
+    name: str  # Unformatted.
+    data: dict[str, Any]  # Raw (unformatted) workflow data.
+    variables: tuple[dict[str, Any], ...]
+    steps: tuple[StepPlan, ...]
+    parallel: bool
+    jobs: int | None
+
+    def inferred_types(self) -> list[str | None]:
+        """Get the inferred step types, in step order.
+
+        Returns:
+            list[str | None]: The type of each step without a 'type'. None
+                for the steps with a 'type', because it may be a variable.
+        """
+
+        return [
+            None if step.data.get("type") else step.step_type
+            for step in self.steps
+        ]
+
+
+def _to_raw(obj: Any) -> Any:
+    """Convert AutoFormatDict and AutoFormatList to unformatted builtins.
+
+    Args:
+        obj (Any): The object to convert.
+
+    Returns:
+        Any: The converted object.
+    """
+
+    if isinstance(obj, AutoFormatDict):
+        return {key: _to_raw(value) for key, value in obj.raw_items()}
+    if isinstance(obj, AutoFormatList):
+        return [_to_raw(value) for value in obj.raw_iter()]
+    if isinstance(obj, dict):
+        return {key: _to_raw(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_to_raw(value) for value in obj]
+    return obj
+
+
+def _load_lazy_step_type(name: str) -> bool:
+    """Load the extention which provides a lazy step type.
+
+    Args:
+        name (str): The step type name.
+
+    Returns:
+        bool: True if the step type is available now.
+    """
+
+    lazy = lazy_step_types.pop(name, None)
+    if lazy is None:
+        return False
+    lazy[1]()
+
+    return name in step_types
+
+
+def _infer_step_class(step_data: AutoFormatDict) -> type | None:
+    """Infer the step class by the step contributions.
+
+    Args:
+        step_data (AutoFormatDict): The step data.
+
+    Returns:
+        type | None: The step class. None if it could not be inferred.
+    """
+
+    keys = frozenset(
+        key for key, value in step_data.raw_items() if value is not None
+    )
+    if keys not in _inferred_step_types:
+        step_cls = None
+        for cls, contribute in step_contribute.items():
+            if all(item in keys for item in contribute):  # All items exist.
+                step_cls = cls
+                break
+        _inferred_step_types[keys] = step_cls
+
+    if _inferred_step_types[keys] is None:  # Try the unloaded extentions.
+        for name, (contribute, _loader) in list(lazy_step_types.items()):
+            if all(item in keys for item in contribute) and (
+                _load_lazy_step_type(name)
+            ):
+                return step_types[name]
+
+    return _inferred_step_types[keys]
+
+
+def _resolve_step_type(
+    step_data: AutoFormatDict,
+    workflow_name: str,
+    workflow_id: str,
+    inferred_type: str | None = None,
+) -> str:
+    """Get the step type name of a step.
+
+    Args:
+        step_data (AutoFormatDict): The step dict data. Its id must be
+            filled.
+        workflow_name (str): The name of the workflow. For error message.
+        workflow_id (str): The id of the workflow. For error message.
+        inferred_type (str | None, optional): The step type inferred by a
+            previous compiling. It is used if the step has no type.
+            Defaults to None.
+
+    Returns:
+        str: The step type name.
+
+    Raises:
+        RUValueException: If the step type is unknown or could not be
+            inferred.
+    """
+
+    step_id = step_data.get("id", valtype=str)
+    step_name = step_data.get("name", "", valtype=str)
+    step_type = step_data.get("type", "", valtype=str)
+
+    if step_type:
+        get_step_type(step_type, step_name)
+        return step_type
+
+    if inferred_type is not None and (
+        inferred_type in step_types or _load_lazy_step_type(inferred_type)
+    ):
+        return inferred_type
+
+    step_cls = _infer_step_class(step_data)
+    if step_cls is None:
+        raise RUValueException(
+            format_str(
+                _(
+                    "The type of step '${{step}}'[black](${{step_id}})"
+                    "[/black] in workflow '${{workflow}}'[black]("
+                    "${{workflow_id}})[/black] is not provided and "
+                    "could not be inferred.",
+                ),
+                fmt={
+                    "step": make_pretty(step_name, _("<Unnamed>")),
+                    "workflow": make_pretty(workflow_name, _("<Unnamed>")),
+                    "step_id": step_id,
+                    "workflow_id": workflow_id,
+                },
+            )
+        )
+
+    return step_type_name(step_cls)
+
+
+def _check_steps_cycle(workflow_name: str, steps: list[StepPlan]) -> None:
+    """Check if the steps' needs contain a cycle.
+
+    Args:
+        workflow_name (str): The name of the workflow. For error message.
+        steps (list[StepPlan]): The compiled steps.
+
+    Raises:
+        RUValueException: If a cycle is found.
+    """
+
+    indegree = [len(step.needs) for step in steps]
+    dependents: list[list[int]] = [[] for _step in steps]
+    for idx, step in enumerate(steps):
+        for need in step.needs:
+            dependents[need].append(idx)
+
+    queue = [idx for idx, degree in enumerate(indegree) if not degree]
+    visited = 0
+    while queue:
+        idx = queue.pop()
+        visited += 1
+        for dependent in dependents[idx]:
+            indegree[dependent] -= 1
+            if not indegree[dependent]:
+                queue.append(dependent)
+
+    if visited != len(steps):
+        cycle = [step.id for idx, step in enumerate(steps) if indegree[idx]]
+        raise RUValueException(
+            format_str(
+                _(
+                    "Steps' needs of workflow '${{workflow}}' contain a "
+                    "cycle: ${{steps}}."
+                ),
+                fmt={
+                    "workflow": make_pretty(workflow_name, _("<Unnamed>")),
+                    "steps": ", ".join(cycle),
+                },
+            ),
+        )
+
+
+def push_workflow_variables(pairs: Iterable[dict]) -> list[str]:
+    """Push the variables of a workflow.
+
+    Args:
+        pairs (Iterable[dict]): The variable name and value pairs.
+
+    Returns:
+        list[str]: The pushed variable names. They must be popped when the
+            workflow is done.
+    """
+
+    pushed = []
+    for pair in pairs:
+        for key, val in AutoFormatDict(pair).items():
+            pushed.append(str(key))
+            push_variables(str(key), val)
+
+    return pushed
+
+
+def compile_workflow(
+    data: AutoFormatDict | dict,
+    inferred_types: list[str | None] | None = None,
+) -> WorkflowPlan:
+    """Compile the workflow data to a plan without running it.
+
+    Step types are resolved, step ids and needs are checked. The workflow's
+    own variables are pushed while compiling, because the step ids, types
+    and needs may use them.
+
+    Args:
+        data (AutoFormatDict | dict): The workflow json data.
+        inferred_types (list[str | None] | None, optional): The step types
+            inferred by a previous compiling of the same data, in step
+            order. See `WorkflowPlan.inferred_types()`. Defaults to None.
+
+    Returns:
+        WorkflowPlan: The workflow plan.
+
+    Raises:
+        RUValueException: If the workflow is invalid.
+    """
+
+    data = AutoFormatDict(_to_raw(data))
+
+    pairs = data.get("vars", [], valtype=list)
+    assert_iter_types(
+        pairs,
+        dict,
+        RUValueException(
+            _("Workflow variables must be a list of name and value.")
+        ),
+    )
+    pushed = push_workflow_variables(pairs)
+    try:
+        return _compile_workflow_data(data, inferred_types)
+    finally:
+        for name in pushed:
+            pop_variables(name)
+
+
+def _compile_workflow_data(
+    data: AutoFormatDict,
+    inferred_types: list[str | None] | None,
+) -> WorkflowPlan:
+    """Compile the workflow data after its variables are pushed.
+
+    Args:
+        data (AutoFormatDict): The workflow json data. It is changed.
+        inferred_types (list[str | None] | None): See `compile_workflow()`.
+
+    Returns:
+        WorkflowPlan: The workflow plan.
+    """
+
+    if data.get("id", None) is None:
+        data["id"] = str(uuid.uuid4())
+    wf_id = data.get("id", valtype=str)
+    name = data.get("name", valtype=str)
+    parallel = data.get("parallel", False, valtype=bool)
+    jobs = data.get("jobs", None, valtype=int | None)
+
+    steps_data = data.get("steps", valtype=list)
+    step_ids: list[str] = []
+    for step_data in steps_data:
+        if not isinstance(step_data, dict):
+            raise RUValueException(_("A workflow step must be a dict."))
+        step_id = step_data.get("id", str(uuid.uuid4()), valtype=str)
+        step_data["id"] = step_id
+        if step_id in step_ids:
+            raise RUValueException(
+                format_str(
+                    _("Step id '${{step_id}}' is duplicated."),
+                    fmt={"step_id": make_pretty(step_id)},
+                )
+            )
+        step_ids.append(step_id)
+
+    if inferred_types is None or len(inferred_types) != len(step_ids):
+        inferred_types = [None] * len(step_ids)
+
+    steps: list[StepPlan] = []
+    for step_id, step_data in zip(step_ids, steps_data):
+        needs = step_data.get("needs", [], valtype=list | str)
+        if isinstance(needs, str):
+            needs = [needs]
+        assert_iter_types(
+            needs,
+            str,
+            RUValueException(_("Step needs must be a list of step ids.")),
+        )
+        for need in needs:
+            if need not in step_ids or need == step_id:
+                raise RUValueException(
+                    format_str(
+                        _(
+                            "Step '${{step_id}}' needs an unknown step "
+                            "'${{need}}'."
+                        ),
+                        fmt={
+                            "step_id": make_pretty(step_id),
+                            "need": make_pretty(need),
+                        },
+                    ),
+                    hint=_("A step can only need other steps' id."),
+                )
+
+        steps.append(
+            StepPlan(
+                id=step_id,
+                name=step_data.get("name", "", valtype=str),
+                step_type=_resolve_step_type(
+                    step_data,
+                    name,
+                    wf_id,
+                    inferred_types[len(steps)],
+                ),
+                data=_to_raw(step_data),
+                needs=tuple(step_ids.index(need) for need in needs),
+            )
+        )
+
+    _check_steps_cycle(name, steps)
+
+    raw_data = _to_raw(data)
+    raw_data["steps"] = [step.data for step in steps]
+
+    return WorkflowPlan(
+        id=raw_data["id"],
+        name=raw_data["name"],
+        data=raw_data,
+        variables=tuple(raw_data.get("vars", [])),
+        steps=tuple(steps),
+        parallel=parallel,
+        jobs=jobs,
+    )
+
+
+def get_step_type(name: str, step_name: str = "") -> type:
+    """Get the class of a step type. The extention which provides it is
+    loaded if it is not loaded yet.
+
+    Args:
+        name (str): The step type name.
+        step_name (str, optional): The name of the step. For error message.
+            Defaults to "".
+
+    Returns:
+        type: The step class.
+
+    Raises:
+        RUValueException: If the step type is unknown.
+    """
+
+    if name not in step_types and not _load_lazy_step_type(name):
+        raise RUValueException(
+            format_str(
+                _(
+                    "Unknown step type: '${{step_type}}' of step "
+                    "'${{step_name}}'. Please check the workflow."
+                ),
+                fmt={
+                    "step_type": make_pretty(name),
+                    "step_name": make_pretty(step_name),
+                },
+            ),
+            hint=_("Please check typo or use 'type' attribute manually."),
+        )
+    return step_types[name]
+
+
+def register_step_type(name: str, cls: type, contributes: list[str]) -> None:
+    """Register a step type.
+
+    Args:
+        name (str): The name of the step type.
+        cls (type): The class of the step type.
+        contributes (list[str]): The contributes of the step type.
+    """
+
+    if name in step_types:
+        call_ktrigger(
+            IKernelTrigger.on_warning,
+            message=format_str(
+                _(
+                    "Step type '${{name}}' registered multiple times. It's unsafe.",  # noqa: E501
+                ),
+                fmt={"name": make_pretty(name)},
+            ),
+        )
+    step_types[name] = cls
+    lazy_step_types.pop(name, None)
+    if cls not in step_contribute:
+        step_contribute[cls] = contributes
+    _inferred_step_types.clear()
+    logger.info(
+        "Step type %s registered with contributes %s",
+        name,
+        contributes,
+    )
+
+
+def register_lazy_step_type(
+    name: str,
+    contributes: list[str],
+    loader: Callable[[], None],
+) -> None:
+    """Register a step type which is provided by an unloaded extention.
+    The loader is called when the step type is used for the first time, and
+    it should register the step type by `register_step_type`.
+
+    Args:
+        name (str): The name of the step type.
+        contributes (list[str]): The contributes of the step type.
+        loader (Callable[[], None]): The extention loader.
+    """
+
+    if name in step_types:
+        logger.warning("Step type %s is already registered.", name)
+        return
+    lazy_step_types[name] = (contributes, loader)
+    _inferred_step_types.clear()
+
+
+def _workflow_cache_file(content: bytes, file: Path, cache_dir: Path) -> Path:
+    """Get the cache file path of a workflow file.
+
+    The key covers the file content, its type and the registered step types
+    (loaded or not), because step type inference depends on them.
+
+    Args:
+        content (bytes): The workflow file content.
+        file (Path): The workflow file path.
+        cache_dir (Path): The cache directory.
+
+    Returns:
+        Path: The cache file path.
+    """
+
+    hasher = hashlib.sha256()
+    hasher.update(str(APP_VERSION).encode(DEFAULT_CHARSET))
+    hasher.update(b"\0" + file.suffix.lower().encode(DEFAULT_CHARSET))
+    for name in sorted({*step_types, *lazy_step_types}):
+        hasher.update(b"\0" + name.encode(DEFAULT_CHARSET))
+    hasher.update(b"\0" + content)
+
+    return cache_dir / f"{hasher.hexdigest()}.json"
+
+
+def _load_workflow_cache(
+    cache_file: Path,
+) -> tuple[dict, list[str | None]] | None:
+    """Load the parsed workflow data and its inferred step types.
+
+    Args:
+        cache_file (Path): The cache file path.
+
+    Returns:
+        tuple[dict, list[str | None]] | None: The unformatted workflow data
+            and its inferred step types. None if the cache is missing or
+            invalid.
+    """
+
+    if not cache_file.is_file():
+        return None
+    try:
+        with cache_file.open("r", encoding=DEFAULT_CHARSET) as f:
+            cache = json.load(f)
+        data = cache["data"]
+        inferred_types = cache["types"]
+        if not isinstance(data, dict) or not isinstance(inferred_types, list):
+            raise TypeError("Invalid cache structure.")
+        assert_iter_types(inferred_types, str | None, TypeError())
+    except Exception:  # pylint: disable=broad-exception-caught
+        logger.warning(
+            "Invalid workflow cache: %s",
+            str(cache_file),
+            exc_info=True,
+        )
+        return None
+
+    return data, inferred_types
+
+
+def _save_workflow_cache(
+    cache_file: Path,
+    data: Any,
+    plan: WorkflowPlan,
+) -> None:
+    """Save the parsed workflow data and its inferred step types.
+
+    Args:
+        cache_file (Path): The cache file path.
+        data (Any): The unformatted workflow data.
+        plan (WorkflowPlan): The plan compiled from the data.
+    """
+
+    try:
+        text = json.dumps({"data": data, "types": plan.inferred_types()})
+        if json.loads(text)["data"] != data:  # Not representable in JSON.
+            return
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        temp_file.write_text(text, encoding=DEFAULT_CHARSET)
+        os.replace(temp_file, cache_file)
+    except (OSError, TypeError, ValueError):
+        logger.warning(
+            "Failed to save workflow cache: %s",
+            str(cache_file),
+            exc_info=True,
+        )
+
+
+def load_workflow(
+    file: Path,
+    use_cache: bool = True,
+    cache_dir: Path = USER_WORKFLOW_CACHE_DIR,
+) -> WorkflowPlan:
+    """Load and compile a workflow file without running it.
+
+    The parsed data and the inferred step types are cached. The plan is
+    always compiled again, so the variables and the generated ids are not
+    frozen in the cache.
+
+    Args:
+        file (Path): Workflow file path. It can be a JSON, or a yaml.
+        use_cache (bool, optional): Use the workflow cache. Defaults to
+            True.
+        cache_dir (Path, optional): The cache directory. Defaults to
+            `USER_WORKFLOW_CACHE_DIR`.
+
+    Raises:
+        RUValueException: If the workflow file is invalid.
+
+    Returns:
+        WorkflowPlan: The workflow plan.
+    """
+
+    suffix = file.suffix.lower()
+    if suffix not in [".json", ".json5", ".yaml", ".yml"]:
+        raise RUValueException(
+            format_str(
+                _(
+                    "The suffix of '[underline]${{path}}[/underline]' "
+                    "is invalid."
+                ),
+                fmt={"path": make_pretty(file.absolute())},
+            ),
+            hint=_("We only support '.json', '.json5', '.yaml', '.yml'."),
+        )
+
+    content = file.read_bytes()
+    cache_file = _workflow_cache_file(content, file, cache_dir)
+    cache = _load_workflow_cache(cache_file) if use_cache else None
+    if cache is not None:
+        logger.debug("Workflow cache hit: %s", str(file))
+        return compile_workflow(AutoFormatDict(cache[0]), cache[1])
+
+    text = content.decode(DEFAULT_CHARSET)
+    if suffix in [".json", ".json5"]:
+        workflow = loads_json5(text)
+    else:
+        import yaml  # pylint: disable=import-outside-toplevel
+
+        workflow = yaml.safe_load(text)
+    plan = compile_workflow(AutoFormatDict(workflow))
+
+    if use_cache:
+        _save_workflow_cache(cache_file, workflow, plan)
+
+    return plan
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    # Test: Step ids, types and needs can use the workflow's variables.
+    vars_data_ = {
+        "id": "vars",
+        "name": "Variables test",
+        "vars": [{"sid": "hello", "kind": "echo"}],
+        "steps": [
+            {"id": "${{ sid }}", "type": "${{ kind }}", "echo": "hi"},
+            {"id": "next", "needs": "${{ sid }}", "echo": "hi"},
+        ],
+    }
+    vars_plan_ = compile_workflow(vars_data_)
+    assert [step_.id for step_ in vars_plan_.steps] == ["hello", "next"]
+    assert vars_plan_.steps[0].step_type == "echo"
+    assert vars_plan_.steps[1].needs == (0,)
+    assert "sid" not in variables
+
+    # Test: The cached workflow is formatted and gets new ids on every load.
+    with tempfile.TemporaryDirectory() as temp_:
+        cache_dir_ = Path(temp_) / "cache"
+        file_ = Path(temp_) / "cached.json"
+        file_.write_text(
+            '{"name": "Cache test", "steps": [{"id": "${{ sid }}", '
+            '"echo": "hi"}, {"echo": "hi"}]}',
+            encoding=DEFAULT_CHARSET,
+        )
+        cache_file_ = _workflow_cache_file(
+            file_.read_bytes(),
+            file_,
+            cache_dir_,
+        )
+        plans_ = []
+        for sid_ in ("first", "second"):
+            push_variables("sid", sid_)
+            plans_.append(load_workflow(file_, cache_dir=cache_dir_))
+            pop_variables("sid")
+            assert cache_file_.is_file()
+        assert [plan_.steps[0].id for plan_ in plans_] == ["first", "second"]
+        assert plans_[0].id != plans_[1].id
+        assert plans_[0].steps[1].id != plans_[1].steps[1].id
+        assert plans_[1].steps[1].step_type == plans_[0].steps[1].step_type
+        cache_ = json.loads(cache_file_.read_text(encoding=DEFAULT_CHARSET))
+        assert "id" not in cache_["data"]
+        assert cache_["types"] == plans_[0].inferred_types()
@@ -0,0 +1,939 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Built-in workflow steps and the step type registry.
+"""
+
+import glob
+import os
+import shutil
+import sys
+import time
+from abc import abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable
+
+from rubisco.config import POPEN_CAPTURE_LIMIT
+from rubisco.kernel.fingerprint import fingerprints, resolve_object
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.fileutil import (check_file_exists, copy_recursive,
+                                  rm_recursive)
+from rubisco.lib.l10n import _
+from rubisco.lib.log import logger
+from rubisco.lib.process import (Process, ProcessUsage, popen_capture,
+                                 run_processes)
+from rubisco.lib.variable import (AutoFormatDict, assert_iter_types,
+                                  format_str, get_variable, make_pretty,
+                                  push_variables, variables, variables_lock)
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
+
+if TYPE_CHECKING:
+    from rubisco.kernel.workflow import Workflow
+
+__all__ = [
+    "CompressStep",
+    "CopyFileStep",
+    "EchoStep",
+    "ExtentionLoadStep",
+    "ExtractStep",
+    "FetchExtractStep",
+    "GitSyncStep",
+    "MkdirStep",
+    "MklinkStep",
+    "MoveFileStep",
+    "OutputStep",
+    "ParallelShellExecStep",
+    "PopenStep",
+    "RemoveStep",
+    "ShellExecStep",
+    "Step",
+    "WorkflowRunStep",
+    "lazy_step_types",
+    "step_contribute",
+    "step_type_name",
+    "step_types",
+    "_set_extloader",
+]
+
+try:  # Avoid circular import.
+    from rubisco.shared.extention import load_extention
+except ImportError:
+    load_extention = NotImplemented
+
+
+def _set_extloader(extloader):  # Avoid circular import.
+    global load_extention  # pylint: disable=global-statement
+
+    load_extention = extloader
+
+
+class Step:  # pylint: disable=too-many-instance-attributes
+    """A step in the workflow."""
+
+    id: str
+    parent_workflow: "Workflow"
+    name: str
+    next: "Step | None"
+    raw_data: AutoFormatDict
+    global_id: str
+    strict: bool
+    suc: bool
+    inputs: list[str] | None
+    outputs: list[str] | None
+    duration: float  # Seconds spent in `execute()`, excluding the triggers.
+
+    def __init__(self, data: AutoFormatDict, parent_workflow: "Workflow"):
+        """Create a new step. The step will not run until `execute()`.
+
+        Args:
+            data (AutoFormatDict): The step json data.
+            parent_workflow (Workflow): The parent workflow.
+        """
+
+        self.suc = False
+        self.duration = 0.0
+
+        self.parent_workflow = parent_workflow
+        self.raw_data = data
+        self.name = data.get("name", "", valtype=str)
+        self.strict = data.get("strict", True, valtype=bool)
+        self.next = None
+        self.id = data.get("id", valtype=str)  # Always exists.
+        self.global_id = f"{self.parent_workflow.id}.{self.id}"
+        self.inputs = _get_globs(data, "inputs")
+        self.outputs = _get_globs(data, "outputs")
+
+        self.init()
+
+    def fingerprint(self) -> tuple[str, str]:
+        """Get the fingerprint of this step.
+
+        Returns:
+            tuple[str, str]: The key of the step and the digest of its inputs.
+        """
+
+        params = {
+            key: resolve_object(value)
+            for key, value in self.raw_data.items()
+            if key not in ("id", "name", "needs", "strict")
+        }
+        params["__type__"] = step_type_name(type(self))
+
+        return fingerprints.fingerprint(params, self.inputs or [])
+
+    def execute(self) -> None:
+        """Run the step. Call the kernel triggers and handle its failure."""
+
+        call_ktrigger(
+            IKernelTrigger.pre_run_workflow_step,
+            step=self,
+        )
+
+        start = time.monotonic()
+        try:
+            self._execute()
+        finally:
+            self.duration = time.monotonic() - start
+
+    def _execute(self) -> None:
+        fingerprint = None
+        if self.inputs is not None or self.outputs is not None:
+            fingerprint = self.fingerprint()
+            if fingerprints.is_up_to_date(fingerprint, self.outputs or []):
+                # Dependent steps may use the variables of this step.
+                recorded = fingerprints.recorded_variables(fingerprint)
+                for name, value in recorded.items():
+                    push_variables(f"{self.global_id}.{name}", value)
+                self.suc = True
+                call_ktrigger(
+                    IKernelTrigger.on_skip_workflow_step,
+                    step=self,
+                )
+                return
+
+        try:
+            self.run()
+            if fingerprint is not None:
+                fingerprints.record(fingerprint, self._output_variables())
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            if self.strict:
+                raise exc from None
+            logger.warning("Step %s failed.", self.name, exc_info=True)
+            call_ktrigger(
+                IKernelTrigger.on_error,
+                message=format_str(
+                    _("Step '${{step}}' failed: ${{exc}}"),
+                    fmt={
+                        "step": make_pretty(self.name, _("<Unnamed>")),
+                        "exc": f"{type(exc).__name__}: {str(exc)}",
+                    },
+                ),
+            )
+
+        self.suc = True
+
+    def _output_variables(self) -> dict[str, Any]:
+        """Get the variables pushed by this step, like `<id>.retcode`.
+
+        Returns:
+            dict[str, Any]: The variable names without the step ID, and
+                their values.
+        """
+
+        prefix = f"{self.global_id}."
+        with variables_lock:
+            return {
+                name[len(prefix):]: stack.top_nowait()
+                for name, stack in variables.items()
+                if name.startswith(prefix) and not stack.empty()
+            }
+
+    def __str__(self):
+        """Return the name of the step.
+
+        Returns:
+            str: The name of the step.
+        """
+
+        return self.name
+
+    def __repr__(self):
+        """Return the representation of the step.
+
+        Returns:
+            str: The repr of the step.
+        """
+
+        return f"<{self.__class__.__name__} {self.name}>"
+
+    @abstractmethod
+    def init(self) -> None:
+        """
+        Initialize the step.
+        """
+
+    @abstractmethod
+    def run(self) -> None:
+        """
+        Run the step.
+        """
+
+
+def _get_globs(data: AutoFormatDict, key: str) -> list[str] | None:
+    """Get the glob patterns of a step.
+
+    Args:
+        data (AutoFormatDict): The step json data.
+        key (str): The key of the glob patterns.
+
+    Returns:
+        list[str] | None: The glob patterns. None if the key is not set.
+    """
+
+    globs = data.get(key, None, valtype=str | list | None)
+    if globs is None:
+        return None
+    if isinstance(globs, str):
+        return [globs]
+    assert_iter_types(
+        globs,
+        str,
+        RUValueException(
+            format_str(
+                _("The step '${{key}}' must be a list of strings."),
+                fmt={"key": key},
+            ),
+        ),
+    )
+    return list(globs)
+
+
+def _push_usage(step_id: str, usage: ProcessUsage | None) -> None:
+    """Push the resource usage of a step as `<step>.rusage.*` variables.
+
+    Args:
+        step_id (str): The global ID of the step.
+        usage (ProcessUsage | None): The usage. Nothing is pushed if it is
+            None.
+    """
+
+    if usage is None:
+        return
+    for key, val in usage.as_dict().items():
+        push_variables(f"{step_id}.rusage.{key}", val)
+
+
+# Built-in step types.
+class ShellExecStep(Step):
+    """A shell execution step."""
+
+    cmd: str
+    cwd: Path
+    fail_on_error: bool
+
+    def init(self):
+        self.cmd = self.raw_data.get("run", valtype=str | list)
+        if isinstance(self.cmd, list):
+            assert_iter_types(
+                self.cmd,
+                str,
+                RUValueException(
+                    _("The shell command list must be a list of strings.")
+                ),
+            )
+
+        self.cwd = Path(self.raw_data.get("cwd", "", valtype=str))
+        self.fail_on_error = self.raw_data.get(
+            "fail-on-error",
+            True,
+            valtype=bool,
+        )
+
+    def run(self):
+        proc = Process(self.cmd, self.cwd)
+        retcode = proc.run(self.fail_on_error)
+        push_variables(f"{self.global_id}.retcode", retcode)
+        _push_usage(self.global_id, proc.usage)
+
+
+class ParallelShellExecStep(Step):
+    """
+    Run shell commands concurrently. The number of running commands is
+    limited by the job slots of the workspace.
+    """
+
+    cmds: list[str]
+    cwd: Path
+    fail_on_error: bool
+
+    def init(self):
+        self.cmds = self.raw_data.get("run-parallel", valtype=list)
+        assert_iter_types(
+            self.cmds,
+            str,
+            RUValueException(
+                _("The shell command list must be a list of strings.")
+            ),
+        )
+
+        self.cwd = Path(self.raw_data.get("cwd", "", valtype=str))
+        self.fail_on_error = self.raw_data.get(
+            "fail-on-error",
+            True,
+            valtype=bool,
+        )
+
+    def run(self):
+        procs = [Process(cmd, self.cwd) for cmd in self.cmds]
+        retcodes = run_processes(procs, self.fail_on_error)
+        push_variables(f"{self.global_id}.retcodes", retcodes)
+        push_variables(f"{self.global_id}.retcode", max(retcodes, default=0))
+        _push_usage(
+            self.global_id,
+            ProcessUsage.total([proc.usage for proc in procs if proc.usage]),
+        )
+
+
+class MkdirStep(Step):
+    """Make directories."""
+
+    paths: list[Path]
+
+    def init(self):
+        paths = self.raw_data.get("mkdir", valtype=str | list)
+        if isinstance(paths, list):
+            assert_iter_types(
+                paths,
+                str,
+                RUValueException(
+                    _(
+                        "The paths must be a list of strings.",
+                    )
+                ),
+            )
+            self.paths = [Path(path) for path in paths]
+        else:
+            self.paths = [Path(paths)]
+
+    def run(self):
+        for path in self.paths:
+            call_ktrigger(IKernelTrigger.on_mkdir, path=path)
+            os.makedirs(path, exist_ok=True)
+
+
+class PopenStep(Step):
+    """Read the output of a shell command."""
+
+    cmd: str
+    cwd: Path
+    fail_on_error: bool
+    stdout: bool
+    stderr: int
+    capture_limit: int
+
+    def init(self):
+        self.cmd = self.raw_data.get("popen", valtype=str)
+
+        self.cwd = Path(self.raw_data.get("cwd", "", valtype=str))
+        self.fail_on_error = self.raw_data.get(
+            "fail-on-error",
+            True,
+            valtype=bool,
+        )
+        self.stdout = self.raw_data.get("stdout", True, valtype=bool)
+        stderr_mode = self.raw_data.get("stderr", True, valtype=bool | str)
+        if stderr_mode is True:
+            self.stderr = 1
+        elif stderr_mode is False:
+            self.stderr = 0
+        else:
+            self.stderr = 2
+        self.capture_limit = self.raw_data.get(
+            "capture-limit",
+            POPEN_CAPTURE_LIMIT,
+            valtype=int,
+        )
+
+    def run(self):
+        res = popen_capture(
+            self.cmd,
+            self.cwd,
+            self.stdout,
+            self.stderr,
+            self.fail_on_error,
+            capture_limit=self.capture_limit,
+        )
+        # The outputs are truncated if they are spilled to the files.
+        push_variables(f"{self.global_id}.stdout", res.stdout)
+        push_variables(f"{self.global_id}.stderr", res.stderr)
+        push_variables(f"{self.global_id}.retcode", res.retcode)
+        push_variables(
+            f"{self.global_id}.stdout-file",
+            str(res.stdout_file) if res.stdout_file else "",
+        )
+        push_variables(
+            f"{self.global_id}.stderr-file",
+            str(res.stderr_file) if res.stderr_file else "",
+        )
+        _push_usage(self.global_id, res.usage)
+
+
+class OutputStep(Step):
+    """Output a message."""
+
+    msg: str
+
+    def init(self):
+        msg = self.raw_data.get("output", None)
+        if msg is None:
+            msg = self.raw_data.get("echo", None)
+
+        self.msg = str(msg)
+
+    def run(self):
+        call_ktrigger(IKernelTrigger.on_output, msg=self.msg)
+
+
+EchoStep = OutputStep
+
+
+class MoveFileStep(Step):
+    """Move a file."""
+
+    src: Path
+    dst: Path
+
+    def init(self):
+        self.src = Path(self.raw_data.get("move", valtype=str))
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+
+    def run(self):
+        call_ktrigger(IKernelTrigger.on_move_file, src=self.src, dst=self.dst)
+        check_file_exists(self.dst)
+        shutil.move(self.src, self.dst)
+
+
+class CopyFileStep(Step):
+    """Copy files or directories."""
+
+    srcs: Path
+    dst: Path
+    overwrite: bool
+    keep_symlinks: bool
+    excludes: list[str] | None
+
+    def init(self):
+        srcs = self.raw_data.get("copy", valtype=str | list)
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+
+        if isinstance(srcs, str):
+            self.srcs = [Path(srcs)]
+        else:
+            assert_iter_types(
+                srcs,
+                str,
+                RUValueException(_("The copy item must be a string.")),
+            )
+            self.srcs = [Path(src) for src in srcs]
+
+        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
+        self.keep_symlinks = self.raw_data.get(
+            "keep-symlinks",
+            False,
+            valtype=bool,
+        )
+        self.excludes = self.raw_data.get(
+            "excludes",
+            None,
+            valtype=list | None,
+        )
+
+    def run(self):
+        if self.overwrite and self.dst.exists():
+            rm_recursive(self.dst, strict=True)
+        if self.dst.is_dir():
+            check_file_exists(self.dst)
+
+        for src_glob in self.srcs:
+            for src in glob.glob(str(src_glob)):
+                src = Path(src)
+                call_ktrigger(IKernelTrigger.on_copy, src=src, dst=self.dst)
+                copy_recursive(
+                    src,
+                    self.dst,
+                    not self.overwrite,
+                    self.keep_symlinks,
+                    self.overwrite,
+                    self.excludes,
+                )
+
+
+class RemoveStep(Step):
+    """
+    Remove a file or directory.
+    This step is dangerous. Use it with caution!
+    """
+
+    globs: list[str]
+    excludes: list[str]
+    include_hidden: bool
+
+    def init(self):
+        remove = self.raw_data.get("remove", valtype=str | list)
+        if isinstance(remove, str):
+            self.globs = [remove]
+        else:
+            assert_iter_types(
+                remove,
+                str,
+                RUValueException(_("The remove item must be a string.")),
+            )
+            self.globs = remove
+
+        self.include_hidden = self.raw_data.get(
+            "include-hidden",
+            False,
+            valtype=bool,
+        )
+        self.excludes = self.raw_data.get("excludes", [], valtype=list)
+
+    def run(self):
+        for glob_partten in self.globs:
+            if sys.version_info >= (3, 10):
+                paths = glob.glob(  # pylint: disable=unexpected-keyword-arg
+                    glob_partten,
+                    recursive=True,
+                    include_hidden=self.include_hidden,
+                )
+            else:
+                paths = glob.glob(
+                    glob_partten,
+                    recursive=True,
+                )
+            for path in paths:
+                path = Path(path)
+                call_ktrigger(IKernelTrigger.on_remove, path=path)
+                rm_recursive(path, strict=True)
+
+
+class ExtentionLoadStep(Step):
+    """
+    Load a Rubisco Excention manually.
+    """
+
+    path: Path
+
+    def init(self):
+        self.path = Path(self.raw_data.get("extention", valtype=str))
+
+    def run(self):
+        load_extention(self.path, strict=True)
+
+
+class WorkflowRunStep(Step):
+    """
+    Run another workflow.
+    """
+
+    path: Path
+    fail_fast: bool
+
+    def init(self):
+        self.path = Path(self.raw_data.get("workflow", valtype=str))
+
+        self.fail_fast = self.raw_data.get("fail-fast", True, valtype=bool)
+
+    def run(self):
+        from rubisco.kernel.workflow import \
+            run_workflow  # pylint: disable=import-outside-toplevel
+
+        exc = run_workflow(self.path, self.fail_fast)
+        if exc:
+            push_variables(f"{self.global_id}.exception", exc)
+
+
+class MklinkStep(Step):
+    """
+    Make a symbolic link.
+    """
+
+    src: Path
+    dst: Path
+    symlink: bool
+
+    def init(self):
+        self.src = Path(self.raw_data.get("mklink", valtype=str))
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+
+        self.symlink = self.raw_data.get("symlink", True, valtype=bool)
+
+    def run(self):
+        call_ktrigger(
+            IKernelTrigger.on_mklink,
+            src=self.src,
+            dst=self.dst,
+            symlink=self.symlink,
+        )
+
+        if self.symlink:
+            os.symlink(self.src, self.dst)
+        else:
+            os.link(self.src, self.dst)
+
+
+class CompressStep(Step):
+    """
+    Make a compressed archive.
+    """
+
+    src: Path
+    dst: Path
+    start: Path | None
+    excludes: list[str] | None
+    compress_format: str | None
+    compress_level: int | None
+    overwrite: bool
+    threads: int
+
+    def init(self):
+        self.src = Path(self.raw_data.get("compress", valtype=str))
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+        _start = self.raw_data.get("start", None, valtype=str | None)
+        self.start = Path(_start) if _start else None
+        self.excludes = self.raw_data.get(
+            "excludes",
+            None,
+            valtype=list | None,
+        )
+        self.compress_format = self.raw_data.get(
+            "format",
+            None,
+            valtype=str | list | None,
+        )
+        self.compress_level = self.raw_data.get(
+            "level",
+            None,
+            valtype=int | None,
+        )
+        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
+        self.threads = self.raw_data.get(
+            "threads",
+            get_variable("nproc") or 1,
+            valtype=int,
+        )
+
+    def run(self):
+        # Heavy. Only imported when it is used.
+        from rubisco.lib.archive import \
+            compress  # pylint: disable=import-outside-toplevel
+
+        if isinstance(self.compress_format, list):
+            assert_iter_types(
+                self.compress_format,
+                str,
+                RUValueException(
+                    _("Compress format must be a list of string or a string.")
+                ),
+            )
+            for fmt in self.compress_format:
+                if fmt == "gzip":
+                    ext = ".gz"
+                elif fmt == "bzip2":
+                    ext = ".bz2"
+                elif fmt == "lzma":
+                    ext = ".xz"
+                elif fmt == "tgz":
+                    ext = ".tar.gz"
+                elif fmt == "tbz2":
+                    ext = ".tar.bz2"
+                elif fmt == "txz":
+                    ext = ".tar.xz"
+                else:
+                    ext = f".{fmt}"
+
+                dst = Path(str(self.dst) + ext)
+                compress(
+                    self.src,
+                    dst,
+                    self.start,
+                    self.excludes,
+                    fmt,
+                    self.compress_level,
+                    self.overwrite,
+                    self.threads,
+                )
+        else:
+            compress(
+                self.src,
+                self.dst,
+                self.start,
+                self.excludes,
+                self.compress_format,
+                self.compress_level,
+                self.overwrite,
+                self.threads,
+            )
+
+
+class ExtractStep(Step):
+    """
+    Extract a compressed archive.
+    """
+
+    src: Path
+    dst: Path
+    compress_format: str | None
+    overwrite: bool
+    password: str | None
+
+    def init(self):
+        self.src = Path(self.raw_data.get("extract", valtype=str))
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+        self.compress_format = self.raw_data.get(
+            "type",
+            None,
+            valtype=str | None,
+        )
+        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
+        self.password = self.raw_data.get("password", None, valtype=str | None)
+
+    def run(self):
+        from rubisco.lib.archive import \
+            extract  # pylint: disable=import-outside-toplevel
+
+        extract(
+            self.src,
+            self.dst,
+            self.compress_format,
+            self.overwrite,
+            self.password,
+        )
+
+
+class FetchExtractStep(Step):
+    """
+    Download an archive and extract it while downloading.
+    """
+
+    url: str
+    dst: Path
+    compress_format: str | None
+    overwrite: bool
+    cache: Path | None
+    password: str | None
+    sha256: str | None
+
+    def init(self):
+        self.url = self.raw_data.get("fetch-extract", valtype=str)
+        self.dst = Path(self.raw_data.get("to", valtype=str))
+        self.compress_format = self.raw_data.get(
+            "type",
+            None,
+            valtype=str | None,
+        )
+        self.overwrite = self.raw_data.get("overwrite", True, valtype=bool)
+        _cache = self.raw_data.get("cache", None, valtype=str | None)
+        self.cache = Path(_cache) if _cache else None
+        self.password = self.raw_data.get("password", None, valtype=str | None)
+        self.sha256 = self.raw_data.get("sha256", None, valtype=str | None)
+
+    def run(self):
+        from rubisco.lib.wget import \
+            fetch_extract  # pylint: disable=import-outside-toplevel
+
+        fetch_extract(
+            self.url,
+            self.dst,
+            self.compress_format,
+            self.overwrite,
+            self.cache,
+            self.password,
+            self.sha256,
+        )
+
+
+class GitSyncStep(Step):
+    """
+    Clone or update git repositories concurrently.
+    """
+
+    repos: list[str | dict]
+    branch: str
+    shallow: bool
+    jobs: int | None
+    per_host: int | None
+    retries: int | None
+    use_fastest: bool
+
+    def init(self):
+        repos = self.raw_data.get("git-sync", valtype=str | list)
+        self.repos = [repos] if isinstance(repos, str) else list(repos)
+        assert_iter_types(
+            self.repos,
+            str | dict,
+            RUValueException(
+                _("The git-sync item must be a string or a dictionary."),
+            ),
+        )
+        self.branch = self.raw_data.get("branch", "main", valtype=str)
+        self.shallow = self.raw_data.get("shallow", True, valtype=bool)
+        self.jobs = self.raw_data.get("jobs", None, valtype=int | None)
+        self.per_host = self.raw_data.get("per-host", None, valtype=int | None)
+        self.retries = self.raw_data.get("retries", None, valtype=int | None)
+        self.use_fastest = self.raw_data.get(
+            "use-fastest",
+            True,
+            valtype=bool,
+        )
+
+    def run(self):
+        from rubisco.kernel.git import \
+            GitSyncTarget  # pylint: disable=import-outside-toplevel
+        from rubisco.kernel.git import \
+            git_sync  # pylint: disable=import-outside-toplevel
+
+        targets = []
+        for repo in self.repos:
+            if isinstance(repo, str):
+                targets.append(
+                    GitSyncTarget(repo, None, self.branch, self.shallow),
+                )
+                continue
+            path = repo.get("path", None, valtype=str | None)
+            targets.append(
+                GitSyncTarget(
+                    repo.get("url", valtype=str),
+                    Path(path) if path else None,
+                    repo.get("branch", self.branch, valtype=str),
+                    repo.get("shallow", self.shallow, valtype=bool),
+                ),
+            )
+        options = {
+            "jobs": self.jobs,
+            "per_host": self.per_host,
+            "retries": self.retries,
+        }
+        git_sync(
+            targets,
+            use_fastest=self.use_fastest,
+            **{key: val for key, val in options.items() if val is not None},
+        )
+
+
+step_types = {
+    "shell": ShellExecStep,
+    "shell-parallel": ParallelShellExecStep,
+    "mkdir": MkdirStep,
+    "output": OutputStep,
+    "echo": EchoStep,
+    "popen": PopenStep,
+    "move": MoveFileStep,
+    "copy": CopyFileStep,
+    "remove": RemoveStep,
+    "load-extention": ExtentionLoadStep,
+    "run-workflow": WorkflowRunStep,
+    "mklink": MklinkStep,
+    "compress": CompressStep,
+    "extract": ExtractStep,
+    "fetch-extract": FetchExtractStep,
+    "git-sync": GitSyncStep,
+}
+
+# Type is optional. If not provided, it will be inferred from the step data.
+step_contribute = {
+    ShellExecStep: ["run"],
+    ParallelShellExecStep: ["run-parallel"],
+    MkdirStep: ["mkdir"],
+    PopenStep: ["popen"],
+    OutputStep: ["output"],
+    EchoStep: ["echo"],
+    MoveFileStep: ["move", "to"],
+    CopyFileStep: ["copy", "to"],
+    RemoveStep: ["remove"],
+    ExtentionLoadStep: ["extention"],
+    WorkflowRunStep: ["workflow"],
+    MklinkStep: ["mklink", "to"],
+    CompressStep: ["compress", "to"],
+    ExtractStep: ["extract", "to"],
+    FetchExtractStep: ["fetch-extract", "to"],
+    GitSyncStep: ["git-sync"],
+}
+
+
+# Step types of the extentions which are not loaded yet.
+# Name -> (contributes, loader).
+lazy_step_types: dict[str, tuple[list[str], Callable[[], None]]] = {}
+
+
+def step_type_name(step_cls: type) -> str:
+    """Get the registered type name of a step class.
+
+    Args:
+        step_cls (type): The step class.
+
+    Returns:
+        str: The step type name.
+    """
+
+    for name, cls in step_types.items():
+        if cls is step_cls:
+            return name
+    raise KeyError(repr(step_cls))
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Helpers shared by archive compression and extraction.
+"""
+
+from pathlib import Path
+from typing import BinaryIO
+
+from rubisco.config import COPY_BUFSIZE
+from rubisco.lib.fileutil import check_file_exists, rm_recursive
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
+
+__all__ = [
+    "copy_with_progress",
+    "normalize_compress_type",
+    "post_member_progress",
+    "prepare_dest",
+]
+
+
+def normalize_compress_type(
+    compress_type: str | None,
+    supported: list[str | None],
+) -> str | None:
+    """Normalize a single stream compression type.
+
+    Args:
+        compress_type (str | None): Compression type. "gzip" and "bzip2" are
+            the aliases of "gz" and "bz2".
+        supported (list[str | None]): The supported types.
+
+    Returns:
+        str | None: The normalized compression type.
+
+    Raises:
+        AssertionError: If the type is not supported.
+    """
+
+    compress_type = compress_type.lower().strip() if compress_type else None
+    if compress_type == "gzip":
+        compress_type = "gz"
+    elif compress_type == "bzip2":
+        compress_type = "bz2"
+    if compress_type not in supported:
+        raise AssertionError
+    return compress_type
+
+
+def prepare_dest(dest: Path, overwrite: bool) -> None:
+    """Remove the destination if it exists.
+
+    Args:
+        dest (Path): The destination.
+        overwrite (bool): Remove it without asking UCI.
+    """
+
+    if not overwrite:
+        check_file_exists(dest)
+    elif dest.exists():
+        rm_recursive(dest)
+
+
+def post_member_progress(
+    task_name: str,
+    path: Path,
+    dest: Path,
+    members: int | None = None,
+) -> None:
+    """Post the progress of a processed archive member.
+
+    Args:
+        task_name (str): The task name.
+        path (Path): The member path.
+        dest (Path): The destination.
+        members (int | None, optional): The number of members. It is not
+            sent if it is None. Defaults to None.
+    """
+
+    more_data: dict[str, Path | int] = {"path": path, "dest": dest}
+    if members is not None:
+        more_data["members"] = members
+    call_ktrigger(
+        IKernelTrigger.on_progress,
+        task_name=task_name,
+        current=1,
+        delta=True,
+        more_data=more_data,
+    )
+
+
+def copy_with_progress(  # pylint: disable=too-many-arguments
+    fsrc: BinaryIO,
+    fdst: BinaryIO,
+    task_name: str,
+    task_type: str,
+    total: int,
+) -> None:
+    """Copy a file object. A task is shown if the data is large.
+
+    Args:
+        fsrc (BinaryIO): The source.
+        fdst (BinaryIO): The destination.
+        task_name (str): The task name.
+        task_type (str): The task type.
+        total (int): The size of the source.
+    """
+
+    if total <= COPY_BUFSIZE * 50:
+        while buf := fsrc.read(COPY_BUFSIZE):
+            fdst.write(buf)
+        return
+
+    call_ktrigger(
+        IKernelTrigger.on_new_task,
+        task_name=task_name,
+        task_type=task_type,
+        total=total,
+    )
+    while buf := fsrc.read(COPY_BUFSIZE):
+        call_ktrigger(
+            IKernelTrigger.on_progress,
+            task_name=task_name,
+            current=len(buf),
+            delta=True,
+        )
+        fdst.write(buf)
+    call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
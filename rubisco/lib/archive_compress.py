@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive compression utilities.
+"""
+
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+import py7zr
+import py7zr.callbacks
+import py7zr.exceptions
+
+from rubisco.lib.archive_common import (copy_with_progress,
+                                        normalize_compress_type,
+                                        post_member_progress, prepare_dest)
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.l10n import _
+from rubisco.lib.variable import format_str
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
+
+__all__ = [
+    "compress_7z",
+    "compress_file",
+    "compress_tarball",
+    "compress_zip",
+    "ParallelCompressor",
+]
+
+
+# Block size of the block-parallel compression.
+PARALLEL_BLOCK_SIZES = {
+    "gz": 1024 * 1024,
+    "bz2": 900 * 1024,
+    "xz": 8 * 1024 * 1024,
+}
+
+
+class ParallelCompressor:
+    """
+    A write-only file object which compresses data blocks concurrently.
+    Every block is compressed as an independent gzip member, bzip2 stream or
+    xz stream, and the concatenated output is readable by any decompressor.
+    zlib, bz2 and lzma release the GIL while compressing.
+    """
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        compress_type: str,
+        compress_level: int | None = None,
+        threads: int = 1,
+    ) -> None:
+        """Create a block-parallel compressor.
+
+        Args:
+            fileobj (BinaryIO): The output file. It will not be closed.
+            compress_type (str): Compression type. It can be "gz", "bz2" or
+                "xz".
+            compress_level (int | None, optional): Compression level. It can
+                be 0 to 9. Defaults to None.
+            threads (int, optional): The number of compression threads.
+                Defaults to 1.
+
+        Raises:
+            AssertionError: If compress is not in ["gz", "bz2", "xz"]
+        """
+
+        if compress_type == "gz":
+            level = compress_level if compress_level is not None else 9
+            self._compress = partial(gzip.compress, compresslevel=level, mtime=0)  # noqa: E501
+        elif compress_type == "bz2":
+            level = compress_level if compress_level is not None else 9
+            self._compress = partial(bz2.compress, compresslevel=level)
+        elif compress_type == "xz":
+            self._compress = partial(
+                lzma.compress,
+                format=lzma.FORMAT_XZ,
+                preset=compress_level,
+            )
+        else:
+            raise AssertionError
+
+        self._fileobj = fileobj
+        self._block_size = PARALLEL_BLOCK_SIZES[compress_type]
+        self._buffer = bytearray()
+        self._threads = max(threads, 1)
+        self._pending: deque[Future[bytes]] = deque()
+        self._executor = ThreadPoolExecutor(self._threads)
+        self._blocks = 0
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(self._executor.submit(self._compress, block))
+        self._blocks += 1
+        # Keep the memory usage bounded and the output in order.
+        while len(self._pending) > self._threads * 2:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def write(self, data: bytes) -> int:
+        """Write data to the compressor.
+
+        Args:
+            data (bytes): The data.
+
+        Returns:
+            int: The number of bytes written.
+        """
+
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[: self._block_size]))
+            del self._buffer[: self._block_size]
+
+        return len(data)
+
+    def close(self) -> None:
+        """Compress the remaining data and wait for all the blocks."""
+
+        try:
+            if self._buffer or not self._blocks:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._fileobj.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "ParallelCompressor":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _collect_members(
+    src: Path,
+    start: Path | None,
+    excludes: list[str] | None,
+) -> list[tuple[Path, Path]]:
+    """Collect the files to compress with their names in the archive.
+
+    Args:
+        src (Path): Source file or directory.
+        start (Path | None): Start directory. None means the parent of
+            `src`.
+        excludes (list[str] | None): List of excluded files. Supports glob
+            patterns.
+
+    Returns:
+        list[tuple[Path, Path]]: The paths and their archive names.
+
+    Raises:
+        RUValueException: If a path is not in the subpath of `start`.
+    """
+
+    if not start:
+        start = src.parent
+
+    members: list[tuple[Path, Path]] = []
+    for path in src.rglob("*") if src.is_dir() else [src]:
+        if excludes and any(path.match(ex) for ex in excludes):
+            continue
+        try:
+            members.append((path, path.relative_to(start)))
+        except ValueError as exc:
+            raise RUValueException(
+                format_str(
+                    _(
+                        "'[underline]${{path}}[/underline]' is not in the "
+                        "subpath of '[underline]${{start}}[/underline]'"
+                    ),
+                    fmt={"path": str(path), "start": str(start)},
+                ),
+            ) from exc
+
+    return members
+
+
+def _add_members(
+    task_name: str,
+    members: list[tuple[Path, Path]],
+    dest: Path,
+    add: Callable[[Path, Path], object],
+) -> None:
+    """Add the collected files to an archive as a task.
+
+    Args:
+        task_name (str): The task name.
+        members (list[tuple[Path, Path]]): The paths and their archive names.
+        dest (Path): Destination archive.
+        add (Callable[[Path, Path], object]): Add a path with its archive
+            name.
+    """
+
+    call_ktrigger(
+        IKernelTrigger.on_new_task,
+        task_name=task_name,
+        task_type=IKernelTrigger.TASK_COMPRESS,
+        total=len(members),
+    )
+    for path, arcname in members:
+        add(path, arcname)
+        post_member_progress(task_name, path, dest)
+    call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+
+
+def compress_tarball(  # pylint: disable=too-many-arguments
+    src: Path,
+    dest: Path,
+    start: Path | None = None,
+    excludes: list[str] | None = None,
+    compress_type: str | None = None,
+    compress_level: int | None = None,
+    overwrite: bool = False,
+    threads: int = 1,
+) -> None:
+    """Compress a tarball to destination.
+
+    Args:
+        src (Path): Source file or directory.
+        dest (Path): Destination tarball file.
+        start (Path | None, optional): Start directory. Defaults to None.
+        ```
+            e.g.
+                /
+                ├── a
+                │   ├── b
+                │   │   ├── c
+                If start is '/a', the tarball will be created as 'b/c'.
+                If start is None, the tarball will be created as 'c'.
+        ```
+        excludes (list[str] | None, optional): List of excluded files.
+            Supports glob patterns. Defaults to None.
+        compress_type (str | None, optional): Compression type. It can be "gz",
+            "bz2", "xz". Defaults to None.
+        compress_level (int | None, optional): Compression level. It can be
+            0 to 9. Defaults to None. Only for gzip and bzip2. Ignored for
+            others.
+        overwrite (bool, optional): Overwrite destination if it exists.
+            Defaults to False.
+        threads (int, optional): The number of compression threads. Blocks
+            are compressed concurrently if it is greater than 1. Defaults to
+            1.
+    """
+
+    compress_type = normalize_compress_type(
+        compress_type,
+        ["gz", "bz2", "xz", None],
+    )
+    prepare_dest(dest, overwrite)
+    task_name = format_str(
+        _(
+            "Compressing '[underline]${{path}}[/underline]' to "
+            "'[underline]${{file}}[/underline]' as '${{type}}' ..."
+        ),
+        fmt={
+            "path": str(src),
+            "file": str(dest),
+            "type": f"tar.{compress_type}" if compress_type else "tar",
+        },
+    )
+    members = _collect_members(src, start, excludes)
+
+    with ExitStack() as stack:
+        if compress_type and threads > 1:
+            writer = stack.enter_context(
+                ParallelCompressor(
+                    stack.enter_context(dest.open("wb")),
+                    compress_type,
+                    compress_level,
+                    threads,
+                )
+            )
+            fp = stack.enter_context(tarfile.open(fileobj=writer, mode="w|"))
+        elif compress_type in ["gz", "bz2"]:
+            compress_level = compress_level if compress_level else 9
+            fp = stack.enter_context(
+                tarfile.open(
+                    dest,
+                    f"w:{compress_type}",
+                    compresslevel=compress_level,
+                )
+            )
+        else:
+            mode = f"w:{compress_type}" if compress_type else "w"
+            fp = stack.enter_context(tarfile.open(dest, mode))
+        _add_members(
+            task_name,
+            members,
+            dest,
+            # Avoid re-adding.
+            lambda path, arcname: fp.add(path, arcname, recursive=False),
+        )
+
+
+def compress_zip(  # pylint: disable=too-many-arguments
+    src: Path,
+    dest: Path,
+    start: Path | None = None,
+    excludes: list[str] | None = None,
+    compress_level: int | None = None,
+    overwrite: bool = False,
+) -> None:
+    """Compress a zip file to destination.
+
+    Args:
+        src (Path): Source file or directory.
+        dest (Path): Destination zip file.
+        start (Path | None, optional): Start directory. Defaults to None.
+        excludes (list[str] | None, optional): List of excluded files.
+            Supports glob patterns. Defaults to None.
+        compress_level (int | None, optional): Compression level. It can be
+            0 to 9. Defaults to None. Only for gzip and bzip2. Ignored for
+            others.
+        overwrite (bool, optional): Overwrite destination if it exists.
+            Defaults to False.
+    """
+
+    prepare_dest(dest, overwrite)
+    task_name = format_str(
+        _(
+            "Compressing '[underline]${{path}}[/underline]' to "
+            "'[underline]${{file}}[/underline]' as '${{type}}' ..."
+        ),
+        fmt={"path": str(src), "file": str(dest), "type": "zip"},
+    )
+    members = _collect_members(src, start, excludes)
+
+    with zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as fp:
+        _add_members(
+            task_name,
+            members,
+            dest,
+            lambda path, arcname: fp.write(
+                path,
+                arcname,
+                compresslevel=compress_level,
+            ),
+        )
+
+
+def compress_7z(  # pylint: disable=too-many-arguments
+    src: Path,
+    dest: Path,
+    start: Path | None = None,
+    excludes: list[str] | None = None,
+    overwrite: bool = False,
+) -> None:
+    """Compress a 7z file to destination.
+
+    Args:
+        src (Path): Source file or directory.
+        dest (Path): Destination 7z file.
+        start (Path | None, optional): Start directory. Defaults to None.
+        excludes (list[str] | None, optional): List of excluded files.
+            Supports glob patterns. Defaults to None.
+        overwrite (bool, optional): Overwrite destination if it exists.
+            Defaults to False.
+    """
+
+    prepare_dest(dest, overwrite)
+    task_name = format_str(
+        _(
+            "Compressing '[underline]${{path}}[/underline]' to "
+            "'[underline]${{file}}[/underline]' as '${{type}}' ..."
+        ),
+        fmt={"path": str(src), "file": str(dest), "type": "7z"},
+    )
+    members = _collect_members(src, start, excludes)
+
+    with py7zr.SevenZipFile(dest, mode="w") as fp:
+        _add_members(task_name, members, dest, fp.write)
+
+
+def compress_file(  # pylint: disable=too-many-arguments,too-many-branches
+    src: Path,
+    dest: Path,
+    compress_type: str = "gz",
+    compress_level: int | None = None,
+    overwrite: bool = False,
+    threads: int = 1,
+) -> None:
+    """Compress a file to destination.
+
+    Args:
+        src (Path): Source file.
+        dest (Path): Destination file.
+        compress_type (str): Compression type. Default is "gz".
+        compress_level (int | None, optional): Compression level. It can be
+            0 to 9. Defaults to None. Only for gzip and bzip2. Ignored for
+            others.
+        overwrite (bool, optional): Overwrite destination if it exists.
+            Defaults to False.
+        threads (int, optional): The number of compression threads. Blocks
+            are compressed concurrently if it is greater than 1. Defaults to
+            1.
+    """
+
+    compress_type = normalize_compress_type(compress_type, ["gz", "bz2", "xz"])
+    prepare_dest(dest, overwrite)
+    task_name = format_str(
+        _(
+            "Compressing '[underline]${{path}}[/underline]'"
+            " to '[underline]${{file}}[/underline]'"
+            " as '${{type}}' ..."
+        ),
+        fmt={
+            "path": str(src),
+            "file": str(dest),
+            "type": compress_type,
+        },
+    )
+
+    level = compress_level if compress_level is not None else 9
+    with ExitStack() as stack:
+        fsrc = stack.enter_context(src.open("rb"))
+        if threads > 1:
+            fdst = stack.enter_context(
+                ParallelCompressor(
+                    stack.enter_context(dest.open("wb")),
+                    compress_type,
+                    compress_level,
+                    threads,
+                )
+            )
+        elif compress_type == "gz":
+            fdst = stack.enter_context(gzip.open(dest, "wb", level))
+        elif compress_type == "bz2":
+            fdst = stack.enter_context(bz2.BZ2File(dest, "wb", compresslevel=level))  # noqa: E501
+        else:
+            fdst = stack.enter_context(
+                lzma.open(dest, "wb", preset=compress_level),
+            )
+        copy_with_progress(
+            fsrc,
+            fdst,
+            task_name,
+            IKernelTrigger.TASK_COMPRESS,
+            src.stat().st_size,
+        )
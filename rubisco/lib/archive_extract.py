@@ -0,0 +1,764 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Archive extraction utilities.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+import queue
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+from typing import BinaryIO, Callable
+
+import py7zr
+import py7zr.callbacks
+import py7zr.exceptions
+
+from rubisco.config import COPY_BUFSIZE, DEFAULT_CHARSET
+from rubisco.lib.archive_common import (copy_with_progress,
+                                        normalize_compress_type,
+                                        post_member_progress, prepare_dest)
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.l10n import _
+from rubisco.lib.variable import format_str
+from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
+
+__all__ = [
+    "extract_7z",
+    "extract_file",
+    "extract_tarball",
+    "extract_tarball_stream",
+    "extract_zip",
+]
+
+
+# Maximum number of chunks buffered between the tar reader and writer.
+TAR_PIPELINE_DEPTH = 64
+
+# Archives with fewer members are extracted on the caller's thread.
+ZIP_PARALLEL_THRESHOLD = 16
+
+# Tarball files are always created, never written through an existing link.
+_TAR_FILE_FLAGS = (
+    os.O_WRONLY
+    | os.O_CREAT
+    | os.O_EXCL
+    | getattr(os, "O_NOFOLLOW", 0)
+    | getattr(os, "O_BINARY", 0)
+)
+
+
+def _is_within(path: str, dest: str) -> bool:
+    return path == dest or path.startswith(dest.rstrip(os.sep) + os.sep)
+
+
+def _tar_member_path(dest: Path, member: tarfile.TarInfo) -> str:
+    """Get the destination path of a tarball member. Members which would
+    be written outside the destination are rejected, because they are not
+    extracted by tarfile's own (filtered) extraction.
+
+    Args:
+        dest (Path): Destination directory.
+        member (tarfile.TarInfo): The member.
+
+    Returns:
+        str: The destination path.
+
+    Raises:
+        RUValueException: If the member is absolute, contains "..", or
+            resolves or links outside the destination.
+    """
+
+    real_dest = os.path.realpath(dest)
+    name = member.name.replace("\\", "/")
+    path = os.path.join(real_dest, name)
+    unsafe = (
+        name.startswith("/")
+        or os.path.isabs(name)
+        or bool(os.path.splitdrive(name)[0])
+        or os.path.pardir in name.split("/")
+        or not _is_within(os.path.realpath(path), real_dest)
+    )
+    if not unsafe and member.issym():
+        unsafe = os.path.isabs(member.linkname) or not _is_within(
+            os.path.realpath(
+                os.path.join(os.path.dirname(path), member.linkname),
+            ),
+            real_dest,
+        )
+    elif not unsafe and member.islnk():
+        unsafe = os.path.isabs(member.linkname) or not _is_within(
+            os.path.realpath(os.path.join(real_dest, member.linkname)),
+            real_dest,
+        )
+    if unsafe:
+        raise RUValueException(
+            format_str(
+                _(
+                    "Tarball member '${{name}}' is outside the destination "
+                    "directory."
+                ),
+                fmt={"name": member.name},
+            ),
+        )
+    return path
+
+
+def _write_tar_files(
+    fp: tarfile.TarFile,
+    chunks: queue.Queue[tuple | None],
+    errors: list[Exception],
+) -> None:
+    """Write the regular files queued by `_extract_tar_members` until None
+    is queued. The first exception is appended to `errors`, and the rest
+    items are dropped. An existing file, or link, is replaced instead of
+    being written through.
+
+    Args:
+        fp (tarfile.TarFile): The opened tarball.
+        chunks (queue.Queue[tuple | None]): The queued items.
+        errors (list[Exception]): The exceptions raised by writing.
+    """
+
+    fdst = None
+    while (item := chunks.get()) is not None:
+        try:
+            if errors:
+                continue
+            if item[0] == "open":
+                if os.path.lexists(item[2]):
+                    os.unlink(item[2])
+                fdst = os.fdopen(
+                    os.open(item[2], _TAR_FILE_FLAGS, 0o666),
+                    "wb",
+                )
+            elif item[0] == "data":
+                fdst.write(item[1])
+            else:  # "close"
+                fdst.close()
+                fdst = None
+                fp.chown(item[1], item[2], False)
+                fp.chmod(item[1], item[2])
+                fp.utime(item[1], item[2])
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            errors.append(exc)
+        finally:
+            chunks.task_done()
+    chunks.task_done()
+    if fdst is not None:
+        fdst.close()
+
+
+def _extract_tar_members(  # pylint: disable=too-many-branches
+    fp: tarfile.TarFile,
+    dest: Path,
+    on_member: Callable[[tarfile.TarInfo], None],
+) -> None:
+    """Extract all members of a tarball with a pipelined writer.
+    The members are read lazily, so `fp` can be a stream ("r|*"). Regular
+    file data is decompressed on the caller's thread and written on a writer
+    thread. The writer is drained before any other member is extracted, so
+    a later link cannot redirect a queued file. Directory metadata is
+    applied after all members are extracted.
+
+    Args:
+        fp (tarfile.TarFile): The opened tarball.
+        dest (Path): Destination directory.
+        on_member (Callable[[tarfile.TarInfo], None]): Called after each
+            member is read.
+    """
+
+    chunks: queue.Queue[tuple | None] = queue.Queue(TAR_PIPELINE_DEPTH)
+    errors: list[Exception] = []
+    dirs: list[tarfile.TarInfo] = []
+    created_dirs: set[str] = set()
+    # tarfile's data filter also drops unsafe modes and special files.
+    data_filter = getattr(tarfile, "data_filter", None)
+    extract_args = (
+        {"filter": "fully_trusted"} if data_filter is not None else {}
+    )
+    writer = threading.Thread(
+        target=_write_tar_files,
+        args=(fp, chunks, errors),
+        daemon=True,
+    )
+    writer.start()
+    try:
+        for member in fp:
+            if errors:
+                break
+            path = _tar_member_path(dest, member)
+            if data_filter is not None:
+                member = data_filter(member, str(dest))
+            if member.isreg():
+                parent = os.path.dirname(path)
+                if parent not in created_dirs:
+                    os.makedirs(parent, exist_ok=True)
+                    created_dirs.add(parent)
+                chunks.put(("open", member, path))
+                fsrc = fp.extractfile(member)
+                while buf := fsrc.read(COPY_BUFSIZE):
+                    chunks.put(("data", buf))
+                chunks.put(("close", member, path))
+            else:
+                # The queued files must be written before a link or a
+                # directory replaces them, and a hardlink needs its target.
+                chunks.join()
+                if errors:
+                    break
+                if member.isdir():
+                    fp.extract(member, dest, set_attrs=False, **extract_args)
+                    dirs.append(member)
+                else:
+                    fp.extract(member, dest, **extract_args)
+            on_member(member)
+    finally:
+        chunks.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
+
+    # Children are extracted, so their parents' mtime will not be changed.
+    dirs.sort(key=lambda member: member.name, reverse=True)
+    for member in dirs:
+        path = os.path.join(dest, member.name)
+        if os.path.islink(path):  # Replaced by a later member.
+            continue
+        fp.chown(member, path, False)
+        fp.utime(member, path)
+        fp.chmod(member, path)
+
+
+def extract_tarball_stream(  # pylint: disable=too-many-arguments
+    fileobj: BinaryIO,
+    dest: Path,
+    compress_type: str | None = None,
+    overwrite: bool = False,
+    name: str = "",
+    total: int = 0,
+) -> None:
+    """Extract a tarball from a readable stream to destination.
+    The stream is only read forward, so it can be a network response.
+
+    Args:
+        fileobj (BinaryIO): The stream. Its `tell()` is used to report the
+            progress.
+        dest (Path): Destination directory.
+        compress_type (str): Compression type. None means no compression.
+            Default is None.
+        overwrite (bool): Overwrite destination directory if it exists.
+        name (str): The name of the tarball to show. Default is "".
+        total (int): The size of the stream. Default is 0 (unknown).
+
+    Raises:
+        AssertionError: If compress is not in ["gz", "bz2", "xz"]
+    """
+
+    compress_type = normalize_compress_type(
+        compress_type,
+        ["gz", "bz2", "xz", None],
+    )
+
+    with tarfile.open(
+        fileobj=fileobj,
+        mode=f"r|{compress_type}" if compress_type else "r|",
+    ) as fp:
+        prepare_dest(dest, overwrite)
+        task_name = format_str(
+            _(
+                "Extracting '[underline]${{file}}[/underline]' to "
+                "'[underline]${{path}}[/underline]' as '${{type}}' ..."
+            ),
+            fmt={
+                "file": name,
+                "path": str(dest),
+                "type": f"tar.{compress_type}" if compress_type else "tar",
+            },
+        )
+        # The members are unknown until the whole stream is read, so the
+        # progress is the number of bytes consumed, and "members" is not
+        # sent with the paths.
+        call_ktrigger(
+            IKernelTrigger.on_new_task,
+            task_name=task_name,
+            task_type=IKernelTrigger.TASK_EXTRACT,
+            total=total,
+        )
+
+        def _on_member(member: tarfile.TarInfo) -> None:
+            call_ktrigger(
+                IKernelTrigger.on_progress,
+                task_name=task_name,
+                current=fileobj.tell(),
+                more_data={"path": Path(member.path), "dest": dest},
+            )
+
+        _extract_tar_members(fp, dest, _on_member)
+
+        call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+
+
+def extract_tarball(
+    tarball: Path,
+    dest: Path,
+    compress_type: str | None = None,
+    overwrite: bool = False,
+) -> None:
+    """Extract tarball to destination.
+
+    Args:
+        tarball (Path): Path to tarball.
+        dest (Path): Destination directory.
+        compress_type (str): Compression type. None means no compression.
+            Default is None.
+        overwrite (bool): Overwrite destination directory if it exists.
+
+    Raises:
+        AssertionError: If compress is not in ["gz", "bz2", "xz"]
+    """
+
+    with tarball.open("rb") as fileobj:
+        extract_tarball_stream(
+            fileobj,
+            dest,
+            compress_type,
+            overwrite,
+            str(tarball),
+            tarball.stat().st_size,
+        )
+
+
+def _zip_member_path(dest: Path, name: str) -> Path:
+    """Get the destination path of a zip member like `ZipFile.extract()`.
+
+    Args:
+        dest (Path): Destination directory.
+        name (str): The member name.
+
+    Returns:
+        Path: The path without absolute, drive, "." and ".." components.
+    """
+
+    name = name.replace("/", os.path.sep)
+    if os.path.altsep:
+        name = name.replace(os.path.altsep, os.path.sep)
+    name = os.path.splitdrive(name)[1]
+    return dest.joinpath(
+        *(
+            part
+            for part in name.split(os.path.sep)
+            if part not in ("", os.path.curdir, os.path.pardir)
+        )
+    )
+
+
+def _zip_extract_member(
+    fp: zipfile.ZipFile,
+    member: zipfile.ZipInfo,
+    path: Path,
+    pwd: bytes | None,
+) -> zipfile.ZipInfo:
+    """Extract a zip file member. Its parent must exist.
+
+    Args:
+        fp (zipfile.ZipFile): The zip file.
+        member (zipfile.ZipInfo): The member to extract.
+        path (Path): The destination path.
+        pwd (bytes | None): The password.
+
+    Returns:
+        zipfile.ZipInfo: The extracted member.
+    """
+
+    with fp.open(member, pwd=pwd) as fsrc, path.open("wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFSIZE)
+    return member
+
+
+def _zip_set_attrs(member: zipfile.ZipInfo, path: Path) -> None:
+    """Set the permission and modification time of an extracted member.
+
+    Args:
+        member (zipfile.ZipInfo): The member.
+        path (Path): The extracted path.
+    """
+
+    perm = member.external_attr >> 16
+    if perm:
+        os.chmod(path, perm)
+    utime = time.mktime(member.date_time + (0, 0, -1))
+    os.utime(path, (utime, utime))
+
+
+def extract_zip(  # pylint: disable=too-many-locals
+    file: Path,
+    dest: Path,
+    overwrite: bool = False,
+    password: str | None = None,
+    workers: int | None = None,
+) -> None:
+    """Extract zip file to destination.
+    Members are decompressed concurrently. Every worker thread has its own
+    `ZipFile` handle.
+
+    Args:
+        file (Path): Path to zip file.
+        dest (Path): Destination directory.
+        overwrite (bool): Overwrite destination directory if it exists.
+        password (str): Password to decrypt zip file. Default is None.
+        workers (int | None): The number of worker threads. Defaults to
+            None, which means the default of `ThreadPoolExecutor`.
+    """
+
+    pwd = password.encode(DEFAULT_CHARSET) if password else None
+    with zipfile.ZipFile(file, "r") as fp:
+        memembers = fp.infolist()
+        prepare_dest(dest, overwrite)
+        task_name = format_str(
+            _(
+                "Extracting '[underline]${{file}}[/underline]' to "
+                "'[underline]${{path}}[/underline]' as '${{type}}' ..."
+            ),
+            fmt={"file": str(file), "path": str(dest), "type": "zip"},
+        )
+        call_ktrigger(
+            IKernelTrigger.on_new_task,
+            task_name=task_name,
+            task_type=IKernelTrigger.TASK_EXTRACT,
+            total=len(memembers),
+        )
+
+        def _on_member(member: zipfile.ZipInfo) -> None:
+            post_member_progress(
+                task_name,
+                Path(member.filename),
+                dest,
+                len(memembers),
+            )
+
+        # Create all the directories first. The later member wins if some
+        # members have the same path.
+        files: dict[Path, zipfile.ZipInfo] = {}
+        dirs: dict[Path, zipfile.ZipInfo] = {}
+        for member in memembers:
+            path = _zip_member_path(dest, member.filename)
+            if member.is_dir():
+                path.mkdir(parents=True, exist_ok=True)
+                dirs[path] = member
+                _on_member(member)
+            else:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                files[path] = member
+
+        if len(files) < ZIP_PARALLEL_THRESHOLD or workers == 1:
+            for path, member in files.items():
+                _on_member(_zip_extract_member(fp, member, path, pwd))
+        else:
+            local = threading.local()
+            # Closed after the workers are stopped.
+            handles = ExitStack()
+
+            def _extract(
+                member: zipfile.ZipInfo,
+                path: Path,
+            ) -> zipfile.ZipInfo:
+                if not hasattr(local, "fp"):
+                    local.fp = handles.enter_context(zipfile.ZipFile(file))
+                return _zip_extract_member(local.fp, member, path, pwd)
+
+            with handles, ThreadPoolExecutor(workers) as executor:
+                try:
+                    futures = [
+                        executor.submit(_extract, member, path)
+                        for path, member in files.items()
+                    ]
+                    for future in as_completed(futures):
+                        _on_member(future.result())
+                finally:
+                    executor.shutdown(wait=True, cancel_futures=True)
+
+        # Apply the metadata. Children first, so the modification time of
+        # directories will not be changed.
+        for path, member in files.items():
+            _zip_set_attrs(member, path)
+        for path in sorted(dirs, key=lambda path: len(path.parts), reverse=True):  # noqa: E501
+            _zip_set_attrs(dirs[path], path)
+
+        call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+
+
+def extract_7z(
+    file: Path,
+    dest: Path,
+    password: str | None = None,
+) -> None:
+    """Extract 7z file to destination.
+
+    Args:
+        file (Path): Path to 7z file.
+        dest (Path): Destination directory.
+        password (str): Password to decrypt 7z file. Default is None.
+    """
+
+    with py7zr.SevenZipFile(file, mode="r", password=password) as fp:
+        task_name = format_str(
+            _(
+                "Extracting '[underline]${{file}}[/underline]' to "
+                "'[underline]${{path}}[/underline]' as '${{type}}' ..."
+            ),
+            fmt={"file": str(file), "path": str(dest), "type": "7z"},
+        )
+        members = len(fp.getnames())
+
+        class _ExtractCallback(py7zr.callbacks.ExtractCallback):
+            end: bool = False
+
+            def report_start_preparation(self):
+                """
+                Report a start of preparation event such as making list of
+                    files and looking into its properties.
+                """
+
+                self.end = False
+                call_ktrigger(
+                    IKernelTrigger.on_new_task,
+                    task_name=task_name,
+                    task_type=IKernelTrigger.TASK_EXTRACT,
+                    total=members,
+                )
+
+            def report_start(
+                self,
+                processing_file_path: str,
+                processing_bytes: int,
+            ):
+                """
+                Report a start event of specified archive file and its input
+                    bytes.
+
+                Args:
+                    processing_file_path (str): Processing file path.
+                    processing_bytes (int): Processing bytes.
+                """
+
+            def report_update(self, decompressed_bytes: int):
+                """
+                Report an event when large file is being extracted more than 1
+                    second or when extraction is finished. Receives a number of
+                    decompressed bytes since the last update.
+
+                Args:
+                    decompressed_bytes (int): Decompressed bytes.
+                """
+
+            def report_end(  # pylint: disable=unused-argument
+                self,
+                processing_file_path: str,
+                wrote_bytes: int,
+            ):
+                """
+                Report an end event of specified archive file and its output
+                    bytes.
+
+                Args:
+                    processing_file_path (str): Processing file path.
+                    wrote_bytes (int): Wrote bytes.
+                """
+
+                post_member_progress(
+                    task_name,
+                    Path(processing_file_path),
+                    dest,
+                    members,
+                )
+
+            def report_warning(self, message: str):
+                """
+                Report an warning event with its message.
+
+                Args:
+                    message (str): Warning message.
+                """
+
+                call_ktrigger(
+                    IKernelTrigger.on_warning,
+                    message=message,
+                )
+
+            def report_postprocess(self):
+                """
+                Report a start of post processing event such as set file
+                    properties and permissions or creating symlinks.
+                """
+
+                call_ktrigger(
+                    IKernelTrigger.on_finish_task,
+                    task_name=task_name,
+                )
+                self.end = True
+
+        callback = _ExtractCallback()
+        fp.extractall(dest, callback=callback)
+
+        # call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+        while not callback.end:
+            try:
+                fp.reporterd.join(0.01)
+            except RuntimeError:
+                pass
+
+
+def extract_file(  # pylint: disable=too-many-branches
+    file: Path,
+    dest: Path,
+    compress_type: str = "gz",
+    overwrite: bool = False,
+) -> None:
+    """Extract a compressed data file to destination.
+    This function only supports gzip, bzip2 and xz compression which are
+    only supports one-file compression.
+
+    Args:
+        file (Path): Path to compressed file.
+        dest (Path): Destination directory.
+        compress_type (str): Compression type. Default is "gz".
+        overwrite (bool): Overwrite destination directory if it exists.
+
+    Raises:
+        AssertionError: If compress is not in ["gz", "bz2", "xz"]
+    """
+
+    compress_type = normalize_compress_type(compress_type, ["gz", "bz2", "xz"])
+    if compress_type == "gz":
+        fsrc = gzip.open(file, "rb")
+    elif compress_type == "bz2":
+        fsrc = bz2.BZ2File(file, "rb")
+    elif compress_type == "xz":
+        fsrc = lzma.open(file, "rb")
+    else:
+        raise AssertionError
+
+    with fsrc:
+        fsrc.seek(0, os.SEEK_END)
+        fsize = fsrc.tell()
+        fsrc.seek(0, os.SEEK_SET)
+        prepare_dest(dest, overwrite)
+        task_name = format_str(
+            _(
+                "Extracting '[underline]${{file}}[/underline]'"
+                " to '[underline]${{path}}[/underline]'"
+                " as '${{type}}' ..."
+            ),
+            fmt={
+                "file": str(file),
+                "path": str(dest),
+                "type": compress_type,
+            },
+        )
+        with open(dest, "wb") as fdst:
+            copy_with_progress(
+                fsrc,
+                fdst,
+                task_name,
+                IKernelTrigger.TASK_EXTRACT,
+                fsize,
+            )
+
+
+if __name__ == "__main__":
+    import io
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    with tempfile.TemporaryDirectory() as temp:
+        root = Path(temp)
+
+        # Test: Members outside the destination are rejected.
+        def _evil_tarball(path: Path, info: tarfile.TarInfo) -> Path:
+            payload = b"escaped" if info.isreg() else b""
+            info.size = len(payload)
+            with tarfile.open(path, "w") as fp_:
+                fp_.addfile(info, io.BytesIO(payload) if payload else None)
+            return path
+
+        evil_members = [tarfile.TarInfo("../escaped.txt")]
+        evil_members.append(tarfile.TarInfo(str(root / "abs_escaped.txt")))
+        for kind, target in [
+            (tarfile.SYMTYPE, "../.."),
+            (tarfile.LNKTYPE, "/etc/passwd"),
+        ]:
+            link_info = tarfile.TarInfo("link")
+            link_info.type, link_info.linkname = kind, target
+            evil_members.append(link_info)
+        for idx, evil_info in enumerate(evil_members):
+            evil = _evil_tarball(root / f"evil{idx}.tar", evil_info)
+            try:
+                extract_tarball(evil, root / f"evil-out{idx}")
+                assert False, f"{evil_info.name} should be rejected."
+            except RUValueException:
+                pass
+        assert not (root / "escaped.txt").exists()
+        assert not (root / "abs_escaped.txt").exists()
+
+        # Test: A file and a symlink of the same name never write through
+        # the link, whichever comes first.
+        with tarfile.open(root / "collide.tar", "w") as collide_:
+            for name_, kind, content_ in [
+                ("victim.txt", tarfile.REGTYPE, b"safe"),
+                ("x", tarfile.REGTYPE, b"evil"),
+                ("x", tarfile.SYMTYPE, b""),
+                ("y", tarfile.SYMTYPE, b""),
+                ("y", tarfile.REGTYPE, b"evil"),
+            ]:
+                link_info = tarfile.TarInfo(name_)
+                link_info.type, link_info.size = kind, len(content_)
+                if kind == tarfile.SYMTYPE:
+                    link_info.linkname = "victim.txt"
+                collide_.addfile(link_info, io.BytesIO(content_))
+        for idx in range(20):
+            out = root / f"collide-out{idx}"
+            extract_tarball(root / "collide.tar", out)
+            assert (out / "victim.txt").read_bytes() == b"safe"
+            assert os.readlink(out / "x") == "victim.txt"
+            assert not (out / "y").is_symlink()
+            assert (out / "y").read_bytes() == b"evil"
+
+        # Test: Streamed members outside the destination are rejected.
+        evil = _evil_tarball(root / "evil-stream.tar", evil_members[0])
+        with evil.open("rb") as stream_:
+            try:
+                extract_tarball_stream(stream_, root / "evil-stream-out")
+                assert False, "The streamed '../' member should be rejected."
+            except RUValueException:
+                pass
+        assert not (root / "escaped.txt").exists()
@@ -0,0 +1,642 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Content-addressed download cache shared by all workspaces.
+Files are stored by their SHA-256 and indexed by URL. A cached URL is
+revalidated with a conditional request (ETag/Last-Modified) before reuse.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Callable, Iterator, Mapping
+
+import requests
+
+from rubisco.config import (COPY_BUFSIZE, DEFAULT_CHARSET,
+                            DOWNLOAD_CACHE_MAX_SIZE, TIMEOUT,
+                            USER_DOWNLOAD_CACHE_DIR)
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.l10n import _
+from rubisco.lib.log import logger
+from rubisco.lib.variable import format_str
+
+if os.name == "nt":
+    import msvcrt  # pylint: disable=import-error
+else:
+    import fcntl
+
+__all__ = [
+    "DownloadCache",
+    "download_cache",
+    "file_sha256",
+    "check_sha256",
+    "verify_sha256",
+]
+
+
+def file_sha256(path: Path) -> str:
+    """Get the SHA-256 of a file.
+
+    Args:
+        path (Path): The file path.
+
+    Returns:
+        str: The hex digest.
+    """
+
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        while buf := f.read(COPY_BUFSIZE):
+            hasher.update(buf)
+    return hasher.hexdigest()
+
+
+def check_sha256(digest: str, sha256: str, name: str) -> None:
+    """Check a SHA-256 digest.
+
+    Args:
+        digest (str): The actual SHA-256.
+        sha256 (str): The expected SHA-256.
+        name (str): The name of the data to show.
+
+    Raises:
+        RUValueException: If the SHA-256 mismatches.
+    """
+
+    if digest != sha256.lower():
+        raise RUValueException(
+            format_str(
+                _(
+                    "SHA-256 mismatch of '${{name}}': expected "
+                    "'${{expected}}', got '${{actual}}'."
+                ),
+                fmt={"name": name, "expected": sha256, "actual": digest},
+            ),
+        )
+
+
+def verify_sha256(path: Path, sha256: str, name: str) -> None:
+    """Verify the SHA-256 of a file.
+
+    Args:
+        path (Path): The file path.
+        sha256 (str): The expected SHA-256.
+        name (str): The name of the file to show.
+
+    Raises:
+        RUValueException: If the SHA-256 mismatches.
+    """
+
+    check_sha256(file_sha256(path), sha256, name)
+
+
+def _validators(headers: Mapping[str, str]) -> dict[str, str]:
+    """Get the cache validators of a response.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        dict[str, str]: The ETag and Last-Modified of the response.
+    """
+
+    res = {}
+    if headers.get("ETag"):
+        res["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        res["last_modified"] = headers["Last-Modified"]
+    return res
+
+
+class _FileLock:
+    """
+    An exclusive lock on a file, which works across processes. It is
+    released if the process exits. A process must not acquire it twice.
+    """
+
+    path: Path
+    _file: IO[bytes] | None
+
+    def __init__(self, path: Path) -> None:
+        """Create a file lock.
+
+        Args:
+            path (Path): The lock file. It is created if it does not exist.
+        """
+
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Acquire the lock.
+
+        Args:
+            blocking (bool, optional): Wait until the lock is free.
+                Defaults to True.
+
+        Returns:
+            bool: True if the lock is acquired. Always True if blocking.
+        """
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file = self.path.open("ab")  # pylint: disable=consider-using-with
+        try:
+            if os.name == "nt":
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(file.fileno(), mode, 1)
+            else:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB  # noqa: E501
+                fcntl.flock(file.fileno(), flags)
+        except OSError:
+            file.close()
+            if blocking:
+                raise
+            return False
+        self._file = file
+        return True
+
+    def release(self) -> None:
+        """Release the lock."""
+
+        file, self._file = self._file, None
+        if file is None:
+            return
+        if os.name == "nt":
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        file.close()
+
+
+class DownloadCache:
+    """
+    A size-bounded LRU cache of downloaded files.
+    The index and the objects are changed under a file lock, so concurrent
+    processes neither lose index entries nor remove the objects of each
+    other.
+    """
+
+    root: Path
+    max_size: int
+    _lock: threading.RLock
+    _lock_depth: int  # Nesting depth of `_locked()`.
+    _file_lock: _FileLock
+
+    def __init__(self, root: Path, max_size: int) -> None:
+        """Create a download cache.
+
+        Args:
+            root (Path): The cache directory.
+            max_size (int): The maximum total size of the cached files.
+        """
+
+        self.root = root
+        self.max_size = max_size
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._file_lock = _FileLock(root / "lock")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Lock the cache against the other threads and processes. It can be
+        nested.
+        """
+
+        with self._lock:
+            if not self._lock_depth:
+                self._file_lock.acquire()
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth:
+                    self._file_lock.release()
+
+    @property
+    def _index_file(self) -> Path:
+        return self.root / "index.json"
+
+    def _object(self, sha256: str) -> Path:
+        return self.root / "objects" / sha256[:2] / sha256
+
+    def _load_index(self) -> dict[str, dict]:
+        try:
+            with self._index_file.open("r", encoding=DEFAULT_CHARSET) as f:
+                index = json.load(f)
+            if isinstance(index, dict):
+                return index
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            logger.warning("Invalid download cache index.", exc_info=True)
+        return {}
+
+    def _save_index(self, index: dict[str, dict]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_file = self.root / f"index.{uuid.uuid4().hex}.tmp"
+        with temp_file.open("w", encoding=DEFAULT_CHARSET) as f:
+            json.dump(index, f)
+        os.replace(temp_file, self._index_file)
+
+    def new_temp_file(self) -> Path:
+        """Get a unique temporary file path in the cache directory. It can
+        be moved into the cache by `store()` without copying.
+
+        Returns:
+            Path: The temporary file path.
+        """
+
+        temp_dir = self.root / "tmp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return temp_dir / uuid.uuid4().hex
+
+    @contextmanager
+    def resumable_temp_file(self, key: str) -> Iterator[Path]:
+        """Get a temporary file path which is the same for the same key, so
+        an interrupted download can be resumed. The path is locked until the
+        context exits. If another thread or process holds it, a unique path
+        is used instead, and the files starting with its name are removed
+        at exit.
+
+        Args:
+            key (str): The resume key, e.g. the URL.
+
+        Yields:
+            Path: The temporary file path.
+        """
+
+        name = hashlib.sha256(key.encode(DEFAULT_CHARSET)).hexdigest()
+        slot = _FileLock(self.root / "tmp" / f"{name}.lock")
+        if slot.acquire(blocking=False):
+            try:
+                yield self.root / "tmp" / name
+            finally:
+                slot.release()
+            return
+
+        temp_file = self.new_temp_file()
+        try:
+            yield temp_file
+        finally:
+            for leftover in temp_file.parent.glob(f"{temp_file.name}*"):
+                leftover.unlink(missing_ok=True)
+
+    def _revalidate(self, url: str, entry: dict) -> bool:
+        """Check if the cached entry is still fresh.
+
+        Args:
+            url (str): The URL.
+            entry (dict): The index entry.
+
+        Returns:
+            bool: True if the server says it is not modified.
+        """
+
+        headers = {}
+        if "etag" in entry:
+            headers["If-None-Match"] = entry["etag"]
+        if "last_modified" in entry:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+
+        try:
+            with requests.head(
+                url,
+                headers=headers,
+                timeout=TIMEOUT,
+                allow_redirects=True,
+            ) as response:
+                if response.status_code == 304:
+                    return True
+                response.raise_for_status()
+                # Some servers ignore the conditional headers.
+                validators = _validators(response.headers)
+                return bool(validators) and all(
+                    entry.get(key) == value
+                    for key, value in validators.items()
+                )
+        except requests.RequestException:
+            logger.warning(
+                "Failed to revalidate '%s', using the cached file.",
+                url,
+                exc_info=True,
+            )
+            return True
+
+    def lookup(self, url: str, sha256: str | None = None) -> Path | None:
+        """Find a fresh cached file.
+
+        Args:
+            url (str): The URL.
+            sha256 (str | None, optional): The expected SHA-256. If it is
+                given, a file with this hash is used without revalidation.
+                Defaults to None.
+
+        Returns:
+            Path | None: The cached file. It must not be modified. None if
+                it is not cached or stale.
+        """
+
+        with self._locked():
+            index = self._load_index()
+        entry = index.get(url)
+        if sha256:
+            sha256 = sha256.lower()
+            if not self._object(sha256).is_file():
+                return None
+        elif entry is None or not self._object(entry["sha256"]).is_file():
+            return None
+        elif not self._revalidate(url, entry):
+            return None
+        else:
+            sha256 = entry["sha256"]
+
+        with self._locked():
+            index = self._load_index()
+            index.setdefault(url, {"sha256": sha256})["atime"] = time.time()
+            self._save_index(index)
+        logger.info("Download cache hit: '%s'", url)
+        return self._object(sha256)
+
+    def store(
+        self,
+        url: str,
+        file: Path,
+        headers: Mapping[str, str] | None = None,
+        sha256: str | None = None,
+    ) -> Path:
+        """Move a downloaded file into the cache.
+
+        Args:
+            url (str): The URL.
+            file (Path): The downloaded file. It will be moved.
+            headers (Mapping[str, str] | None, optional): The response
+                headers. Defaults to None.
+            sha256 (str | None, optional): The expected SHA-256. Defaults to
+                None.
+
+        Returns:
+            Path: The cached file. It must not be modified.
+
+        Raises:
+            RUValueException: If the SHA-256 mismatches.
+        """
+
+        if sha256:
+            try:
+                verify_sha256(file, sha256, url)
+            except RUValueException:
+                file.unlink()
+                raise
+        digest = file_sha256(file)
+
+        obj = self._object(digest)
+        with self._locked():  # `prune()` must not see it unindexed.
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(file, obj)
+            index = self._load_index()
+            index[url] = {
+                "sha256": digest,
+                "size": obj.stat().st_size,
+                "atime": time.time(),
+                **_validators(headers or {}),
+            }
+            self._save_index(index)
+            self.prune(keep=digest)
+
+        return obj
+
+    def fetch(
+        self,
+        url: str,
+        save_to: Path,
+        download: Callable[[str, Path], Mapping[str, str]],
+        sha256: str | None = None,
+    ) -> None:
+        """Get a file from the cache, or download it and cache it.
+
+        Args:
+            url (str): The URL.
+            save_to (Path): The path to save the file to.
+            download (Callable[[str, Path], Mapping[str, str]]): Download
+                the URL to the path and return the response headers.
+            sha256 (str | None, optional): The expected SHA-256. Defaults to
+                None.
+        """
+
+        cached = self.lookup(url, sha256)
+        if cached is None:
+            with self.resumable_temp_file(url) as temp_file:
+                try:
+                    headers = download(url, temp_file)
+                    cached = self.store(url, temp_file, headers, sha256)
+                finally:
+                    temp_file.unlink(missing_ok=True)
+        with self._locked():  # Do not let another process prune it.
+            shutil.copyfile(cached, save_to)
+
+    def entries(self) -> dict[str, dict]:
+        """Get all the index entries.
+
+        Returns:
+            dict[str, dict]: URL to entry.
+        """
+
+        with self._locked():
+            return self._load_index()
+
+    def size(self) -> int:
+        """Get the total size of the cached files.
+
+        Returns:
+            int: The size in bytes.
+        """
+
+        objects = self.root / "objects"
+        if not objects.is_dir():
+            return 0
+        return sum(
+            path.stat().st_size for path in objects.rglob("*")
+            if path.is_file()
+        )
+
+    def prune(
+        self,
+        max_size: int | None = None,
+        keep: str | None = None,
+    ) -> int:
+        """Remove the least recently used files until the total size is not
+        greater than `max_size`. Unindexed files are always removed.
+
+        Args:
+            max_size (int | None, optional): The size limit. Defaults to
+                None, which means `self.max_size`.
+            keep (str | None, optional): The SHA-256 not to remove. Defaults
+                to None.
+
+        Returns:
+            int: The number of bytes removed.
+        """
+
+        max_size = self.max_size if max_size is None else max_size
+        removed = 0
+        with self._locked():
+            index = self._load_index()
+            atimes: dict[str, float] = {}
+            for entry in index.values():
+                atimes[entry["sha256"]] = max(
+                    atimes.get(entry["sha256"], 0),
+                    entry.get("atime", 0),
+                )
+
+            objects: list[tuple[float, Path]] = []
+            total = 0
+            if (self.root / "objects").is_dir():
+                for path in (self.root / "objects").rglob("*"):
+                    if not path.is_file():
+                        continue
+                    size = path.stat().st_size
+                    if path.name not in atimes:
+                        path.unlink()
+                        removed += size
+                        continue
+                    objects.append((atimes[path.name], path))
+                    total += size
+
+            for _atime, path in sorted(objects):
+                if total <= max_size:
+                    break
+                if path.name == keep:
+                    continue
+                size = path.stat().st_size
+                path.unlink()
+                total -= size
+                removed += size
+                index = {
+                    url: entry
+                    for url, entry in index.items()
+                    if entry["sha256"] != path.name
+                }
+            if removed:
+                self._save_index(index)
+
+        return removed
+
+    def clear(self) -> None:
+        """Remove all the cached files."""
+
+        with self._locked():
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+# The user's download cache.
+download_cache = DownloadCache(
+    USER_DOWNLOAD_CACHE_DIR,
+    DOWNLOAD_CACHE_MAX_SIZE,
+)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    with tempfile.TemporaryDirectory() as temp:
+        root_dir = Path(temp)
+        cache = DownloadCache(root_dir / "cache", 500)
+        downloads: list[str] = []
+
+        def _download(url: str, path: Path) -> dict[str, str]:
+            downloads.append(url)
+            path.write_bytes(url.encode(DEFAULT_CHARSET) * 100)
+            return {}
+
+        # Test: Expected SHA-256 hits without revalidation.
+        data = b"a" * 100
+        sha = hashlib.sha256(data).hexdigest()
+        cache.fetch("a", root_dir / "a1", _download, sha)
+        cache.fetch("a", root_dir / "a2", _download, sha)
+        assert downloads == ["a"]
+        assert (root_dir / "a2").read_bytes() == data
+
+        # Test: SHA-256 mismatch.
+        try:
+            cache.fetch(
+                "b",
+                root_dir / "b",
+                _download,
+                hashlib.sha256(b"x").hexdigest(),
+            )
+            raise AssertionError("SHA-256 mismatch is not detected.")
+        except RUValueException:
+            pass
+
+        # Test: No validator, so it is downloaded again.
+        cache.fetch("c", root_dir / "c", _download)
+        cache.fetch("c", root_dir / "c", _download)
+        assert downloads == ["a", "b", "c", "c"]
+
+        # Test: LRU eviction.
+        for name_ in ["dd", "ee", "ff", "gg"]:
+            cache.fetch(name_, root_dir / name_, _download)
+        assert cache.size() <= 500
+        assert "a" not in cache.entries()
+        assert "gg" in cache.entries()
+
+        # Test: Concurrent downloads of one URL use different temp files.
+        temp_files: list[Path] = []
+        started = threading.Barrier(2)
+
+        def _slow_download(url: str, path: Path) -> dict[str, str]:
+            temp_files.append(path)
+            started.wait(5)
+            path.write_bytes(url.encode(DEFAULT_CHARSET) * 100)
+            return {}
+
+        threads_ = [
+            threading.Thread(
+                target=cache.fetch,
+                args=("hh", root_dir / f"hh{i}", _slow_download),
+            )
+            for i in range(2)
+        ]
+        for thread_ in threads_:
+            thread_.start()
+        for thread_ in threads_:
+            thread_.join()
+        assert len(set(temp_files)) == 2
+        assert (root_dir / "hh0").read_bytes() == (root_dir / "hh1").read_bytes()  # noqa: E501
+        assert all(
+            path.suffix == ".lock" for path in (cache.root / "tmp").iterdir()
+        )
+
+        cache.clear()
+        assert cache.size() == 0
@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+GNU make jobserver.
+Rubisco, make and the other jobserver clients started by rubisco share one
+set of job tokens. Every process owns an implicit token, and reads another
+token from the jobserver for every extra job it runs.
+Only the POSIX jobserver (a pipe or a fifo) is supported.
+The processes run by rubisco take a slot of `job_slots`, which takes its
+tokens from the jobserver.
+"""
+
+import os
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from rubisco.lib.log import logger
+from rubisco.lib.variable import get_variable
+
+if TYPE_CHECKING:
+    import asyncio
+
+__all__ = ["JobServer", "setup_jobserver", "JobSlots", "job_slots"]
+
+_AUTH_PATTERN = re.compile(r"--jobserver-(?:auth|fds)=(\S+)")
+_JOBS_PATTERN = re.compile(r"^-j\d*$")
+
+
+class JobServer:
+    """A jobserver of GNU make."""
+
+    read_fd: int
+    write_fd: int
+    owned: bool  # Created by this process.
+    pass_fds: tuple[int, ...]  # Descriptors the children must inherit.
+    makeflags: str | None  # MAKEFLAGS of the children. None to inherit.
+
+    def __init__(
+        self,
+        read_fd: int,
+        write_fd: int,
+        owned: bool,
+        pass_fds: tuple[int, ...] = (),
+        makeflags: str | None = None,
+    ) -> None:
+        """Create a jobserver from its descriptors.
+
+        Args:
+            read_fd (int): The descriptor to read tokens from.
+            write_fd (int): The descriptor to write tokens back to.
+            owned (bool): If the jobserver is created by this process.
+            pass_fds (tuple[int, ...], optional): The descriptors the
+                children must inherit. Empty for a fifo. Defaults to ().
+            makeflags (str | None, optional): The MAKEFLAGS which exports
+                the jobserver to the children. Defaults to None, which means
+                the MAKEFLAGS of this process.
+        """
+
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+        self.owned = owned
+        self.pass_fds = pass_fds
+        self.makeflags = makeflags
+
+    @classmethod
+    def create(cls, jobs: int) -> "JobServer":
+        """Create a jobserver with `jobs - 1` tokens. It is exported to the
+        children by the MAKEFLAGS of `environ()`. The environment of this
+        process is not changed, because only the children started with
+        `pass_fds` can use the descriptors.
+
+        Args:
+            jobs (int): The number of jobs, including the implicit one.
+
+        Returns:
+            JobServer: The jobserver.
+        """
+
+        read_fd, write_fd = os.pipe()
+        os.set_inheritable(read_fd, True)
+        os.set_inheritable(write_fd, True)
+        if jobs > 1:
+            os.write(write_fd, b"+" * (jobs - 1))
+
+        flags = [
+            flag
+            for flag in os.environ.get("MAKEFLAGS", "").split()
+            if not _AUTH_PATTERN.match(flag) and not _JOBS_PATTERN.match(flag)
+        ]
+        flags += [f"-j{jobs}", f"--jobserver-auth={read_fd},{write_fd}"]
+        logger.info(
+            "Created jobserver %d,%d for %d jobs.",
+            read_fd,
+            write_fd,
+            jobs,
+        )
+
+        return cls(
+            read_fd,
+            write_fd,
+            True,
+            (read_fd, write_fd),
+            " ".join(flags),
+        )
+
+    @classmethod
+    def from_environ(cls) -> "JobServer | None":
+        """Connect to the jobserver in MAKEFLAGS. It is inherited from make.
+
+        Returns:
+            JobServer | None: The jobserver. None if there is no usable
+                jobserver.
+        """
+
+        matches = _AUTH_PATTERN.findall(os.environ.get("MAKEFLAGS", ""))
+        if not matches:
+            return None
+        auth = matches[-1]
+
+        try:
+            if auth.startswith("fifo:"):
+                fifo_fd = os.open(auth[5:], os.O_RDWR)
+                return cls(fifo_fd, fifo_fd, False)
+            read_fd, write_fd = (int(fd) for fd in auth.split(","))
+            os.fstat(read_fd)
+            os.fstat(write_fd)
+        except (OSError, ValueError):
+            logger.warning(
+                "Jobserver '%s' is unavailable. Did make run rubisco "
+                "without '+'?",
+                auth,
+            )
+            return None
+        logger.info("Using the inherited jobserver '%s'.", auth)
+        return cls(read_fd, write_fd, False, (read_fd, write_fd))
+
+    def environ(self) -> dict[str, str] | None:
+        """Get the environment of the children.
+
+        Returns:
+            dict[str, str] | None: The environment with the MAKEFLAGS of
+                this jobserver. None if the children inherit the
+                environment of this process.
+        """
+
+        if self.makeflags is None:
+            return None
+        return {**os.environ, "MAKEFLAGS": self.makeflags}
+
+    def acquire_token(self) -> bytes:
+        """Take a token from the jobserver. Block until one is available.
+
+        Returns:
+            bytes: The token. It must be released by `release_token()`.
+        """
+
+        return os.read(self.read_fd, 1)
+
+    def release_token(self, token: bytes) -> None:
+        """Give a token back to the jobserver.
+
+        Args:
+            token (bytes): The token taken by `acquire_token()`.
+        """
+
+        os.write(self.write_fd, token)
+
+
+def setup_jobserver(jobs: int) -> JobServer | None:
+    """Use the inherited jobserver, or create a new one.
+
+    Args:
+        jobs (int): The number of jobs of a new jobserver.
+
+    Returns:
+        JobServer | None: The jobserver. None on Windows.
+    """
+
+    if os.name == "nt":
+        return None
+    return JobServer.from_environ() or JobServer.create(jobs)
+
+
+class JobSlots:  # pylint: disable=too-many-instance-attributes
+    """
+    A counting semaphore which limits the running processes. It can be
+    acquired by threads and coroutines.
+    If a jobserver is used, every slot except the first one also takes a
+    token from the jobserver, so the slots are shared with make.
+    """
+
+    jobserver: JobServer | None
+    _pending_jobserver: bool  # Set up a jobserver on the first acquire.
+    _size: int | None
+    _used: int
+    _cond: threading.Condition
+    _async_waiters: "list[tuple[asyncio.AbstractEventLoop, asyncio.Future]]"
+    _implicit_free: bool  # The implicit jobserver token is not used.
+    _tokens: list[bytes]  # Tokens taken from the jobserver.
+
+    def __init__(self, size: int | None = None) -> None:
+        """Create job slots.
+
+        Args:
+            size (int | None, optional): The number of slots. Defaults to
+                None, which means the `nproc` variable when it is first
+                acquired.
+        """
+
+        self.jobserver = None
+        self._pending_jobserver = False
+        self._size = size
+        self._used = 0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self._implicit_free = True
+        self._tokens = []
+
+    @property
+    def size(self) -> int:
+        """The number of slots.
+
+        Returns:
+            int: The number of slots.
+        """
+
+        if self._size is None:
+            self._size = max(int(get_variable("nproc") or 1), 1)
+        return self._size
+
+    def resize(self, size: int) -> None:
+        """Change the number of slots. The running jobs are not affected.
+
+        Args:
+            size (int): The number of slots.
+        """
+
+        with self._cond:
+            self._size = max(size, 1)
+            self._wake_all()
+
+    def use_jobserver(self, jobserver: JobServer | None) -> None:
+        """Share the slots with a jobserver. It must be called when no slot
+        is acquired.
+
+        Args:
+            jobserver (JobServer | None): The jobserver. None to stop using
+                it.
+        """
+
+        self._pending_jobserver = False
+        self.jobserver = jobserver
+
+    def enable_jobserver(self) -> None:
+        """Share the slots with a jobserver, which is set up when the first
+        slot is acquired. So no jobserver is created if no process is run.
+        """
+
+        self._pending_jobserver = True
+
+    def _setup_pending_jobserver(self) -> None:
+        with self._cond:
+            if self._pending_jobserver:
+                self._pending_jobserver = False
+                self.jobserver = setup_jobserver(self.size)
+
+    @property
+    def pass_fds(self) -> tuple[int, ...]:
+        """The descriptors the child processes must inherit.
+
+        Returns:
+            tuple[int, ...]: The descriptors of the jobserver.
+        """
+
+        return self.jobserver.pass_fds if self.jobserver else ()
+
+    @property
+    def child_env(self) -> dict[str, str] | None:
+        """The environment of the child processes.
+
+        Returns:
+            dict[str, str] | None: The environment which exports the
+                jobserver. None to inherit the environment of this process.
+        """
+
+        return self.jobserver.environ() if self.jobserver else None
+
+    def _take_implicit_token(self) -> bool:
+        with self._cond:
+            if self._implicit_free:
+                self._implicit_free = False
+                return True
+            return False
+
+    def _release_token(self) -> None:
+        if self.jobserver is None:
+            return
+        with self._cond:
+            if not self._tokens:
+                self._implicit_free = True
+                return
+            token = self._tokens.pop()
+        self.jobserver.release_token(token)
+
+    async def _acquire_token_async(self, jobserver: JobServer) -> bytes:
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _deliver(token: bytes) -> None:
+            if future.cancelled():
+                jobserver.release_token(token)
+            else:
+                future.set_result(token)
+
+        def _read() -> None:  # Reading the pipe blocks.
+            token = jobserver.acquire_token()
+            try:
+                loop.call_soon_threadsafe(_deliver, token)
+            except RuntimeError:  # The loop is closed.
+                jobserver.release_token(token)
+
+        threading.Thread(target=_read, name="jobserver", daemon=True).start()
+        return await future
+
+    def _wake_all(self) -> None:
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_set_future_done, future)
+
+    def acquire(self) -> None:
+        """Acquire a slot. Block until one is free."""
+
+        self._setup_pending_jobserver()
+        with self._cond:
+            while self._used >= self.size:
+                self._cond.wait()
+            self._used += 1
+
+        jobserver = self.jobserver
+        if jobserver is None or self._take_implicit_token():
+            return
+        try:
+            token = jobserver.acquire_token()
+        except BaseException:
+            self._release_slot()
+            raise
+        with self._cond:
+            self._tokens.append(token)
+
+    async def acquire_async(self) -> None:
+        """Acquire a slot without blocking the event loop."""
+
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        self._setup_pending_jobserver()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._used < self.size:
+                    self._used += 1
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            await future
+
+        jobserver = self.jobserver
+        if jobserver is None or self._take_implicit_token():
+            return
+        try:
+            token = await self._acquire_token_async(jobserver)
+        except BaseException:
+            self._release_slot()
+            raise
+        with self._cond:
+            self._tokens.append(token)
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._used -= 1
+            self._wake_all()
+
+    def release(self) -> None:
+        """Release a slot."""
+
+        self._release_token()
+        self._release_slot()
+
+    def __enter__(self) -> "JobSlots":
+        self.acquire()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+def _set_future_done(future: "asyncio.Future") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# The job slots of the workspace. All processes started by `Process` take
+# a slot while they are running.
+job_slots = JobSlots()
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    os.environ["MAKEFLAGS"] = "k -j2 --jobserver-auth=98,99"
+    assert JobServer.from_environ() is None  # Not inherited.
+
+    server = setup_jobserver(3)
+    assert server is not None and server.owned
+    assert server.makeflags == (
+        f"k -j3 --jobserver-auth={server.read_fd},{server.write_fd}"
+    )
+    assert os.environ["MAKEFLAGS"] == "k -j2 --jobserver-auth=98,99"
+    assert server.environ()["MAKEFLAGS"] == server.makeflags
+    tokens = [server.acquire_token(), server.acquire_token()]
+    assert tokens == [b"+", b"+"]
+    for token_ in tokens:
+        server.release_token(token_)
+
+    # Test: A child connects to the inherited jobserver.
+    child = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from rubisco.lib.jobserver import JobServer\n"
+            "server = JobServer.from_environ()\n"
+            "assert server is not None and not server.owned\n"
+            "token = server.acquire_token()\n"
+            "server.release_token(token)\n"
+            "print(token.decode())\n",
+        ],
+        pass_fds=server.pass_fds,
+        env=server.environ(),
+        capture_output=True,
+        check=True,
+    )
+    assert child.stdout.strip() == b"+", child
+
+    # Test: A fifo jobserver.
+    with tempfile.TemporaryDirectory() as temp:
+        fifo = os.path.join(temp, "fifo")
+        os.mkfifo(fifo)
+        os.environ["MAKEFLAGS"] = f"-j2 --jobserver-auth=fifo:{fifo}"
+        fifo_server = JobServer.from_environ()
+        assert fifo_server is not None and not fifo_server.pass_fds
+        fifo_server.release_token(b"x")
+        assert fifo_server.acquire_token() == b"x"
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+JSON5 file loader.
+Most configuration files are plain JSON. They are parsed by the standard
+library, and the (slow to import) JSON5 parser is only used for the others.
+"""
+
+import json
+from typing import IO, Any
+
+__all__ = ["load_json5", "loads_json5"]
+
+
+def loads_json5(text: str) -> Any:
+    """Parse a JSON5 document.
+
+    Args:
+        text (str): The document.
+
+    Returns:
+        Any: The parsed object.
+
+    Raises:
+        ValueError: If the document is not a valid JSON5 document.
+    """
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        import json5  # pylint: disable=import-outside-toplevel
+
+        return json5.loads(text)
+
+
+def load_json5(file: IO[str]) -> Any:
+    """Parse a JSON5 file.
+
+    Args:
+        file (IO[str]): The opened file.
+
+    Returns:
+        Any: The parsed object.
+
+    Raises:
+        ValueError: If the file is not a valid JSON5 document.
+    """
+
+    return loads_json5(file.read())
+
+
+if __name__ == "__main__":
+    import sys
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    # Test: Plain JSON does not need the JSON5 parser.
+    assert loads_json5('{"a": [1, 2.5, null]}') == {"a": [1, 2.5, None]}
+    assert "json5" not in sys.modules
+
+    # Test: JSON5 features.
+    assert loads_json5("{a: 'b', // Comment.\n c: [1,],}") == {
+        "a": "b",
+        "c": [1],
+    }
+
+    # Test: Invalid document.
+    try:
+        loads_json5("{a: }")
+        assert False, "Should raise ValueError."
+    except ValueError:
+        pass
@@ -24,17 +24,54 @@ Load module from path dynamically. To perfect fking Python import system.
 
 
 import importlib.util
+import sys
+import zipimport
 from pathlib import Path
 from types import ModuleType
 
-__all__ = ["import_module_from_path"]
+__all__ = ["BUNDLE_SUFFIX", "import_module_from_path"]
+
+# A bundle is a zip file which contains a precompiled package named as the
+# bundle's stem. e.g. 'foo.rbz' contains 'foo/__init__.pyc'.
+BUNDLE_SUFFIX = ".rbz"
+
+
+def _import_module_from_bundle(path: Path) -> ModuleType:
+    """Load the package in a bundle.
+
+    Args:
+        path (Path): Path to the bundle.
+
+    Returns:
+        ModuleType: Module object.
+
+    Raises:
+        ImportError: If the module cannot be loaded.
+    """
+
+    name = path.stem
+    try:
+        spec = zipimport.zipimporter(str(path)).find_spec(name)
+    except zipimport.ZipImportError as exc:
+        raise ImportError(path) from exc
+    if spec is None:
+        raise ImportError(path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # Submodules of the package need it.
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        sys.modules.pop(name, None)
+        raise
+
+    return module
 
 
 def import_module_from_path(path: Path) -> ModuleType:
     """Load module from path.
 
     Args:
-        path (Path): Path to module.
+        path (Path): Path to module. It can be a bundle.
 
     Returns:
         ModuleType: Module object.
@@ -45,6 +82,9 @@ def import_module_from_path(path: Path) -> ModuleType:
         ImportError: If the module cannot be loaded.
     """
 
+    if path.suffix == BUNDLE_SUFFIX and path.is_file():
+        return _import_module_from_bundle(path)
+
     if path.is_dir():
         path = path / "__init__.py"
 
@@ -22,20 +22,48 @@
 Rubisco process control.
 """
 
+import codecs
 import os
+import signal
+import subprocess
 import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from subprocess import PIPE, STDOUT, Popen
+from subprocess import DEVNULL, PIPE, STDOUT, Popen
+from typing import IO, TYPE_CHECKING, BinaryIO, Callable, TypeVar
 
-from rubisco.config import DEFAULT_CHARSET
+from rubisco.config import (COPY_BUFSIZE, DEFAULT_CHARSET,
+                            INLINE_SCRIPT_LIMIT, POPEN_CAPTURE_LIMIT,
+                            PROCESS_TERMINATE_TIMEOUT)
 from rubisco.lib.command import command
 from rubisco.lib.exceptions import RUShellExecutionException
 from rubisco.lib.fileutil import TemporaryObject
+from rubisco.lib.jobserver import JobSlots, job_slots
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
+from rubisco.lib.tracing import span
 from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
-__all__ = ["Process", "popen"]
+# asyncio is imported by the functions which use it. It is slow to import,
+# and most commands do not run processes concurrently.
+if TYPE_CHECKING:
+    import asyncio
+
+__all__ = [
+    "Process",
+    "JobSlots",
+    "job_slots",
+    "ProcessUsage",
+    "OutputCapture",
+    "PopenResult",
+    "popen",
+    "popen_capture",
+    "run_processes",
+]
+
+T = TypeVar("T")
 
 
 def get_system_shell() -> str:
@@ -50,6 +78,261 @@ def get_system_shell() -> str:
     return os.environ.get("SHELL", "/bin/sh")
 
 
+def _popen_args(
+    cmd: list[str] | str,
+) -> tuple[list[str] | str, bool, TemporaryObject | None]:
+    """Get the Popen arguments of a command.
+    A list is an argument vector, and it is executed directly. A single
+    line string is run by the shell of Popen. A multiline script is passed
+    to the system shell by "-c" without touching the disk. It is written to
+    a temporary file only if it is too long to be an argument, or on
+    Windows, where cmd.exe does not run multiline commands.
+
+    Args:
+        cmd (list[str] | str): The command.
+
+    Returns:
+        tuple[list[str] | str, bool, TemporaryObject | None]: The `args`
+            and `shell` of Popen, and the temporary script file which must
+            live until the process is finished.
+    """
+
+    if isinstance(cmd, list):
+        return list(cmd), False, None
+    if "\n" not in cmd:
+        return cmd, True, None
+
+    shell = get_system_shell()
+    if os.name != "nt" and len(cmd.encode()) <= INLINE_SCRIPT_LIMIT:
+        return [shell, "-c", cmd], False, None
+    temp = TemporaryObject.new_file(suffix=".bat")
+    temp.path.write_text(f"{cmd}\n", encoding=DEFAULT_CHARSET)
+    temp.path.chmod(0o755)
+    if os.name == "nt":
+        return [shell, "/c", str(temp.path)], False, temp
+    return [shell, str(temp.path)], False, temp
+
+
+# Serialize the prefixed output lines of the concurrent processes.
+_output_lock = threading.Lock()
+
+
+# Unreaped children can be inspected in /proc on Linux.
+_HAS_PROC_IO = os.path.exists("/proc/self/io")
+
+
+@dataclass
+class ProcessUsage:  # pylint: disable=too-many-instance-attributes
+    """The resources used by a process and its waited children.
+    Times are in seconds and sizes are in bytes. The values which are not
+    available on this platform are None.
+    """
+
+    wall: float
+    user: float | None = None
+    system: float | None = None
+    max_rss: int | None = None  # Linux counts the RSS inherited by fork.
+    read_bytes: int | None = None  # Read from the storage.
+    write_bytes: int | None = None  # Written to the storage.
+    read_chars: int | None = None  # Read by syscalls, including pipes.
+    write_chars: int | None = None  # Written by syscalls, including pipes.
+
+    @property
+    def cpu(self) -> float:
+        """The user and system CPU time.
+
+        Returns:
+            float: The CPU time. 0 if it is not available.
+        """
+
+        return (self.user or 0) + (self.system or 0)
+
+    def as_dict(self) -> dict[str, float | int]:
+        """Get the available values. The keys are the variable names.
+
+        Returns:
+            dict[str, float | int]: The values.
+        """
+
+        return {
+            key.replace("_", "-"): val
+            for key, val in asdict(self).items()
+            if val is not None
+        }
+
+    @classmethod
+    def total(cls, usages: "list[ProcessUsage]") -> "ProcessUsage":
+        """Sum up the usage of processes. The wall time and the max RSS are
+        the maximums, because the processes may run concurrently.
+
+        Args:
+            usages (list[ProcessUsage]): The usages.
+
+        Returns:
+            ProcessUsage: The total usage.
+        """
+
+        def _sum(name: str) -> int | float | None:
+            values = [getattr(usage, name) for usage in usages]
+            if any(val is None for val in values):
+                return None
+            return sum(values)
+
+        return cls(
+            max((usage.wall for usage in usages), default=0.0),
+            _sum("user"),
+            _sum("system"),
+            max((usage.max_rss or 0 for usage in usages), default=0) or None,
+            _sum("read_bytes"),
+            _sum("write_bytes"),
+            _sum("read_chars"),
+            _sum("write_chars"),
+        )
+
+
+def _read_proc_io(pid: int) -> dict[str, int]:
+    """Read the I/O counters of a process from /proc.
+
+    Args:
+        pid (int): The process ID.
+
+    Returns:
+        dict[str, int]: The counters. Empty if they are not readable.
+    """
+
+    try:
+        with open(f"/proc/{pid}/io", encoding=DEFAULT_CHARSET) as f:
+            return {
+                key: int(val)
+                for key, _sep, val in (line.partition(":") for line in f)
+            }
+    except (OSError, ValueError):
+        return {}
+
+
+def _wait_usage(process: Popen, start: float) -> ProcessUsage:
+    """Wait for a process, and collect its resource usage. It sets the
+    return code of the process.
+
+    Args:
+        process (Popen): The process.
+        start (float): The `time.monotonic()` when it was started.
+
+    Returns:
+        ProcessUsage: The resource usage.
+    """
+
+    if not hasattr(os, "wait4"):  # Windows.
+        process.wait()
+        return ProcessUsage(time.monotonic() - start)
+
+    counters: dict[str, int] = {}
+    if _HAS_PROC_IO:
+        # Wait without reaping, so its /proc entry is still there.
+        os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        counters = _read_proc_io(process.pid)
+    _pid, status, rusage = os.wait4(process.pid, 0)
+    wall = time.monotonic() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in bytes on macOS, and in KiB on the others.
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return ProcessUsage(
+        wall,
+        rusage.ru_utime,
+        rusage.ru_stime,
+        rusage.ru_maxrss * rss_unit,
+        counters.get("read_bytes", rusage.ru_inblock * 512),
+        counters.get("write_bytes", rusage.ru_oublock * 512),
+        counters.get("rchar"),
+        counters.get("wchar"),
+    )
+
+
+def _write_prefixed(prefix: str, line: str) -> None:
+    with _output_lock:
+        sys.stdout.write(f"{prefix}{line}\n")
+        sys.stdout.flush()
+
+
+def _thread_future(func: Callable[[], T]) -> "asyncio.Future[T]":
+    """Call a blocking function in a new thread.
+
+    Args:
+        func (Callable[[], T]): The function.
+
+    Returns:
+        asyncio.Future[T]: Its result in the running event loop.
+    """
+
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    loop = asyncio.get_running_loop()
+    future: asyncio.Future[T] = loop.create_future()
+
+    def _deliver(result: T | None, exc: BaseException | None) -> None:
+        if future.cancelled():
+            return
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)  # type: ignore[arg-type]
+
+    def _target() -> None:
+        try:
+            result, exc = func(), None
+        except BaseException as err:  # pylint: disable=broad-exception-caught
+            result, exc = None, err
+        try:
+            loop.call_soon_threadsafe(_deliver, result, exc)
+        except RuntimeError:  # The loop is closed.
+            pass
+
+    threading.Thread(target=_target, name="process-wait", daemon=True).start()
+    return future
+
+
+async def _terminate_group(
+    process: Popen,
+    waiter: "asyncio.Future",
+) -> None:
+    """Terminate a process and its children, then wait for it.
+
+    Args:
+        process (Popen): A process which is the leader of its process group.
+        waiter (asyncio.Future): The future which is done when the process
+            is reaped.
+    """
+
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    if waiter.done():
+        return
+    try:
+        if os.name == "nt":
+            # Only exists on Windows.
+            process.send_signal(getattr(signal, "CTRL_BREAK_EVENT"))
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+        await asyncio.wait_for(
+            asyncio.shield(waiter),
+            PROCESS_TERMINATE_TIMEOUT,
+        )
+        return
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        logger.warning("Process %d is not terminated, killing.", process.pid)
+        try:
+            if os.name == "nt":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    await asyncio.gather(waiter, return_exceptions=True)
+
+
 class Process:
     """
     Process controler. Process's stdin/stdout/stderr will be direct to
@@ -58,9 +341,11 @@ class Process:
     """
 
     origin_cmd: str  # For UCI's output.
-    cmd: str
+    cmd: list[str] | str
+    shell: bool
     cwd: Path
     process: Popen
+    usage: ProcessUsage | None  # Collected when the process is finished.
     _tempfile: TemporaryObject | None
 
     def __init__(
@@ -68,19 +353,10 @@ class Process:
         cmd: list[str] | str,
         cwd: Path = Path.cwd(),
     ) -> None:
-        if isinstance(cmd, str) and "\n" in cmd:
-            self._tempfile = TemporaryObject.new_file(suffix=".bat")
-            self._tempfile.path.write_text(
-                f"{cmd}\n",
-                encoding=DEFAULT_CHARSET,
-            )
-            self._tempfile.path.chmod(0o755)
-            self.cmd = command([get_system_shell(), str(self._tempfile.path)])
-        else:
-            self.cmd = command(cmd)
-            self._tempfile = None
+        self.cmd, self.shell, self._tempfile = _popen_args(cmd)
         self.origin_cmd = command(cmd)
         self.cwd = cwd
+        self.usage = None
 
     def run(self, fail_on_error: bool = True) -> int:
         """Run the process.
@@ -93,27 +369,119 @@ class Process:
         """
 
         call_ktrigger(IKernelTrigger.pre_exec_process, proc=self)
-        with Popen(
-            self.cmd,
-            shell=True,
-            cwd=str(self.cwd),
-            stdin=sys.stdin,
-            stdout=sys.stdout,
-            stderr=sys.stderr,
-        ) as self.process:
-            ret = self.process.wait()
-            raise_exc = ret != 0 and fail_on_error
-            call_ktrigger(
-                IKernelTrigger.post_exec_process,
-                proc=self,
-                retcode=ret,
-                raise_exc=raise_exc,
+        with job_slots, span(
+            self.origin_cmd,
+            "process",
+            cwd=self.cwd,
+        ) as span_args:
+            start = time.monotonic()
+            with Popen(
+                self.cmd,
+                shell=self.shell,
+                cwd=str(self.cwd),
+                stdin=sys.stdin,
+                stdout=sys.stdout,
+                stderr=sys.stderr,
+                pass_fds=job_slots.pass_fds,
+                env=job_slots.child_env,
+            ) as self.process:
+                self.usage = _wait_usage(self.process, start)
+            ret = self.process.returncode
+            span_args["retcode"] = ret
+        return self._finish(ret, self.usage, fail_on_error)
+
+    async def run_async(
+        self,
+        fail_on_error: bool = True,
+        prefix: str | None = None,
+    ) -> int:
+        """Run the process in the event loop. It waits for a job slot first.
+        The process is started in a new process group, which is terminated
+        if the coroutine is cancelled.
+
+        Args:
+            fail_on_error (bool): Raise exception on error.
+            prefix (str | None, optional): Prefix every output line with it,
+                so the outputs of concurrent processes can be told apart.
+                stderr is merged into stdout. Defaults to None, which means
+                the output is not captured.
+
+        Returns:
+            int: The return code.
+        """
+
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        if os.name == "nt":
+            group: dict = {
+                "creationflags": subprocess.CREATE_NEW_PROCESS_GROUP,
+            }
+        else:
+            group = {"start_new_session": True}
+
+        await job_slots.acquire_async()
+        try:
+            call_ktrigger(IKernelTrigger.pre_exec_process, proc=self)
+            start = time.monotonic()
+            process = Popen(  # pylint: disable=consider-using-with
+                self.cmd,
+                shell=self.shell,
+                cwd=str(self.cwd),
+                stdin=DEVNULL if prefix is not None else None,
+                stdout=PIPE if prefix is not None else None,
+                stderr=STDOUT if prefix is not None else None,
+                pass_fds=job_slots.pass_fds,
+                env=job_slots.child_env,
+                **group,
             )
-            if raise_exc:
-                raise RUShellExecutionException(
-                    _("Shell execution error."), retcode=ret
-                )
-            return ret
+            self.process = process
+
+            def _wait() -> ProcessUsage:
+                # The child is reaped here instead of by the event loop, so
+                # its resource usage can be collected.
+                if process.stdout is not None:
+                    _drain(
+                        process.stdout,  # type: ignore[arg-type]
+                        "stdout",
+                        None,
+                        lambda _stream, line: _write_prefixed(
+                            prefix or "",
+                            line,
+                        ),
+                    )
+                return _wait_usage(process, start)
+
+            waiter = _thread_future(_wait)
+            try:
+                usage = await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                await _terminate_group(process, waiter)
+                raise
+        finally:
+            job_slots.release()
+
+        self.usage = usage
+        return self._finish(process.returncode, usage, fail_on_error)
+
+    def _finish(
+        self,
+        ret: int,
+        usage: ProcessUsage,
+        fail_on_error: bool,
+    ) -> int:
+        raise_exc = ret != 0 and fail_on_error
+        call_ktrigger(
+            IKernelTrigger.post_exec_process,
+            proc=self,
+            retcode=ret,
+            raise_exc=raise_exc,
+            usage=usage,
+        )
+        if raise_exc:
+            raise RUShellExecutionException(
+                _("Shell execution error."), retcode=ret
+            )
+        return ret
 
     def terminate(self) -> None:
         """Terminate the process."""
@@ -128,9 +496,211 @@ class Process:
             str: The string representation.
         """
 
-        if self._tempfile:
-            return f"Process({repr(self.origin_cmd)})"
-        return f"Process({repr(self.cmd)})"
+        return f"Process({repr(self.origin_cmd)})"
+
+
+class OutputCapture:
+    """Capture an output stream in memory. If it is larger than the limit,
+    the whole output is spilled to a temporary file, and only its head is
+    kept in memory.
+    """
+
+    limit: int
+    size: int
+    file: Path | None
+    _buffer: bytearray
+    _spill: IO[bytes] | None
+
+    def __init__(self, limit: int = POPEN_CAPTURE_LIMIT) -> None:
+        """Create an output capture.
+
+        Args:
+            limit (int, optional): The in-memory capture limit in bytes.
+                Defaults to `POPEN_CAPTURE_LIMIT`.
+        """
+
+        self.limit = limit
+        self.size = 0
+        self.file = None
+        self._buffer = bytearray()
+        self._spill = None
+
+    def write(self, data: bytes) -> None:
+        """Append a chunk of the output.
+
+        Args:
+            data (bytes): The chunk.
+        """
+
+        if self._spill is None and self.size + len(data) > self.limit:
+            self.file = TemporaryObject.new_file(suffix=".out").path
+            self._spill = open(  # pylint: disable=consider-using-with
+                self.file,
+                "wb",
+            )
+            self._spill.write(self._buffer)
+        if self._spill is not None:
+            self._spill.write(data)
+        if self.size < self.limit:
+            self._buffer += data[: self.limit - self.size]
+        self.size += len(data)
+
+    def close(self) -> None:
+        """Close the spilled file."""
+
+        if self._spill is not None:
+            self._spill.close()
+
+    def text(self) -> str:
+        """Get the captured output in memory.
+
+        Returns:
+            str: The decoded output. It is truncated to the limit if the
+                output is spilled.
+        """
+
+        return self._buffer.decode(DEFAULT_CHARSET, "replace")
+
+
+def _drain(
+    pipe: BinaryIO,
+    stream: str,
+    capture: OutputCapture | None,
+    on_line: Callable[[str, str], None] | None,
+) -> None:
+    """Read a pipe until EOF.
+
+    Args:
+        pipe (BinaryIO): The pipe.
+        stream (str): "stdout" or "stderr".
+        capture (OutputCapture | None): Where to capture the output.
+        on_line (Callable[[str, str], None] | None): Called with the stream
+            name and every line (without the line break).
+    """
+
+    decoder = codecs.getincrementaldecoder(DEFAULT_CHARSET)("replace")
+    pending = ""
+    with pipe:
+        while True:
+            data = pipe.read1(COPY_BUFSIZE)  # type: ignore[attr-defined]
+            if capture is not None and data:
+                capture.write(data)
+            if on_line is not None:
+                pending += decoder.decode(data, final=not data)
+                *lines, pending = pending.split("\n")
+                for line in lines:
+                    on_line(stream, line)
+                if not data and pending:
+                    on_line(stream, pending)
+            if not data:
+                break
+    if capture is not None:
+        capture.close()
+
+
+@dataclass
+class PopenResult:
+    """The result of `popen_capture()`."""
+
+    stdout: str
+    stderr: str
+    retcode: int
+    stdout_file: Path | None = None  # The whole stdout if it is spilled.
+    stderr_file: Path | None = None  # The whole stderr if it is spilled.
+    usage: ProcessUsage | None = None
+
+
+def popen_capture(  # pylint: disable=too-many-arguments,too-many-locals
+    cmd: list[str] | str,
+    cwd: Path = Path.cwd(),
+    stdout: bool = True,
+    stderr: int = 1,
+    strict: bool = False,
+    on_line: Callable[[str, str], None] | None = None,
+    capture_limit: int = POPEN_CAPTURE_LIMIT,
+) -> PopenResult:
+    """Run the command and capture its output.
+    The pipes are drained while the command is running, so a command
+    which writes a lot of output never blocks.
+
+    Args:
+        cmd (list[str] | str): The command.
+        cwd (Path): The working directory.
+        stdout (bool, optional): Capture stdout. Defaults to True.
+        stderr (int, optional): Capture stderr. If 0, stderr will not be
+            captured. If 1, stderr will be captured. If 2, stderr will be
+            redirected to stdout. Defaults to 1.
+        strict (bool, optional): Raise an exception if return code is not 0.
+            Defaults to False.
+        on_line (Callable[[str, str], None] | None, optional): Called with
+            the stream name ("stdout" or "stderr") and every output line
+            while the command is running. It is called in the reader
+            threads. Defaults to None.
+        capture_limit (int, optional): The in-memory capture limit of each
+            stream. Larger outputs are spilled to temporary files. Defaults
+            to `POPEN_CAPTURE_LIMIT`.
+
+    Returns:
+        PopenResult: The captured output, the return code and the resource
+            usage.
+
+    Raises:
+        RUShellExecutionException: If retcode !=0 and we are in strict mode.
+    """
+
+    args, shell, _temp = _popen_args(cmd)  # Keep the script until exit.
+    logger.debug("Popen: %s", repr(cmd))
+    start = time.monotonic()
+
+    captures = {
+        "stdout": OutputCapture(capture_limit) if stdout else None,
+        "stderr": OutputCapture(capture_limit) if stderr == 1 else None,
+    }
+    read_stderr = stderr == 1 or (stderr == 0 and on_line is not None)
+    with span(command(cmd), "process", cwd=cwd) as span_args, Popen(
+        args,
+        cwd=str(cwd),
+        shell=shell,
+        stdin=DEVNULL,
+        stdout=PIPE if stdout or on_line or stderr == 2 else DEVNULL,
+        stderr=STDOUT if stderr == 2 else PIPE if read_stderr else None,
+        pass_fds=job_slots.pass_fds,
+        env=job_slots.child_env,
+    ) as process:
+        readers = [
+            threading.Thread(
+                target=_drain,
+                args=(pipe, name, captures[name], on_line),
+                name=f"popen-{name}",
+                daemon=True,
+            )
+            for name, pipe in (
+                ("stdout", process.stdout),
+                ("stderr", process.stderr),
+            )
+            if pipe is not None
+        ]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        usage = _wait_usage(process, start)
+        span_args["retcode"] = process.returncode
+        if strict and process.returncode:
+            raise RUShellExecutionException(
+                _("Shell execution error."),
+                retcode=process.returncode,
+            )
+
+    stdout_capture, stderr_capture = captures["stdout"], captures["stderr"]
+    return PopenResult(
+        stdout_capture.text() if stdout_capture else "",
+        stderr_capture.text() if stderr_capture else "",
+        process.returncode,
+        stdout_capture.file if stdout_capture else None,
+        stderr_capture.file if stderr_capture else None,
+        usage,
+    )
 
 
 def popen(
@@ -154,50 +724,58 @@ def popen(
 
     Returns:
         tuple[str, str]: The stdout and stderr. If stdout or stderr is not
-            required, it will be "".
+            required, it will be "". Outputs larger than
+            `POPEN_CAPTURE_LIMIT` are truncated. Use `popen_capture()` to
+            get the whole output.
 
     Raises:
         RUShellExecutionException: If retcode !=0 and we are in strict mode.
     """
 
-    temp: TemporaryObject | None = None
-    if "\n" in cmd:
-        temp = TemporaryObject.new_file()
-        temp.path.write_text(
-            f"{cmd}\n",
-            encoding=DEFAULT_CHARSET,
-        )
-        temp.path.chmod(0o755)
-        real_cmd = command([get_system_shell(), str(temp.path)])
-    else:
-        real_cmd = command(cmd)
-    logger.debug("Popen: %s", repr(cmd))
-    with Popen(
-        real_cmd,
-        cwd=str(cwd),
-        shell=True,
-        stdout=PIPE,
-        stderr=None if stderr == 0 else PIPE if stderr == 1 else STDOUT,
-    ) as process:
-        process.wait()
-        if strict and process.returncode:
-            raise RUShellExecutionException(
-                _("Shell execution error."),
-                retcode=process.returncode,
+    res = popen_capture(cmd, cwd, stdout, stderr, strict)
+    return res.stdout, res.stderr, res.retcode
+
+
+def run_processes(
+    processes: list[Process],
+    fail_on_error: bool = True,
+    prefix: bool = True,
+) -> list[int]:
+    """Run processes concurrently, limited by the job slots.
+    If a process fails in fail-on-error mode, the others are terminated.
+
+    Args:
+        processes (list[Process]): The processes.
+        fail_on_error (bool, optional): Raise exception on error. Defaults
+            to True.
+        prefix (bool, optional): Prefix the output lines with the process
+            index. Defaults to True.
+
+    Returns:
+        list[int]: The return codes.
+    """
+
+    import asyncio  # pylint: disable=import-outside-toplevel
+
+    async def _run_all() -> list[int]:
+        tasks = [
+            asyncio.ensure_future(
+                proc.run_async(
+                    fail_on_error,
+                    f"[{idx + 1}] " if prefix else None,
+                ),
             )
-        return (
-            (
-                process.stdout.read().decode(DEFAULT_CHARSET)  # type: ignore
-                if stdout
-                else ""
-            ),
-            (
-                process.stderr.read().decode(DEFAULT_CHARSET)  # type: ignore
-                if stderr == 1
-                else ""
-            ),
-            process.returncode,
-        )
+            for idx, proc in enumerate(processes)
+        ]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    return asyncio.run(_run_all())
 
 
 if __name__ == "__main__":
@@ -255,8 +833,117 @@ if __name__ == "__main__":
     assert stderr_ == ""
     assert retcode_ == 0
 
+    # Test: Scripts and argument vectors do not need temporary files.
+    if os.name != "nt":
+        p = Process("a='x y'\necho \"$a\"")
+        assert p._tempfile is None  # pylint: disable=protected-access
+        assert p.cmd == [get_system_shell(), "-c", "a='x y'\necho \"$a\""]
+        assert p.run() == 0
+        long_script_ = "true\n" * (INLINE_SCRIPT_LIMIT // 4) + "echo long"
+        p = Process(long_script_)
+        assert p._tempfile is not None  # pylint: disable=protected-access
+        assert p.run() == 0
+        assert popen(long_script_)[0] == "long\n"
+        p = Process(["echo", "a b", "$HOME"])
+        assert not p.shell and p.cmd == ["echo", "a b", "$HOME"]
+        assert popen(["printf", "%s|", "a b", "$HOME"])[0] == "a b|$HOME|"
+
     # Test: Popen with stderr redirection.
     stdout_, stderr_, retcode_ = popen("echo Hello, world! >&2", stderr=2)
     assert stdout_ == "Hello, world!\n"
     assert stderr_ == ""
     assert retcode_ == 0
+
+    # Test: A large output does not block, and it is spilled to a file.
+    big_cmd = [
+        sys.executable,
+        "-c",
+        "import sys; sys.stdout.write('x' * 4000000); "
+        "sys.stderr.write('e\\n' * 200000)",
+    ]
+    res_ = popen_capture(big_cmd, capture_limit=1000000)
+    assert res_.stdout == "x" * 1000000
+    assert res_.stdout_file is not None
+    assert res_.stdout_file.stat().st_size == 4000000
+    assert res_.stderr_file is None  # Smaller than the limit.
+    assert len(res_.stderr) == 400000
+    res_ = popen_capture(big_cmd)
+    assert len(res_.stdout) == 4000000
+    assert res_.stdout_file is None and res_.stderr_file is None
+
+    # Test: Line callbacks.
+    lines_: list[tuple[str, str]] = []
+    res_ = popen_capture(
+        "echo a; echo b >&2; printf c",
+        stdout=False,
+        stderr=0,
+        on_line=lambda stream, line: lines_.append((stream, line)),
+    )
+    assert res_.stdout == "" and res_.stderr == ""
+    assert sorted(lines_) == [
+        ("stderr", "b"),
+        ("stdout", "a"),
+        ("stdout", "c"),
+    ]
+
+    # Test: The resource usage of a process and its children.
+    if os.name != "nt":
+        p = Process(
+            f"{sys.executable} -c \"b = bytearray(64 << 20); "
+            "open('/dev/null', 'wb').write(b)\" | cat",
+        )
+        assert p.run() == 0
+        assert p.usage is not None
+        assert p.usage.max_rss is not None and p.usage.max_rss >= 64 << 20
+        assert p.usage.cpu > 0 and p.usage.wall > 0
+        if _HAS_PROC_IO:
+            assert (p.usage.write_chars or 0) >= 64 << 20
+        assert "max-rss" in p.usage.as_dict()
+        res_ = popen_capture("exit 4")
+        assert res_.retcode == 4 and res_.usage is not None
+        total_ = ProcessUsage.total(
+            [ProcessUsage(1, 1, 0, 10), ProcessUsage(2, 2, 1, 5)],
+        )
+        assert total_ == ProcessUsage(2, 3, 1, 10)
+
+    # Test: Concurrent processes are limited by the job slots.
+    job_slots.resize(2)
+    start_ = time.monotonic()
+    assert run_processes([Process("sleep 0.2; echo done")] * 4) == [0] * 4
+    p = Process("exit 5")
+    assert run_processes([p], fail_on_error=False) == [5]
+    assert p.usage is not None and p.usage.wall > 0
+    assert 0.4 <= time.monotonic() - start_ < 0.8
+
+    # Test: A failed process terminates the others and their children.
+    start_ = time.monotonic()
+    try:
+        run_processes([Process("sleep 5 | cat"), Process("sleep 0.1; exit 3")])
+        assert False, "Should raise RUShellExecutionException."
+    except RUShellExecutionException as exc_:
+        assert exc_.retcode == 3
+    assert time.monotonic() - start_ < 2
+    assert run_processes([Process("exit 1")], fail_on_error=False) == [1]
+
+    # Test: The slots share the tokens of a jobserver with the children.
+    makeflags_ = os.environ.get("MAKEFLAGS")
+    job_slots.resize(2)  # One token and the implicit one.
+    job_slots.enable_jobserver()
+    assert job_slots.jobserver is None  # Not set up before the first job.
+    assert Process("true").run() == 0
+    jobserver_ = job_slots.jobserver
+    assert jobserver_ is not None
+    assert os.environ.get("MAKEFLAGS") == makeflags_
+    job_slots.resize(8)
+    start_ = time.monotonic()
+    assert run_processes([Process("sleep 0.2")] * 4) == [0] * 4
+    assert 0.4 <= time.monotonic() - start_ < 0.8
+    stdout_, stderr_, retcode_ = popen(
+        f"{sys.executable} -c \"import os; os.fstat({jobserver_.read_fd}); "
+        "print(os.environ['MAKEFLAGS'])\"",
+    )
+    assert retcode_ == 0, stderr_
+    assert stdout_.strip() == (
+        f"-j2 --jobserver-auth={jobserver_.read_fd},{jobserver_.write_fd}"
+    )
+    job_slots.use_jobserver(None)
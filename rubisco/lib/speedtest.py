@@ -24,45 +24,65 @@ Test the speed of the given host.
 
 import time
 
+import aiohttp
 import aiohttp.client_exceptions
 
 from rubisco.config import TIMEOUT
 from rubisco.lib.log import logger
 
-__all__ = ["url_speedtest"]
+__all__ = ["url_speedtest", "new_speedtest_session"]
 
 C_INTMAX = 0xFFFFFFFF
 
 
-async def url_speedtest(url: str) -> int:
+def new_speedtest_session() -> aiohttp.ClientSession:
+    """Create a client session for speed tests. It can be shared by many
+    tests to reuse the connector.
+
+    Returns:
+        aiohttp.ClientSession: The session. It must be closed.
+    """
+
+    return aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(TIMEOUT),
+        raise_for_status=False,
+        read_bufsize=1,  # We don't need to read the response.
+    )
+
+
+async def url_speedtest(
+    url: str,
+    session: aiohttp.ClientSession | None = None,
+) -> int:
     """Test the speed of the given url.
 
     Args:
         url (str): URL to test.
+        session (aiohttp.ClientSession | None, optional): The session to
+            use. Defaults to None, which means a new session.
 
     Returns:
         int: Speed of the given URL. (us)
     """
 
+    if session is None:
+        async with new_speedtest_session() as new_session:
+            return await url_speedtest(url, new_session)
+
     logger.debug("Testing speed for '%s' ...", url)
     start = time.time_ns()
 
-    async with aiohttp.ClientSession(
-        timeout=aiohttp.ClientTimeout(TIMEOUT),
-        raise_for_status=False,
-        read_bufsize=1,  # We don't need to read the response.
-    ) as session:
-        try:
-            async with session.get(url) as response:
-                response.close()
-        except aiohttp.client_exceptions.ClientResponseError:
-            pass  # Response means reachable.
-        except aiohttp.client_exceptions.ClientError:
-            logger.warning("Failed to test speed of '%s'.", url, exc_info=True)
-            return C_INTMAX
-        delta = (time.time_ns() - start) // 1000
-        logger.info("Testing speed for '%s' ... %dus", url, delta)
-        return delta
+    try:
+        async with session.get(url) as response:
+            response.close()
+    except aiohttp.client_exceptions.ClientResponseError:
+        pass  # Response means reachable.
+    except (aiohttp.client_exceptions.ClientError, TimeoutError):
+        logger.warning("Failed to test speed of '%s'.", url, exc_info=True)
+        return C_INTMAX
+    delta = (time.time_ns() - start) // 1000
+    logger.info("Testing speed for '%s' ... %dus", url, delta)
+    return delta
 
 
 # We don't need this function for now.
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Local HTTP servers for the self-tests.
+"""
+
+import http.server
+import threading
+from typing import Callable
+
+__all__ = ["QuietHTTPRequestHandler", "start_test_server"]
+
+
+class QuietHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """A file request handler which does not log the requests."""
+
+    def log_message(  # pylint: disable=arguments-differ
+        self,
+        *args,
+    ) -> None:
+        pass
+
+
+def start_test_server(
+    handler: Callable[..., http.server.BaseHTTPRequestHandler],
+) -> http.server.ThreadingHTTPServer:
+    """Serve on a free local port in a daemon thread.
+
+    Args:
+        handler (Callable[..., http.server.BaseHTTPRequestHandler]): The
+            request handler class.
+
+    Returns:
+        http.server.ThreadingHTTPServer: The server. Its port is
+            `server_port`.
+    """
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
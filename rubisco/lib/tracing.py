@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Span instrumentation in Chrome Trace Event format.
+The exported file can be opened in Perfetto (https://ui.perfetto.dev) or
+chrome://tracing. Spans are only recorded after `enable_tracing()`, so the
+instrumentation is almost free otherwise.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Generator, TypeVar
+
+from rubisco.config import DEFAULT_CHARSET
+
+__all__ = [
+    "enable_tracing",
+    "is_tracing_enabled",
+    "span",
+    "traced",
+    "chrome_trace",
+    "export_chrome_trace",
+]
+
+T = TypeVar("T", bound=Callable[..., Any])
+
+# None if tracing is disabled.
+_events: list[dict[str, Any]] | None = None  # pylint: disable=invalid-name
+_threads: dict[int, str] = {}
+_lock = threading.Lock()
+_epoch = time.perf_counter()
+
+
+def enable_tracing() -> None:
+    """Start recording spans. The recorded spans are kept."""
+
+    global _events  # pylint: disable=global-statement
+
+    with _lock:
+        if _events is None:
+            _events = []
+
+
+def is_tracing_enabled() -> bool:
+    """Check if spans are recorded.
+
+    Returns:
+        bool: True if spans are recorded.
+    """
+
+    return _events is not None
+
+
+def _now() -> float:
+    return (time.perf_counter() - _epoch) * 1e6  # Microseconds.
+
+
+@contextmanager
+def span(
+    name: str,
+    cat: str,
+    **args: Any,
+) -> Generator[dict[str, Any], None, None]:
+    """Record a span around a block.
+
+    Args:
+        name (str): The span name.
+        cat (str): The span category. e.g. "hook", "workflow", "step".
+        **args (Any): The span arguments shown in the trace viewer.
+
+    Yields:
+        dict[str, Any]: The span arguments. Update it to add results (e.g.
+            a return code) to the span.
+    """
+
+    if _events is None:
+        yield args
+        return
+
+    start = _now()
+    try:
+        yield args
+    finally:
+        end = _now()
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": start,
+            "dur": end - start,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": {key: str(val) for key, val in args.items()},
+        }
+        with _lock:
+            _events.append(event)
+            _threads.setdefault(thread.ident or 0, thread.name)
+
+
+def traced(cat: str, name: str | None = None) -> Callable[[T], T]:
+    """Record a span around every call of a function.
+
+    Args:
+        cat (str): The span category.
+        name (str | None, optional): The span name. Defaults to the
+            qualified name of the function.
+
+    Returns:
+        Callable[[T], T]: The decorator.
+    """
+
+    def _decorator(func: T) -> T:
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def _wrapper(*args, **kwargs):
+            if _events is None:
+                return func(*args, **kwargs)
+            with span(span_name, cat):
+                return func(*args, **kwargs)
+
+        return _wrapper  # type: ignore[return-value]
+
+    return _decorator
+
+
+def chrome_trace() -> dict[str, Any]:
+    """Get the recorded spans as a Chrome Trace Event document.
+
+    Returns:
+        dict[str, Any]: The trace document.
+    """
+
+    pid = os.getpid()
+    with _lock:
+        events = list(_events or [])
+        threads = dict(_threads)
+    metadata = [
+        {
+            "name": "process_name",
+            "ph": "M",
+            "pid": pid,
+            "args": {"name": "rubisco"},
+        },
+    ]
+    for tid, thread_name in threads.items():
+        metadata.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": thread_name},
+            },
+        )
+
+    return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+
+def export_chrome_trace(file: Path) -> None:
+    """Write the recorded spans to a Chrome Trace Event file.
+
+    Args:
+        file (Path): The trace file.
+    """
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with file.open("w", encoding=DEFAULT_CHARSET) as f:
+        json.dump(chrome_trace(), f)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    # Test: Nothing is recorded before tracing is enabled.
+    with span("ignored", "test"):
+        pass
+    assert not is_tracing_enabled()
+    assert not chrome_trace()["traceEvents"][1:]
+
+    @traced("test")
+    def _work(delay: float) -> float:
+        time.sleep(delay)
+        return delay
+
+    # Test: Nested spans and threads.
+    enable_tracing()
+    with span("outer", "test", key="value") as outer_args:
+        assert _work(0.01) == 0.01
+        worker = threading.Thread(target=_work, args=(0,), name="worker")
+        worker.start()
+        worker.join()
+        outer_args["result"] = 0
+    try:
+        with span("failed", "test"):
+            raise KeyError("Test.")
+    except KeyError:
+        pass
+
+    with tempfile.TemporaryDirectory() as temp:
+        trace_file = Path(temp) / "trace.json"
+        export_chrome_trace(trace_file)
+        doc = json.loads(trace_file.read_text(encoding=DEFAULT_CHARSET))
+    spans = {
+        event["name"]: event
+        for event in doc["traceEvents"]
+        if event["ph"] == "X" and event["tid"] == threading.get_ident()
+    }
+    assert set(spans) == {"outer", "_work", "failed"}, spans
+    assert spans["outer"]["args"] == {"key": "value", "result": "0"}
+    assert spans["outer"]["ts"] <= spans["_work"]["ts"]
+    assert spans["outer"]["dur"] >= spans["_work"]["dur"] >= 1e4
+    thread_names = {
+        event["args"]["name"]
+        for event in doc["traceEvents"]
+        if event["name"] == "thread_name"
+    }
+    assert thread_names == {"MainThread", "worker"}, thread_names
@@ -25,6 +25,8 @@ Rubisco variable system.
 import os
 import re
 import sys
+import threading
+from functools import lru_cache
 from pathlib import Path
 from platform import uname
 from queue import Empty, LifoQueue
@@ -116,6 +118,9 @@ class Stack(LifoQueue):
 # The global variable container.
 variables: dict[str, Stack] = {}
 
+# Workflow steps may push and pop variables from multiple threads.
+variables_lock = threading.RLock()
+
 
 def push_variables(name: str, value: Any) -> None:
     """Push a new variable.
@@ -125,10 +130,9 @@ def push_variables(name: str, value: Any) -> None:
         value (str): The value of the variable.
     """
 
-    if name in variables:
-        variables[name].put(value)
-    else:
-        variables[name] = Stack()
+    with variables_lock:
+        if name not in variables:
+            variables[name] = Stack()
         variables[name].put(value)
 
 
@@ -142,11 +146,12 @@ def pop_variables(name: str) -> Any:
         Any: The top value of the given variable.
     """
 
-    if name in variables:
-        res = variables[name].get()
-        if variables[name].empty():
-            del variables[name]
-        return res
+    with variables_lock:
+        if name in variables:
+            res = variables[name].get()
+            if variables[name].empty():
+                del variables[name]
+            return res
     return None
 
 
@@ -163,13 +168,18 @@ def get_variable(name: str) -> Any:
         KeyError: If the variable is not found.
     """
 
-    if name in variables:
+    with variables_lock:
+        stack = variables.get(name)
+        defined = stack is not None and not stack.empty()
+        if defined:
+            value = stack.top_nowait()
+    if defined:
         if name not in used_variables:
             old = used_variables.copy()
             used_variables.add(name)
             for callback in callbacks:
                 callback.on_used_variables_update(old)
-        return variables[name].top()
+        return value
     if name not in undefined_variables:
         old = undefined_variables.copy()
         undefined_variables.add(name)
@@ -282,6 +292,66 @@ def add_callback(callback: VariableUpdateCallback) -> None:
     callbacks.append(callback)
 
 
+# ${{ key }} -> key, space is allowed.
+_VARIABLE_PATTERN = re.compile(r"\$\{\{ *([\d|_|\-|a-z|A-Z|.]+) *\}\}")
+
+# The maximum number of parsed templates we keep.
+FORMAT_STR_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=FORMAT_STR_CACHE_SIZE)
+def _parse_template(string: str) -> tuple[str | tuple[str, str], ...]:
+    """Split a template string into literal and placeholder segments.
+
+    Args:
+        string (str): The template string.
+
+    Returns:
+        tuple[str | tuple[str, str], ...]: The segments. A literal segment is
+            a string and a placeholder is a tuple of its key and raw text.
+    """
+
+    segments: list[str | tuple[str, str]] = []
+    pos = 0
+    for match in _VARIABLE_PATTERN.finditer(string):
+        if match.start() > pos:
+            segments.append(string[pos : match.start()])  # noqa: E203
+        segments.append((match.group(1), match.group(0)))
+        pos = match.end()
+    if pos < len(string):
+        segments.append(string[pos:])
+
+    return tuple(segments)
+
+
+def _mark_used(key: str) -> None:
+    """Mark a variable as used and notify the callbacks.
+
+    Args:
+        key (str): The variable name.
+    """
+
+    if key not in used_variables:
+        old = used_variables.copy()
+        used_variables.add(key)
+        for callback in callbacks:
+            callback.on_used_variables_update(old)
+
+
+def _mark_undefined(key: str) -> None:
+    """Mark a variable as undefined and notify the callbacks.
+
+    Args:
+        key (str): The variable name.
+    """
+
+    if key not in undefined_variables:
+        old = undefined_variables.copy()
+        undefined_variables.add(key)
+        for callback in callbacks:
+            callback.on_undefined_variables_update(old)
+
+
 def format_str(
     string: str | Any, fmt: dict[str, str] | None = None  # noqa: E501
 ) -> str | Any:
@@ -289,40 +359,39 @@ def format_str(
 
     Args:
         string (str | Any): The string to format.
+        fmt (dict[str, str] | None): Extra variables. They take precedence
+            over the global variables.
 
     Returns:
         str | Any: The formatted string. If the input is not a string,
             return itself.
     """
 
-    if not isinstance(string, str):
+    if not isinstance(string, str) or "${{" not in string:
         return string
 
-    if not fmt:  # ${{ key }} -> key, space is allowed.
-        fmt = {}
-
-    fmt = variables | fmt
-
-    matches = re.findall(r"\$\{\{ *[\d|_|\-|a-z|A-Z|.]+ *\}\}", string)
-    for match in matches:
-        key = match[3:-2].strip()
-        if key not in used_variables:
-            old = used_variables.copy()
-            used_variables.add(key)
-            for callback in callbacks:
-                callback.on_used_variables_update(used_variables)
-                fmt = variables | fmt  # Update the variables.
-        res = fmt.get(key, match)
-        if key not in fmt:
-            old = undefined_variables.copy()
-            undefined_variables.add(key)
-            for callback in callbacks:
-                callback.on_undefined_variables_update(old)
-        if isinstance(res, Stack):
-            res = res.top()
-        string = string.replace(match, str(res))
+    parts: list[str] = []
+    for segment in _parse_template(string):
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        key, raw = segment
+        _mark_used(key)
+        if fmt and key in fmt:
+            res = fmt[key]
+        else:
+            # Another thread may pop the variable, so never block on it.
+            with variables_lock:
+                stack = variables.get(key)
+                defined = stack is not None and not stack.empty()
+                if defined:
+                    res = stack.top_nowait()
+            if not defined:
+                _mark_undefined(key)
+                res = raw
+        parts.append(str(res))
 
-    return string
+    return "".join(parts)
 
 
 def _to_autotype(obj: Any) -> Any:
@@ -886,3 +955,33 @@ if __name__ == "__main__":
     assert get_variable("test") == "test"
     assert AutoFormatDict({"${{test}}": "${{test}}"}) == {"test": "test"}
     assert pop_variables("test") == "test"
+
+    # Test: Format string.
+    push_variables("test", "val")
+    assert format_str("${{test}}") == "val"
+    assert format_str("a ${{ test }} b ${{test}}") == "a val b val"
+    assert format_str("${{test}}", fmt={"test": "fmt"}) == "fmt"
+    assert format_str("${{ _undefined_ }}") == "${{ _undefined_ }}"
+    assert "_undefined_" in undefined_variables
+    assert format_str("no variables") == "no variables"
+    assert format_str(1) == 1
+    push_variables("test", "new")
+    assert format_str("${{test}}") == "new"  # Cached template, new value.
+    pop_variables("test")
+    assert format_str("${{test}}") == "val"
+    pop_variables("test")
+
+    # Test: A variable popped by another thread never blocks formatting.
+    stop_ = threading.Event()
+
+    def _push_pop() -> None:
+        while not stop_.is_set():
+            push_variables("racy", "x")
+            pop_variables("racy")
+
+    racer_ = threading.Thread(target=_push_pop, daemon=True)
+    racer_.start()
+    for _i in range(20000):
+        assert format_str("${{racy}}") in ("x", "${{racy}}")
+    stop_.set()
+    racer_.join()
@@ -22,69 +22,679 @@
 Download a file from the Internet.
 """
 
-from pathlib import Path
-from typing import Any
+import hashlib
+import json
+import lzma
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import Any, BinaryIO, Mapping
+from urllib.parse import urlparse
 
 import requests
 
-from rubisco.config import COPY_BUFSIZE, TIMEOUT
+from rubisco.config import (COPY_BUFSIZE, DEFAULT_CHARSET,
+                            DOWNLOAD_SEGMENT_MIN_SIZE, DOWNLOAD_SEGMENTS,
+                            TIMEOUT)
+from rubisco.lib.archive import extract, extract_tarball_stream
+from rubisco.lib.download_cache import (check_sha256, download_cache,
+                                        verify_sha256)
+from rubisco.lib.exceptions import RUValueException
 from rubisco.lib.fileutil import check_file_exists, rm_recursive
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
+from rubisco.lib.tracing import traced
 from rubisco.lib.variable import format_str
 from rubisco.shared.ktrigger import IKernelTrigger, call_ktrigger
 
-__all__ = ["wget"]
+__all__ = ["wget", "fetch_extract"]
 
+# Maximum number of chunks read ahead from the network.
+PREFETCH_DEPTH = 64
+
+# Tarball types which can be extracted while downloading.
+STREAM_TAR_TYPES = {
+    "tar": None,
+    "tar.gz": "gz",
+    "tgz": "gz",
+    "tar.bz2": "bz2",
+    "tbz2": "bz2",
+    "tar.xz": "xz",
+    "txz": "xz",
+}
+
+
+class _RangeUnsupportedError(Exception):
+    """The server does not honor a Range request."""
+
+
+def _part_file(save_to: Path) -> Path:
+    return save_to.with_name(f"{save_to.name}.part")
+
+
+def _state_file(save_to: Path) -> Path:
+    return save_to.with_name(f"{save_to.name}.part.json")
+
+
+def _load_download_state(
+    save_to: Path,
+    resource: dict[str, Any],
+) -> list[list[int]] | None:
+    """Load the segments of a partial download.
+
+    Args:
+        save_to (Path): The path to save the file to.
+        resource (dict[str, Any]): The URL, size and validator of the file.
+
+    Returns:
+        list[list[int]] | None: The segments as [start, end, done]. None if
+            there is no partial download of the same resource.
+    """
+
+    part = _part_file(save_to)
+    try:
+        with _state_file(save_to).open("r", encoding=DEFAULT_CHARSET) as f:
+            state = json.load(f)
+        if (
+            state["resource"] != resource
+            or part.stat().st_size != resource["size"]
+        ):
+            return None
+        return [
+            [int(start), int(end), int(done)]
+            for start, end, done in state["segments"]
+        ]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _save_download_state(
+    save_to: Path,
+    resource: dict[str, Any],
+    segments: list[list[int]],
+) -> None:
+    """Save the segments of a partial download atomically.
+
+    Args:
+        save_to (Path): The path to save the file to.
+        resource (dict[str, Any]): The URL, size and validator of the file.
+        segments (list[list[int]]): The segments as [start, end, done].
+    """
+
+    state_file = _state_file(save_to)
+    temp_file = state_file.with_name(f"{state_file.name}.tmp")
+    with temp_file.open("w", encoding=DEFAULT_CHARSET) as f:
+        json.dump({"resource": resource, "segments": segments}, f)
+    os.replace(temp_file, state_file)
 
-def wget(url: str, save_to: Path, overwrite: bool = True) -> None:
-    """Download a file from the Internet.
+
+def _fetch_segment(  # pylint: disable=too-many-arguments
+    url: str,
+    part: Path,
+    segment: list[int],
+    validator: str | None,
+    lock: threading.Lock,
+    stop: threading.Event,
+) -> None:
+    """Download a segment of a file.
+
+    Args:
+        url (str): The URL of the file.
+        part (Path): The preallocated partial file.
+        segment (list[int]): The segment as [start, end, done]. `done` is
+            updated while downloading.
+        validator (str | None): The ETag or Last-Modified of the file.
+        lock (threading.Lock): The lock of `segment`.
+        stop (threading.Event): Stop downloading if it is set.
+    """
+
+    start, end, done = segment
+    if start + done > end:
+        return
+    headers = {"Range": f"bytes={start + done}-{end}"}
+    if validator:
+        headers["If-Range"] = validator
+
+    with requests.get(
+        url,
+        headers=headers,
+        stream=True,
+        timeout=TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise _RangeUnsupportedError
+        # Unbuffered, so `done` never counts data which is not written.
+        with part.open("r+b", buffering=0) as file:
+            file.seek(start + done)
+            for chunk in response.iter_content(chunk_size=COPY_BUFSIZE):
+                if stop.is_set():
+                    return
+                file.write(chunk)
+                with lock:
+                    segment[2] += len(chunk)
+
+
+def _wget_segmented(  # pylint: disable=too-many-locals
+    url: str,
+    save_to: Path,
+    resource: dict[str, Any],
+    segments_count: int,
+    task_name: str,
+) -> None:
+    """Download a file with concurrent Range requests. The download can be
+    resumed from its state file after interruption.
 
     Args:
         url (str): The URL of the file.
         save_to (Path): The path to save the file to.
-        overwrite (bool): Whether to overwrite the file if it already exists.
+        resource (dict[str, Any]): The URL, size and validator of the file.
+        segments_count (int): The number of segments of a new download.
+        task_name (str): The task name.
+
+    Raises:
+        _RangeUnsupportedError: If the server does not honor the Range
+            request.
     """
 
-    if not overwrite:
-        check_file_exists(save_to)
+    size = resource["size"]
+    part = _part_file(save_to)
+    segments = _load_download_state(save_to, resource)
+    if segments is None:
+        with part.open("wb") as file:
+            file.truncate(size)
+        step = -(-size // segments_count)
+        segments = [
+            [start, min(start + step, size) - 1, 0]
+            for start in range(0, size, step)
+        ]
+    else:
+        logger.info("Resuming download '%s' ...", url)
+
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def _report() -> None:
+        with lock:
+            snapshot = [list(segment) for segment in segments]
+        _save_download_state(save_to, resource, snapshot)
+        call_ktrigger(
+            IKernelTrigger.on_progress,
+            task_name=task_name,
+            current=sum(segment[2] for segment in snapshot),
+            more_data={"url": url},
+        )
+
+    call_ktrigger(
+        IKernelTrigger.on_new_task,
+        task_name=task_name,
+        task_type=IKernelTrigger.TASK_DOWNLOAD,
+        total=size,
+    )
+    executor = ThreadPoolExecutor(len(segments))
+    try:
+        pending = {
+            executor.submit(
+                _fetch_segment,
+                url,
+                part,
+                segment,
+                resource["validator"],
+                lock,
+                stop,
+            )
+            for segment in segments
+        }
+        while pending:
+            finished, pending = wait_futures(
+                pending,
+                timeout=0.5,
+                return_when=FIRST_EXCEPTION,
+            )
+            for future in finished:
+                future.result()
+            _report()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        _report()
+        call_ktrigger(IKernelTrigger.on_finish_task, task_name=task_name)
+
+    if any(start + done != end + 1 for start, end, done in segments):
+        raise RUValueException(
+            format_str(
+                _("Incomplete download: '${{url}}'."),
+                fmt={"url": url},
+            ),
+            hint=_("Run it again to resume the download."),
+        )
+    os.replace(part, save_to)
+    _state_file(save_to).unlink()
+
+
+def _download(
+    url: str,
+    save_to: Path,
+    segments: int | None = None,
+) -> Mapping[str, str]:
+    """Download a file without the download cache.
+
+    Args:
+        url (str): The URL of the file.
+        save_to (Path): The path to save the file to.
+        segments (int | None): The number of segments. Defaults to None,
+            which means `DOWNLOAD_SEGMENTS`.
+
+    Returns:
+        Mapping[str, str]: The response headers.
+    """
 
     logger.debug("Downloading '%s' ...", url)
 
-    with requests.head(url, timeout=TIMEOUT) as response:
+    with requests.head(url, timeout=TIMEOUT, allow_redirects=True) as response:
+        response.raise_for_status()
+        headers = response.headers
         content_length = int(response.headers.get("Content-Length", 0))
+        accept_ranges = response.headers.get("Accept-Ranges", "none")
+        etag = response.headers.get("ETag")
+        validator = (
+            etag
+            if etag and not etag.startswith("W/")
+            else response.headers.get("Last-Modified")
+        )
 
-        response.raise_for_status()
-        with open(save_to, "wb") as file:
-            with requests.get(url, stream=True, timeout=TIMEOUT) as response:
-                response.raise_for_status()
-                task_name = format_str(
-                    _(
-                        "Downloading ${{url}} ...",
-                    ),
-                    fmt={"url": url},
-                )
-                call_ktrigger(
-                    IKernelTrigger.on_new_task,
-                    task_name=task_name,
-                    task_type=IKernelTrigger.TASK_DOWNLOAD,
-                    total=content_length,
-                )
-                for chunk in response.iter_content(chunk_size=COPY_BUFSIZE):
-                    file.write(chunk)
-                    file.flush()
-                    call_ktrigger(
-                        IKernelTrigger.on_progress,
-                        task_name=task_name,
-                        current=len(chunk),
-                        delta=True,
-                        more_data={"url": url},
-                    )
+    task_name = format_str(
+        _(
+            "Downloading ${{url}} ...",
+        ),
+        fmt={"url": url},
+    )
+    segments = segments if segments is not None else DOWNLOAD_SEGMENTS
+    if (
+        segments > 1
+        and accept_ranges.strip().lower() == "bytes"
+        and content_length >= DOWNLOAD_SEGMENT_MIN_SIZE
+    ):
+        resource = {
+            "url": url,
+            "size": content_length,
+            "validator": validator,
+        }
+        try:
+            _wget_segmented(url, save_to, resource, segments, task_name)
+            logger.debug("Downloaded '%s' to '%s'.", url, save_to)
+            return headers
+        except _RangeUnsupportedError:
+            logger.warning("Range request is not honored: '%s'", url)
+            _part_file(save_to).unlink(missing_ok=True)
+            _state_file(save_to).unlink(missing_ok=True)
+
+    with open(save_to, "wb") as file:
+        with requests.get(url, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()
+            call_ktrigger(
+                IKernelTrigger.on_new_task,
+                task_name=task_name,
+                task_type=IKernelTrigger.TASK_DOWNLOAD,
+                total=content_length,
+            )
+            for chunk in response.iter_content(chunk_size=COPY_BUFSIZE):
+                file.write(chunk)
                 call_ktrigger(
-                    IKernelTrigger.on_finish_task,
+                    IKernelTrigger.on_progress,
                     task_name=task_name,
+                    current=len(chunk),
+                    delta=True,
+                    more_data={"url": url},
                 )
+            call_ktrigger(
+                IKernelTrigger.on_finish_task,
+                task_name=task_name,
+            )
     logger.debug("Downloaded '%s' to '%s'.", url, save_to)
+    return headers
+
+
+@traced("download")
+def wget(  # pylint: disable=too-many-arguments
+    url: str,
+    save_to: Path,
+    overwrite: bool = True,
+    segments: int | None = None,
+    sha256: str | None = None,
+    use_cache: bool = True,
+) -> None:
+    """Download a file from the Internet.
+    Large files are downloaded in segments concurrently if the server
+    supports Range requests. An interrupted segmented download is resumed
+    on the next call.
+
+    Args:
+        url (str): The URL of the file.
+        save_to (Path): The path to save the file to.
+        overwrite (bool): Whether to overwrite the file if it already exists.
+        segments (int | None): The number of segments. Defaults to None,
+            which means `DOWNLOAD_SEGMENTS`.
+        sha256 (str | None): The expected SHA-256 of the file. Defaults to
+            None.
+        use_cache (bool): Reuse and fill the user's download cache.
+            Defaults to True.
+    """
+
+    if not overwrite:
+        check_file_exists(save_to)
+
+    if use_cache:
+        download_cache.fetch(
+            url,
+            save_to,
+            partial(_download, segments=segments),
+            sha256,
+        )
+    else:
+        _download(url, save_to, segments)
+        if sha256:
+            verify_sha256(save_to, sha256, url)
+
+
+class _PrefetchReader:  # pylint: disable=too-many-instance-attributes
+    """
+    A forward-only reader which reads its source on a background thread, so
+    network reads overlap with the consumer. The data can be copied to a tee
+    file at the same time, and its SHA-256 is computed while it is read.
+    """
+
+    def __init__(self, src: BinaryIO, tee: BinaryIO | None = None) -> None:
+        self._src = src
+        self._tee = tee
+        self._hasher = hashlib.sha256()
+        self._chunks: queue.Queue[bytes | None] = queue.Queue(PREFETCH_DEPTH)
+        self._buffer = b""
+        self._pos = 0
+        self._eof = False
+        self._closed = False
+        self._error: Exception | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._closed and (chunk := self._src.read(COPY_BUFSIZE)):  # noqa: E501
+                if self._tee is not None:
+                    self._tee.write(chunk)
+                self._hasher.update(chunk)
+                self._chunks.put(chunk)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            self._error = exc
+        finally:
+            self._chunks.put(None)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read data from the source.
+
+        Args:
+            size (int, optional): The maximum size to read. -1 means all.
+                Defaults to -1.
+
+        Returns:
+            bytes: The data. Empty if the source is exhausted.
+        """
+
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._chunks.get()
+            if chunk is None:
+                self._eof = True
+                if self._error is not None:
+                    raise self._error
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._pos += len(data)
+        return data
+
+    def tell(self) -> int:
+        """Get the number of bytes read.
+
+        Returns:
+            int: The number of bytes read.
+        """
+
+        return self._pos
+
+    def sha256(self) -> str:
+        """Get the SHA-256 of the data read from the source. It is only
+        complete after the source is exhausted.
+
+        Returns:
+            str: The hex digest.
+        """
+
+        return self._hasher.hexdigest()
+
+    def close(self) -> None:
+        """Stop the background thread."""
+
+        self._closed = True
+        while self._thread.is_alive():
+            try:
+                self._chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def __enter__(self) -> "_PrefetchReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def _url_archive_type(url: str) -> str | None:
+    """Guess the archive type from the URL path.
+
+    Args:
+        url (str): The URL.
+
+    Returns:
+        str | None: The archive type. None if it is unknown.
+    """
+
+    path = PurePosixPath(urlparse(url).path)
+    if len(path.suffixes) > 1 and path.suffixes[-2] == ".tar":
+        return "tar" + path.suffix
+    if path.suffix:
+        return path.suffix[1:]
+    return None
+
+
+def _stream_extract(
+    url: str,
+    dest: Path,
+    compress_type: str,
+    part: Path | None,
+    sha256: str | None,
+) -> Mapping[str, str]:
+    """Download a tarball and extract it while the body is arriving.
+
+    Args:
+        url (str): The URL of the tarball.
+        dest (Path): Destination directory. It must not exist.
+        compress_type (str): A key of `STREAM_TAR_TYPES`.
+        part (Path | None): Also save the tarball to this file.
+        sha256 (str | None): The expected SHA-256 of the tarball.
+
+    Returns:
+        Mapping[str, str]: The response headers.
+    """
+
+    with ExitStack() as stack:
+        response = stack.enter_context(
+            requests.get(url, stream=True, timeout=TIMEOUT),
+        )
+        response.raise_for_status()
+        response.raw.decode_content = True
+        tee = stack.enter_context(part.open("wb")) if part else None
+        reader = stack.enter_context(_PrefetchReader(response.raw, tee))
+        extract_tarball_stream(
+            reader,
+            dest,
+            STREAM_TAR_TYPES[compress_type],
+            True,
+            url,
+            int(response.headers.get("Content-Length", 0)),
+        )
+        # Drain the trailing padding to complete the digest and the cache
+        # file.
+        while reader.read(COPY_BUFSIZE):
+            pass
+        if sha256:
+            check_sha256(reader.sha256(), sha256, url)
+
+    return response.headers
+
+
+@traced("download")
+def fetch_extract(  # pylint: disable=too-many-arguments
+    url: str,
+    dest: Path,
+    compress_type: str | None = None,
+    overwrite: bool = False,
+    cache: Path | None = None,
+    password: str | None = None,
+    sha256: str | None = None,
+    use_cache: bool = True,
+) -> None:
+    """Download an archive and extract it to destination.
+    Tarballs are extracted while the response body is arriving, without
+    saving it to disk first. Other archives are downloaded and then
+    extracted.
+
+    Args:
+        url (str): The URL of the archive.
+        dest (Path): Destination directory.
+        compress_type (str | None, optional): Archive type. See `extract()`.
+            Defaults to None, which means it is guessed from the URL.
+        overwrite (bool, optional): Overwrite destination if it exists.
+            Defaults to False.
+        cache (Path | None, optional): Also save the archive to this file.
+            It is only written if the download is completed. Defaults to
+            None.
+        password (str | None, optional): Password to decrypt the archive.
+            Tarball is not supported. Defaults to None.
+        sha256 (str | None, optional): The expected SHA-256 of the archive.
+            A streamed tarball is extracted to a temporary directory next to
+            `dest`, which is moved to `dest` only if the SHA-256 matches.
+            Defaults to None.
+        use_cache (bool, optional): Reuse and fill the user's download
+            cache. Defaults to True.
+    """
+
+    if compress_type is None:
+        compress_type = _url_archive_type(url)
+    compress_type = compress_type.lower().strip() if compress_type else None
+
+    cached = download_cache.lookup(url, sha256) if use_cache else None
+    if cached is not None:
+        extract(cached, dest, compress_type, overwrite, password)
+        if cache:
+            shutil.copyfile(cached, cache)
+        return
+
+    if compress_type not in STREAM_TAR_TYPES:
+        with tempfile.TemporaryDirectory() as temp:
+            file = cache if cache else Path(temp) / PurePosixPath(
+                urlparse(url).path,
+            ).name
+            wget(url, file, sha256=sha256, use_cache=use_cache)
+            extract(file, dest, compress_type, overwrite, password)
+        return
+
+    logger.debug("Fetching and extracting '%s' ...", url)
+    _fetch_stream_extract(
+        url,
+        dest,
+        compress_type,
+        overwrite,
+        cache,
+        sha256,
+        use_cache,
+    )
+    logger.debug("Fetched and extracted '%s' to '%s'.", url, dest)
+
+
+def _fetch_stream_extract(  # pylint: disable=too-many-arguments
+    url: str,
+    dest: Path,
+    compress_type: str,
+    overwrite: bool,
+    cache: Path | None,
+    sha256: str | None,
+    use_cache: bool,
+) -> None:
+    """Download a tarball and extract it to a staging directory, which
+    replaces destination after the download is completed and verified.
+
+    Args:
+        url (str): The URL of the tarball.
+        dest (Path): Destination directory.
+        compress_type (str): A key of `STREAM_TAR_TYPES`.
+        overwrite (bool): Overwrite destination if it exists.
+        cache (Path | None): Also save the tarball to this file.
+        sha256 (str | None): The expected SHA-256 of the tarball.
+        use_cache (bool): Fill the user's download cache.
+    """
+
+    if not overwrite:
+        check_file_exists(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{dest.name}.", dir=dest.parent))
+    if use_cache:
+        part = download_cache.new_temp_file()
+    else:
+        part = cache.with_name(f"{cache.name}.part") if cache else None
+    try:
+        headers = _stream_extract(
+            url,
+            staging / "out",
+            compress_type,
+            part,
+            sha256,
+        )
+        if dest.is_dir() and not dest.is_symlink():
+            shutil.rmtree(dest)
+        elif dest.exists() or dest.is_symlink():
+            dest.unlink()
+        os.replace(staging / "out", dest)
+        if use_cache:
+            cached = download_cache.store(url, part, headers)
+            if cache:
+                shutil.copyfile(cached, cache)
+        elif part:
+            os.replace(part, cache)
+    except (requests.RequestException, RUValueException):
+        raise
+    except (tarfile.TarError, lzma.LZMAError, EOFError, OSError) as exc:
+        logger.exception("Failed to extract '%s' to '%s'.", url, dest)
+        raise RUValueException(
+            format_str(
+                _("Failed to extract '${{file}}' to '${{dest}}': '${{exc}}'"),
+                fmt={"file": url, "dest": dest, "exc": str(exc)},
+            )
+        ) from exc
+    finally:
+        if part and part.exists():
+            part.unlink()
+        shutil.rmtree(staging, ignore_errors=True)
 
 
 if __name__ == "__main__":
@@ -137,5 +747,168 @@ if __name__ == "__main__":
     kt = _TestKTrigger()
     bind_ktrigger_interface("test", kt)
 
+    import functools
+    import io
+
+    from rubisco.lib.testserver import (QuietHTTPRequestHandler,
+                                        start_test_server)
+
+    class _RangeHandler(QuietHTTPRequestHandler):
+        """A file handler which supports single Range requests."""
+
+        limit: int | None = None  # Drop the connection after bytes sent.
+        ranges: list[str] = []
+
+        def send_head(self):
+            path = Path(self.translate_path(self.path))
+            if not path.is_file():
+                return super().send_head()
+            size = path.stat().st_size
+            start, end = 0, size - 1
+            range_header = self.headers.get("Range")
+            if range_header:
+                self.ranges.append(range_header)
+                first, last = range_header.removeprefix("bytes=").split("-")
+                start, end = int(first), int(last or size - 1)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")  # noqa: E501
+            else:
+                self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", f'"{size}"')
+            self.end_headers()
+            limit = end - start + 1
+            if range_header and self.limit is not None:
+                limit = min(limit, self.limit)
+            with path.open("rb") as file:
+                file.seek(start)
+                return io.BytesIO(file.read(limit))
+
+        def copyfile(self, source, outputfile) -> None:
+            shutil.copyfileobj(source, outputfile)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = Path(temp_dir)
+        download_cache.root = root / "download-cache"
+        server = start_test_server(
+            functools.partial(_RangeHandler, directory=str(root)),
+        )
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            # Test: Segmented download.
+            data_ = os.urandom(DOWNLOAD_SEGMENT_MIN_SIZE + 12345)
+            (root / "data.bin").write_bytes(data_)
+            wget(
+                f"{base_url}/data.bin",
+                root / "data1.bin",
+                segments=4,
+                use_cache=False,
+            )
+            assert (root / "data1.bin").read_bytes() == data_
+            assert len(_RangeHandler.ranges) == 4
+            assert not _part_file(root / "data1.bin").exists()
+
+            # Test: Resume an interrupted segmented download.
+            _RangeHandler.ranges.clear()
+            _RangeHandler.limit = 100000
+            try:
+                wget(
+                    f"{base_url}/data.bin",
+                    root / "data2.bin",
+                    segments=4,
+                    use_cache=False,
+                )
+                raise AssertionError("Download should be interrupted.")
+            except (requests.RequestException, RUValueException):
+                pass
+            assert _state_file(root / "data2.bin").exists()
+            _RangeHandler.ranges.clear()
+            _RangeHandler.limit = None
+            wget(
+                f"{base_url}/data.bin",
+                root / "data2.bin",
+                segments=4,
+                use_cache=False,
+            )
+            assert (root / "data2.bin").read_bytes() == data_
+            resumed_size = 0
+            for range_ in _RangeHandler.ranges:
+                first_, last_ = range_.removeprefix("bytes=").split("-")
+                resumed_size += int(last_) - int(first_) + 1
+            assert resumed_size < len(data_), _RangeHandler.ranges
+            assert not _state_file(root / "data2.bin").exists()
+
+            # Test: Fetch and extract a tarball.
+            with tarfile.open(root / "test.tar.gz", "w:gz") as tar:
+                for i in range(10):
+                    info = tarfile.TarInfo(f"test/file{i}.txt")
+                    content = os.urandom(i * 100000)
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+            fetch_extract(
+                f"{base_url}/test.tar.gz",
+                root / "out",
+                cache=root / "cache.tar.gz",
+            )
+            assert (root / "cache.tar.gz").read_bytes() == (
+                root / "test.tar.gz"
+            ).read_bytes()
+            with tarfile.open(root / "test.tar.gz") as tar:
+                for member in tar:
+                    assert (root / "out" / member.name).read_bytes() == (
+                        tar.extractfile(member).read()
+                    )
+
+            # Test: A streamed tarball is only moved to the destination if
+            # its SHA-256 matches, even if it is not cached.
+            tar_sha = hashlib.sha256(
+                (root / "test.tar.gz").read_bytes(),
+            ).hexdigest()
+            try:
+                fetch_extract(
+                    f"{base_url}/test.tar.gz",
+                    root / "bad",
+                    sha256="0" * 64,
+                    use_cache=False,
+                )
+                raise AssertionError("SHA-256 mismatch should be raised.")
+            except RUValueException:
+                pass
+            assert not (root / "bad").exists()
+            assert [path.name for path in root.glob(".bad.*")] == []
+            fetch_extract(
+                f"{base_url}/test.tar.gz",
+                root / "good",
+                sha256=tar_sha,
+                use_cache=False,
+            )
+            assert (root / "good" / "test" / "file9.txt").is_file()
+
+            # Test: A streamed tarball cannot write outside the destination.
+            with tarfile.open(root / "evil.tar.gz", "w:gz") as tar:
+                info = tarfile.TarInfo("../escaped.txt")
+                info.size = 7
+                tar.addfile(info, io.BytesIO(b"escaped"))
+            try:
+                fetch_extract(f"{base_url}/evil.tar.gz", root / "evil" / "out")
+                raise AssertionError("'../' member should be rejected.")
+            except RUValueException:
+                pass
+            assert not (root / "evil" / "escaped.txt").exists()
+
+            # Test: Cached download with SHA-256 verification.
+            sha = hashlib.sha256(data_).hexdigest()
+            wget(f"{base_url}/data.bin", root / "data3.bin", sha256=sha)
+            assert download_cache.lookup(f"{base_url}/data.bin") is not None
+        finally:
+            server.shutdown()
+
+        # Test: The cache works offline.
+        wget(f"{base_url}/data.bin", root / "data4.bin", sha256=sha)
+        assert (root / "data4.bin").read_bytes() == data_
+        fetch_extract(f"{base_url}/test.tar.gz", root / "out2")
+        assert (root / "out2" / "test" / "file9.txt").is_file()
+
     wget(URL, TARGET)
     rm_recursive(TARGET)
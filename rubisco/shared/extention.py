@@ -22,21 +22,43 @@
 Rubisco extentions interface.
 """
 
+import json
+import os
+import py_compile
+import sys
+import tempfile
+import threading
+import zipfile
 from pathlib import Path
 
-from rubisco.config import (GLOBAL_EXTENTIONS_DIR, USER_EXTENTIONS_DIR,
+from rubisco.config import (DEFAULT_CHARSET, GLOBAL_EXTENTIONS_DIR,
+                            USER_EXTENTIONS_DIR, USER_EXTENTIONS_INDEX_FILE,
                             WORKSPACE_EXTENTIONS_DIR)
-from rubisco.kernel.workflow import Step, _set_extloader, register_step_type
+from rubisco.kernel.workflow import (Step, _set_extloader,
+                                     register_lazy_step_type,
+                                     register_step_type)
 from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.jsonfile import load_json5, loads_json5
 from rubisco.lib.l10n import _
-from rubisco.lib.load_module import import_module_from_path
+from rubisco.lib.load_module import BUNDLE_SUFFIX, import_module_from_path
 from rubisco.lib.log import logger
-from rubisco.lib.variable import format_str, make_pretty
+from rubisco.lib.variable import AutoFormatDict, format_str, make_pretty
 from rubisco.lib.version import Version
 from rubisco.shared.ktrigger import (IKernelTrigger, bind_ktrigger_interface,
-                                     call_ktrigger)
+                                     call_ktrigger, register_lazy_ktrigger)
 
-__all__ = ["IRUExtention"]
+__all__ = ["IRUExtention", "compile_extention"]
+
+# The optional extention manifest. An extention with a manifest is not
+# imported until one of its step types or KTriggers is used, unless it sets
+# "lazy" to false. Extentions without a manifest are imported at startup:
+#   {
+#       "name": "cmake",
+#       "steps": {"cmake": ["cmake"]},  # Step type -> contributes.
+#       "ktriggers": ["on_xxx"],  # KTriggers it needs to receive.
+#       "lazy": true  # Optional. Defaults to true.
+#   }
+EXTENTION_MANIFEST = "extention.json"
 
 
 class IRUExtention:
@@ -115,34 +137,95 @@ class IRUExtention:
 
 invalid_ext_names = ["rubisco"]  # Avoid logger's name conflict.
 
+# Paths of the loaded extentions.
+loaded_extentions: set[Path] = set()
+
+
+def _is_bundle(path: Path) -> bool:
+    return path.suffix == BUNDLE_SUFFIX and path.is_file()
+
+
+def _find_extention(name: str) -> Path | None:
+    """Find an extention by its name in the default extention directories.
+
+    Args:
+        name (str): The extention name.
+
+    Returns:
+        Path | None: The extention directory or bundle.
+    """
+
+    for ext_dir in [
+        WORKSPACE_EXTENTIONS_DIR,
+        USER_EXTENTIONS_DIR,
+        GLOBAL_EXTENTIONS_DIR,
+    ]:
+        if (ext_dir / name).is_dir():
+            return ext_dir / name
+        if _is_bundle(ext_dir / f"{name}{BUNDLE_SUFFIX}"):
+            return ext_dir / f"{name}{BUNDLE_SUFFIX}"
+    return None
+
+
+def _check_bundle(path: Path) -> None:
+    """Check if a bundle is compiled for this Python.
+
+    Args:
+        path (Path): The bundle path.
+
+    Raises:
+        RUValueException: If the bundle is compiled for another Python.
+    """
+
+    entry = _read_manifest(path) or {}
+    if entry.get("python") != sys.implementation.cache_tag:
+        raise RUValueException(
+            format_str(
+                _(
+                    "The extention bundle '[underline]${{path}}[/underline]'"
+                    " is compiled for '${{python}}', but this is "
+                    "'${{current}}'."
+                ),
+                fmt={
+                    "path": make_pretty(path.absolute()),
+                    "python": str(entry.get("python")),
+                    "current": sys.implementation.cache_tag,
+                },
+            ),
+            hint=_("Please recompile it by 'rubisco ext compile'."),
+        )
+
 
 # A basic extention contains these modules or variables:
 #   - extention/        directory    ---- The extention directory.
 #       - __init__.py   file         ---- The extention module.
 #           - instance  IRUExtention ---- The extention instance
+# Or a bundle compiled by `compile_extention`:
+#   - extention.rbz     file         ---- The extention bundle.
+#       - extention.json  file       ---- The manifest.
+#       - extention/    directory    ---- The precompiled extention.
 def load_extention(  # pylint: disable=too-many-branches
     path: Path | str,
     strict: bool = False,
-) -> None:
+) -> IRUExtention | None:
     """Load the extention.
 
     Args:
-        path (Path | str): The path of the extention or it's name.
-            If the path is a name, the extention will be loaded from the
-            default extention directory.
+        path (Path | str): The path of the extention (or its bundle) or
+            it's name. If the path is a name, the extention will be loaded
+            from the default extention directory.
         strict (bool, optional): If True, raise an exception if the extention
             loading failed.
+
+    Returns:
+        IRUExtention | None: The extention instance, even if it can not be
+            loaded now. None if it is failed to import or already loaded.
     """
 
     try:
         if isinstance(path, str):
-            if (WORKSPACE_EXTENTIONS_DIR / path).is_dir():
-                path = GLOBAL_EXTENTIONS_DIR / path
-            elif (USER_EXTENTIONS_DIR / path).is_dir():
-                path = USER_EXTENTIONS_DIR / path
-            elif (GLOBAL_EXTENTIONS_DIR / path).is_dir():
-                path = WORKSPACE_EXTENTIONS_DIR / path
-            else:
+            ext_path = _find_extention(path)
+            if ext_path is None:
                 raise RUValueException(
                     format_str(
                         _(
@@ -155,8 +238,11 @@ def load_extention(  # pylint: disable=too-many-branches
                         _("Try to load the extention as a path."),
                     ),
                 )
+            path = ext_path
 
-        if not path.is_dir():
+        if _is_bundle(path):
+            _check_bundle(path)
+        elif not path.is_dir():
             raise RUValueException(
                 format_str(
                     _(
@@ -167,6 +253,10 @@ def load_extention(  # pylint: disable=too-many-branches
                 ),
             )
 
+        if path.resolve() in loaded_extentions:
+            return None
+        loaded_extentions.add(path.resolve())
+
         # Load the extention.
 
         try:
@@ -233,7 +323,7 @@ def load_extention(  # pylint: disable=too-many-branches
         # Check if the extention can load now.
         if not instance.extention_can_load_now():
             logger.info("Skipping extention '%s'...", instance.name)
-            return
+            return instance
 
         # Load the extention.
         if not instance.reqs_is_sloved():
@@ -247,10 +337,10 @@ def load_extention(  # pylint: disable=too-many-branches
                     "Failed to solve system requirements for extention '%s'.",
                     instance.name,
                 )
-                return
+                return instance
 
         # Register the workflow steps.
-        for step_name, step in instance.workflow_steps:
+        for step_name, step in instance.workflow_steps.items():
             contributions = []
             if step in instance.steps_contributions:
                 contributions = instance.steps_contributions[step]
@@ -263,6 +353,7 @@ def load_extention(  # pylint: disable=too-many-branches
         )
         call_ktrigger(IKernelTrigger.on_extention_loaded, instance=instance)
         logger.info("Loaded extention '%s'.", instance.name)
+        return instance
     except Exception as exc:  # pylint: disable=broad-except
         if strict:
             raise exc from None
@@ -274,37 +365,538 @@ def load_extention(  # pylint: disable=too-many-branches
                 fmt={"name": make_pretty(path.absolute()), "exc": str(exc)},
             ),
         )
+        return None
 
 
-def load_all_extentions() -> None:
-    """Load all extentions."""
+def _extention_signature(path: Path) -> str:
+    """Get the signature of an extention. It changes if its bundle or its
+    manifest is modified. Only one file is stat'ed, so discovering the
+    indexed extentions is cheap.
+
+    Args:
+        path (Path): The extention directory or bundle.
 
-    # TODO: Refactor.  # pylint: disable=fixme # I don't want to fix you.
-    # It is not a good idea to load all extentions at once.
+    Returns:
+        str: The signature.
+    """
 
-    # Load the workspace extentions.
+    file = path if path.is_file() else path / EXTENTION_MANIFEST
     try:
-        for path in WORKSPACE_EXTENTIONS_DIR.iterdir():
-            if path.is_dir():
-                load_extention(path)
-    except OSError as exc:
-        logger.warning("Failed to load workspace extentions: %s", exc)
+        stat = file.stat()
+    except FileNotFoundError:  # No manifest, use the directory itself.
+        stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ExtentionIndex:
+    """
+    Persistent index of the installed extentions. Every entry has the name,
+    version, step types (with their contributes) and KTriggers of an
+    extention, and the signature of its manifest or bundle.
+    """
+
+    path: Path
+    _entries: dict[str, dict] | None
+    _dirty: bool
+    _lock: threading.RLock
+
+    def __init__(self, path: Path) -> None:
+        """Create an extention index.
+
+        Args:
+            path (Path): The index file. It will be loaded lazily.
+        """
+
+        self.path = path
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with self.path.open("r", encoding=DEFAULT_CHARSET) as f:
+                    entries = json.load(f)
+                if isinstance(entries, dict):
+                    self._entries = entries
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError):
+                logger.warning("Invalid extention index.", exc_info=True)
+        return self._entries
+
+    def get(self, path: Path, signature: str) -> dict | None:
+        """Get the entry of an extention.
+
+        Args:
+            path (Path): The extention directory.
+            signature (str): The current signature of the directory.
+
+        Returns:
+            dict | None: The entry. None if it is not indexed or outdated.
+        """
+
+        with self._lock:
+            entry = self._load().get(str(path.absolute()))
+        if entry is None or entry.get("signature") != signature:
+            return None
+        return entry
+
+    def set(self, path: Path, signature: str, entry: dict) -> None:
+        """Set the entry of an extention.
+
+        Args:
+            path (Path): The extention directory.
+            signature (str): The signature of the directory.
+            entry (dict): The entry.
+        """
+
+        with self._lock:
+            self._load()[str(path.absolute())] = {
+                **entry,
+                "signature": signature,
+            }
+            self._dirty = True
+
+    def retain(self, paths: list[Path]) -> None:
+        """Remove the entries of the extentions which are not in `paths`.
+
+        Args:
+            paths (list[Path]): The extention directories to keep.
+        """
+
+        keep = {str(path.absolute()) for path in paths}
+        with self._lock:
+            entries = self._load()
+            for key in set(entries) - keep:
+                del entries[key]
+                self._dirty = True
+
+    def entries(self) -> dict[str, dict]:
+        """Get all entries.
+
+        Returns:
+            dict[str, dict]: Extention directory -> entry.
+        """
+
+        with self._lock:
+            return dict(self._load())
+
+    def save(self) -> None:
+        """Save the index atomically if it is changed."""
+
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = self.path.with_name(
+                    f"{self.path.name}.{os.getpid()}.tmp",
+                )
+                with temp_file.open("w", encoding=DEFAULT_CHARSET) as f:
+                    json.dump(self._entries, f)
+                os.replace(temp_file, self.path)
+                self._dirty = False
+            except OSError:
+                logger.warning(
+                    "Failed to save extention index: %s",
+                    str(self.path),
+                    exc_info=True,
+                )
+
+
+extention_index = ExtentionIndex(USER_EXTENTIONS_INDEX_FILE)
+
+
+def _read_manifest(path: Path) -> dict | None:
+    """Read the manifest of an extention.
+
+    Args:
+        path (Path): The extention directory.
+
+    Returns:
+        dict | None: The index entry. None if it has no valid manifest.
+    """
 
-    # Load the user extentions.
     try:
-        for path in USER_EXTENTIONS_DIR.iterdir():
-            if path.is_dir():
-                load_extention(path)
-    except OSError as exc:
-        logger.warning("Failed to load user extentions: %s", exc)
+        if _is_bundle(path):
+            with zipfile.ZipFile(path) as bundle:
+                manifest = AutoFormatDict(
+                    loads_json5(
+                        bundle.read(EXTENTION_MANIFEST).decode(DEFAULT_CHARSET)
+                    )
+                )
+        else:
+            with (path / EXTENTION_MANIFEST).open(
+                "r",
+                encoding=DEFAULT_CHARSET,
+            ) as f:
+                manifest = AutoFormatDict(load_json5(f))
+        entry = {
+            "name": manifest.get("name", path.name, valtype=str),
+            "version": manifest.get("version", "0.0.0", valtype=str),
+            "steps": {
+                str(name): [str(item) for item in contributes]
+                for name, contributes in manifest.get(
+                    "steps",
+                    {},
+                    valtype=dict,
+                ).items()
+            },
+            "ktriggers": [
+                str(name)
+                for name in manifest.get("ktriggers", [], valtype=list)
+            ],
+            "lazy": manifest.get("lazy", True, valtype=bool),
+        }
+        if "python" in manifest:  # The bytecode version of a bundle.
+            entry["python"] = manifest.get("python", valtype=str)
+        return entry
+    except (FileNotFoundError, KeyError):
+        return None
+    except (
+        OSError,
+        ValueError,
+        zipfile.BadZipFile,
+        RUValueException,
+    ) as exc:
+        logger.warning("Invalid extention manifest in '%s': %s", path, exc)
+        return None
+
+
+def _index_entry(instance: IRUExtention) -> dict:
+    """Make the index entry of a imported extention. It is not lazy,
+    because the extention may have side effects when it is loaded.
+
+    Args:
+        instance (IRUExtention): The extention instance.
+
+    Returns:
+        dict: The index entry.
+    """
+
+    ktrigger = getattr(instance, "ktrigger", None)
+    ktriggers: set[str] = set()
+    if isinstance(ktrigger, IKernelTrigger):
+        for cls in type(ktrigger).__mro__:  # Methods defined by the subclass.
+            if cls is IKernelTrigger:
+                break
+            ktriggers.update(
+                name
+                for name, value in vars(cls).items()
+                if callable(value) and not name.startswith("_")
+            )
+
+    return {
+        "name": str(instance.name),
+        "version": str(instance.version),
+        "steps": {
+            name: list(instance.steps_contributions.get(step, []))
+            for name, step in instance.workflow_steps.items()
+        },
+        "ktriggers": sorted(ktriggers),
+        "lazy": False,
+    }
+
+
+def _register_lazy_extention(path: Path, entry: dict) -> None:
+    """Register the step types and KTriggers of an extention.
+    The extention will be loaded when one of them is used.
+
+    Args:
+        path (Path): The extention directory.
+        entry (dict): The index entry of the extention.
+    """
+
+    def _loader() -> None:
+        load_extention(path)
+
+    for step_name, contributes in entry["steps"].items():
+        register_lazy_step_type(step_name, contributes, _loader)
+    for trigger in entry["ktriggers"]:
+        register_lazy_ktrigger(trigger, _loader)
+    logger.info("Extention '%s' will be loaded on demand.", path)
+
+
+def _discover_extention(path: Path) -> None:
+    """Register an extention lazily if its manifest allows it, or load it.
+    Extentions are indexed either way, so they can be listed.
+
+    Args:
+        path (Path): The extention directory or bundle.
+    """
 
-    # Load the global extentions.
     try:
-        for path in GLOBAL_EXTENTIONS_DIR.iterdir():
-            if path.is_dir():
-                load_extention(path)
+        signature = _extention_signature(path)
     except OSError as exc:
-        logger.warning("Failed to load global extentions: %s", exc)
+        logger.warning("Failed to index extention %s: %s", path, exc)
+        return
+
+    entry = extention_index.get(path, signature)
+    if entry is None:
+        entry = _read_manifest(path)
+        if entry is not None:
+            extention_index.set(path, signature, entry)
+    if entry is not None and entry.get("lazy", False):
+        _register_lazy_extention(path, entry)
+        return
+
+    instance = load_extention(path)
+    if entry is None and instance is not None:
+        extention_index.set(path, signature, _index_entry(instance))
+
+
+def load_all_extentions() -> None:
+    """Load all extentions.
+
+    Extentions with a lazy manifest are discovered by the extention index,
+    or by reading their manifest if they are not indexed or changed. They
+    are only registered, and they will be loaded when they are used. The
+    other extentions are imported now, and indexed to be listed.
+    """
+
+    paths: list[Path] = []
+    for ext_dir in [
+        WORKSPACE_EXTENTIONS_DIR,
+        USER_EXTENTIONS_DIR,
+        GLOBAL_EXTENTIONS_DIR,
+    ]:
+        try:
+            paths.extend(
+                path
+                for path in ext_dir.iterdir()
+                if path.is_dir() or _is_bundle(path)
+            )
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning("Failed to load extentions in %s: %s", ext_dir, exc)
+
+    for path in paths:
+        _discover_extention(path)
+
+    extention_index.retain(paths)
+    extention_index.save()
+
+
+def compile_extention(src: Path, dest: Path) -> Path:
+    """Compile an extention directory to a bundle. The bundle contains the
+    manifest and the bytecode of the extention, so it can be loaded without
+    compiling or writing anything.
+
+    Args:
+        src (Path): The extention directory.
+        dest (Path): The bundle path. Its stem is the package name.
+
+    Returns:
+        Path: The bundle path.
+    """
+
+    if dest.suffix != BUNDLE_SUFFIX:
+        dest = dest.with_name(dest.name + BUNDLE_SUFFIX)
+    if not (src / "__init__.py").is_file():
+        raise RUValueException(
+            format_str(
+                _(
+                    "The extention path '[underline]${{path}}[/underline]'"
+                    " is not a valid extention."
+                ),
+                fmt={"path": make_pretty(src.absolute())},
+            ),
+        )
+
+    entry = _read_manifest(src)
+    if entry is None:
+        entry = _index_entry(import_module_from_path(src).instance)
+    entry["python"] = sys.implementation.cache_tag
+    name = dest.stem
+
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    with tempfile.TemporaryDirectory() as temp, zipfile.ZipFile(
+        temp_file,
+        "w",
+        zipfile.ZIP_DEFLATED,
+    ) as bundle:
+        bundle.writestr(EXTENTION_MANIFEST, json.dumps(entry))
+        for root, dirs, files in os.walk(src):
+            dirs[:] = sorted(name_ for name_ in dirs if name_ != "__pycache__")
+            for file_name in sorted(files):
+                file = Path(root) / file_name
+                arcname = f"{name}/{file.relative_to(src).as_posix()}"
+                if file.suffix == ".py":
+                    cfile = Path(temp) / "module.pyc"
+                    py_compile.compile(
+                        str(file),
+                        str(cfile),
+                        arcname,
+                        doraise=True,
+                        invalidation_mode=(
+                            py_compile.PycInvalidationMode.UNCHECKED_HASH
+                        ),
+                    )
+                    bundle.write(cfile, arcname + "c")
+                elif file.suffix != ".pyc" and (
+                    file != src / EXTENTION_MANIFEST
+                ):
+                    bundle.write(file, arcname)  # Data files.
+    os.replace(temp_file, dest)
+
+    return dest
 
 
 _set_extloader(load_extention)  # Avoid circular import.
+
+
+if __name__ == "__main__":
+    import rich
+
+    from rubisco.kernel.workflow import \
+        run_inline_workflow  # pylint: disable=ungrouped-imports
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    with tempfile.TemporaryDirectory() as temp_:
+        ext_path_ = Path(temp_) / "hello"
+        ext_path_.mkdir()
+        (ext_path_ / "__init__.py").write_text(
+            """
+from pathlib import Path
+
+from rubisco.kernel.workflow import Step
+from rubisco.shared.extention import IRUExtention
+from rubisco.shared.ktrigger import IKernelTrigger
+from rubisco.lib.version import Version
+
+LOG = Path(__file__).parent / "log.txt"
+
+
+def greet(msg):
+    with LOG.open("a") as f:
+        f.write(msg + "\\n")
+
+
+class HelloStep(Step):
+    def init(self):
+        self.who = self.raw_data.get("hello", valtype=str)
+
+    def run(self):
+        greet(self.who)
+
+
+class HelloKTrigger(IKernelTrigger):
+    def on_hello(self, who):
+        greet("ktrigger " + who)
+
+
+class HelloExtention(IRUExtention):
+    name = "hello"
+    description = "Hello"
+    version = Version("0.1.0")
+
+    def __init__(self):
+        super().__init__()
+        self.ktrigger = HelloKTrigger()
+        self.workflow_steps = {"hello": HelloStep}
+        self.steps_contributions = {HelloStep: ["hello"]}
+
+    def extention_can_load_now(self):
+        return True
+
+    def on_load(self):
+        pass
+
+    def reqs_is_sloved(self):
+        return True
+
+    def reqs_solve(self):
+        pass
+
+
+instance = HelloExtention()
+""",
+            encoding=DEFAULT_CHARSET,
+        )
+        (ext_path_ / EXTENTION_MANIFEST).write_text(
+            '{"name": "hello", "steps": {"hello": ["hello"]},'
+            ' "ktriggers": ["on_hello"]}',
+            encoding=DEFAULT_CHARSET,
+        )
+
+        # Test: The extention is not imported until it is used.
+        _register_lazy_extention(ext_path_, _read_manifest(ext_path_))
+        assert not loaded_extentions
+        assert not (ext_path_ / "log.txt").exists()
+
+        # Test: Load the extention by a inferred step type.
+        run_inline_workflow([{"hello": "world"}])
+        assert loaded_extentions == {ext_path_.resolve()}
+        log_ = ext_path_ / "log.txt"
+        assert log_.read_text(encoding=DEFAULT_CHARSET) == "world\n"
+
+        # Test: Loaded extentions are not loaded again.
+        load_extention(ext_path_, strict=True)
+        call_ktrigger("on_hello", who="world")
+        assert log_.read_text(encoding=DEFAULT_CHARSET) == (
+            "world\nktrigger world\n"
+        )
+
+        # Test: Index the extention by importing it.
+        entry_ = _index_entry(import_module_from_path(ext_path_).instance)
+        assert entry_ == {
+            **_read_manifest(ext_path_),
+            "version": "0.1.0",
+            "lazy": False,
+        }
+        index = ExtentionIndex(Path(temp_) / "index.json")
+        signature_ = _extention_signature(ext_path_)
+        index.set(ext_path_, signature_, entry_)
+        index.save()
+        index = ExtentionIndex(Path(temp_) / "index.json")
+        assert index.get(ext_path_, signature_)["steps"] == {
+            "hello": ["hello"],
+        }
+
+        # Test: The index entry is outdated if the manifest is changed.
+        os.utime(ext_path_ / EXTENTION_MANIFEST, ns=(0, 0))
+        assert index.get(ext_path_, _extention_signature(ext_path_)) is None
+        index.retain([])
+        assert not index.entries()
+
+        # Test: Compile the extention to a bundle and import it.
+        bundle_ = compile_extention(ext_path_, Path(temp_) / "hello_bundle")
+        assert bundle_.name == "hello_bundle.rbz"
+        _check_bundle(bundle_)
+        assert _read_manifest(bundle_)["steps"] == {"hello": ["hello"]}
+        assert import_module_from_path(bundle_).instance.name == "hello"
+        with zipfile.ZipFile(bundle_) as zf:
+            assert "hello_bundle/__init__.pyc" in zf.namelist()
+            assert "hello_bundle/log.txt" in zf.namelist()
+
+        # Test: Extentions without a lazy manifest are loaded at startup.
+        extention_index.path = Path(temp_) / "startup-index.json"
+        for name_, manifest_ in [("eager", None), ("not_lazy", False)]:
+            eager_path = Path(temp_) / name_
+            eager_path.mkdir()
+            (eager_path / "__init__.py").write_text(
+                (ext_path_ / "__init__.py")
+                .read_text(encoding=DEFAULT_CHARSET)
+                .replace('"hello"', f'"{name_}"')
+                .replace("pass\n\n    def reqs_is", "greet('loaded')\n\n"
+                         "    def reqs_is"),
+                encoding=DEFAULT_CHARSET,
+            )
+            if manifest_ is not None:
+                (eager_path / EXTENTION_MANIFEST).write_text(
+                    json.dumps({"name": name_, "lazy": manifest_}),
+                    encoding=DEFAULT_CHARSET,
+                )
+            for _run in range(2):  # Also when the extention is indexed.
+                loaded_extentions.discard(eager_path.resolve())
+                _discover_extention(eager_path)
+                assert eager_path.resolve() in loaded_extentions
+            assert (eager_path / "log.txt").read_text(
+                encoding=DEFAULT_CHARSET,
+            ) == "loaded\nloaded\n"
+            assert str(eager_path.absolute()) in extention_index.entries()
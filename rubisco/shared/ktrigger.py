@@ -24,10 +24,16 @@ Kernel trigger is called when kernel do something. It makes User Control
 Interface can do something before or after kernel operations.
 """
 
+import atexit
+import logging
+import queue
+import threading
+import time
 from functools import partial
 from pathlib import Path
 from typing import Any, Callable
 
+from rubisco.config import KTRIGGER_QUEUE_SIZE, PROGRESS_REFRESH_RATE
 from rubisco.lib.exceptions import RUValueException
 from rubisco.lib.l10n import _
 from rubisco.lib.log import logger
@@ -35,8 +41,13 @@ from rubisco.lib.variable import format_str, make_pretty
 
 __all__ = [
     "IKernelTrigger",
+    "ProgressAggregator",
     "bind_ktrigger_interface",
     "call_ktrigger",
+    "flush_ktriggers",
+    "ktrigger_time",
+    "register_lazy_ktrigger",
+    "set_async_dispatch",
 ]
 
 
@@ -57,6 +68,28 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
     TASK_DOWNLOAD = "download"
     TASK_EXTRACT = "extract"
     TASK_COMPRESS = "compress"
+    TASK_SYNC = "sync"
+
+    # KTriggers which only report something. They can be dispatched on the
+    # UI thread in asynchronous mode. The others are always synchronous.
+    ASYNC_KTRIGGERS = frozenset(
+        [
+            "on_new_task",
+            "on_progress",
+            "set_progress_total",
+            "on_finish_task",
+            "on_warning",
+            "pre_speedtest",
+            "post_speedtest",
+            "on_skip_workflow_step",
+            "on_mkdir",
+            "on_output",
+            "on_move_file",
+            "on_copy",
+            "on_remove",
+            "on_mklink",
+        ]
+    )
 
     def pre_exec_process(self, proc: Any) -> None:
         """Pre-exec process.
@@ -72,6 +105,7 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
         proc: Any,
         retcode: int,
         raise_exc: bool,
+        usage: Any = None,
     ) -> None:
         """Post-exec process.
 
@@ -79,6 +113,8 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
             proc (Process): Process instance.
             retcode (int): Return code.
             raise_exc (bool): If raise exception.
+            usage (ProcessUsage | None, optional): The resource usage of the
+                process. Defaults to None.
         """
 
         _null_trigger(
@@ -86,6 +122,7 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
             proc=proc,
             retcode=retcode,
             raise_exc=raise_exc,
+            usage=usage,
         )
 
     def file_exists(self, path: Path) -> None:
@@ -126,12 +163,17 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
         more_data: dict[str, Any] | None = None,
     ):
         """When the progressive task progress is updated.
+        Progress events are coalesced and dispatched at a bounded rate.
 
         Args:
             task_name (str): Task name.
             current (int | float): Current step.
             delta (bool): If the current is delta.
             more_data (dict[str, Any] | None): More data of the progress.
+                It is the latest one if some events are coalesced, and all
+                of them are in its "merged" list. An extraction sends the
+                "path" and "dest" of the member, and "members", the number
+                of members, if it is known.
         """
 
         _null_trigger(
@@ -274,6 +316,15 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
 
         _null_trigger("post_run_workflow_step", step=step)
 
+    def on_skip_workflow_step(self, step: Any) -> None:
+        """When a step is skipped because it is up to date.
+
+        Args:
+            step (Step): The step.
+        """
+
+        _null_trigger("on_skip_workflow_step", step=step)
+
     def pre_run_workflow(self, workflow: Any) -> None:
         """When a workflow is started.
 
@@ -292,6 +343,24 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
 
         _null_trigger("post_run_workflow", workflow=workflow)
 
+    def pre_run_hook(self, hook: Any) -> None:
+        """When a project hook is started.
+
+        Args:
+            hook (ProjectHook): The hook.
+        """
+
+        _null_trigger("pre_run_hook", hook=hook)
+
+    def post_run_hook(self, hook: Any) -> None:
+        """When a project hook is finished, even if it failed.
+
+        Args:
+            hook (ProjectHook): The hook.
+        """
+
+        _null_trigger("post_run_hook", hook=hook)
+
     def on_mkdir(self, path: Path) -> None:
         """On we are creating directories.
 
@@ -372,6 +441,12 @@ class IKernelTrigger:  # pylint: disable=too-many-public-methods
 # KTrigger instances.
 ktriggers: dict[str, IKernelTrigger] = {}
 
+# Bound methods of every KTrigger's name. Cleared when a KTrigger is bound.
+_bound_ktriggers: dict[str, list[Callable]] = {}
+
+# Loaders of the unloaded extentions. KTrigger's name -> loaders.
+lazy_ktriggers: dict[str, list[Callable[[], None]]] = {}
+
 
 def bind_ktrigger_interface(kid: str, instance: IKernelTrigger) -> None:
     """Bind a KTrigger instance with a id.
@@ -402,9 +477,300 @@ def bind_ktrigger_interface(kid: str, instance: IKernelTrigger) -> None:
         )
 
     ktriggers[kid] = instance
+    _bound_ktriggers.clear()
     logger.debug("Bind kernel trigger '%s' to '%s'.", kid, repr(instance))
 
 
+def register_lazy_ktrigger(name: str, loader: Callable[[], None]) -> None:
+    """Call a loader before a KTrigger is called for the first time.
+    It is used by the extentions which are not loaded yet.
+
+    Args:
+        name (str): KTrigger's name.
+        loader (Callable[[], None]): The extention loader. It should bind
+            the KTrigger instance by `bind_ktrigger_interface`.
+    """
+
+    lazy_ktriggers.setdefault(name, []).append(loader)
+
+
+# The call time of the queued KTrigger being dispatched on this thread.
+_dispatch_time = threading.local()
+
+
+def ktrigger_time() -> tuple[float, float]:
+    """Get the time when the KTrigger being dispatched was called.
+    A queued KTrigger is dispatched later on the UI thread, so its
+    implementations should use this time instead of the current time.
+
+    Returns:
+        tuple[float, float]: The wall time (`time.time()`) and the
+            monotonic time (`time.monotonic()`). The current time if the
+            KTrigger is not queued.
+    """
+
+    stamp = getattr(_dispatch_time, "stamp", None)
+    if stamp is None:
+        return time.time(), time.monotonic()
+    return stamp
+
+
+def _dispatch(
+    name: str,
+    args: tuple,
+    kwargs: dict,
+    log: bool = True,
+    stamp: tuple[float, float] | None = None,
+) -> None:
+    """Call a KTrigger of all the bound instances.
+
+    Args:
+        name (str): KTrigger's name.
+        args (tuple): Arguments.
+        kwargs (dict): Keyword arguments.
+        log (bool, optional): Log the call. Defaults to True.
+        stamp (tuple[float, float] | None, optional): The call time of a
+            queued KTrigger. See `ktrigger_time()`. Defaults to None.
+    """
+
+    if stamp is not None:
+        _dispatch_time.stamp = stamp
+        try:
+            _dispatch(name, args, kwargs, log)
+        finally:
+            _dispatch_time.stamp = None
+        return
+
+    methods = _bound_ktriggers.get(name)
+    if methods is None:
+        methods = [
+            getattr(instance, name, partial(_null_trigger, name))
+            for instance in ktriggers.values()
+        ]
+        _bound_ktriggers[name] = methods
+    if log and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Calling kernel trigger '%s'(%s, %s). %s",
+            name,
+            repr(args),
+            repr(kwargs),
+            repr(list(ktriggers.keys())),
+        )
+    for method in methods:
+        method(*args, **kwargs)
+
+
+# The UI thread and its queue in asynchronous mode.
+_ui_queue: queue.Queue | None = None  # pylint: disable=invalid-name
+_ui_thread: threading.Thread | None = None  # pylint: disable=invalid-name
+
+
+def _ui_loop(ui_queue: queue.Queue) -> None:
+    while True:
+        item = ui_queue.get()
+        try:
+            if item is None:
+                return
+            try:
+                _dispatch(*item)
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Kernel trigger '%s' failed.", item[0])
+        finally:
+            ui_queue.task_done()
+
+
+def set_async_dispatch(enabled: bool) -> None:
+    """Enable or disable the asynchronous dispatch mode.
+
+    In asynchronous mode, the KTriggers in `IKernelTrigger.ASYNC_KTRIGGERS`
+    are queued to a UI thread, so slow rendering does not block the caller.
+    The caller is blocked if the queue is full. The other KTriggers are
+    dispatched on the caller's thread after the queue is drained, so the
+    order of all KTriggers is kept. Exceptions of the queued KTriggers are
+    logged only.
+
+    Args:
+        enabled (bool): Enable or disable it.
+    """
+
+    global _ui_queue, _ui_thread  # pylint: disable=global-statement
+
+    if enabled == (_ui_queue is not None):
+        return
+    if enabled:
+        _ui_queue = queue.Queue(KTRIGGER_QUEUE_SIZE)
+        _ui_thread = threading.Thread(
+            target=_ui_loop,
+            args=(_ui_queue,),
+            name="ktrigger-ui",
+            daemon=True,
+        )
+        _ui_thread.start()
+    else:
+        flush_ktriggers()
+        _ui_queue.put(None)
+        _ui_thread.join()
+        _ui_queue = _ui_thread = None
+
+
+def flush_ktriggers() -> None:
+    """Wait until all the queued KTriggers are dispatched."""
+
+    ui_queue = _ui_queue
+    if ui_queue is not None and threading.current_thread() is not _ui_thread:
+        ui_queue.join()
+
+
+atexit.register(flush_ktriggers)
+
+
+def _post(name: str, args: tuple, kwargs: dict, log: bool = True) -> None:
+    """Dispatch a KTrigger now, or queue it in asynchronous mode.
+
+    Args:
+        name (str): KTrigger's name.
+        args (tuple): Arguments.
+        kwargs (dict): Keyword arguments.
+        log (bool, optional): Log the call. Defaults to True.
+    """
+
+    ui_queue = _ui_queue
+    if ui_queue is None or threading.current_thread() is _ui_thread:
+        _dispatch(name, args, kwargs, log)
+    elif name in IKernelTrigger.ASYNC_KTRIGGERS:
+        stamp = (time.time(), time.monotonic())
+        ui_queue.put((name, args, kwargs, log, stamp))
+    else:
+        ui_queue.join()
+        _dispatch(name, args, kwargs, log)
+
+
+class ProgressAggregator:
+    """
+    Coalesce the progress events of every task, and dispatch them at most
+    `rate` times per second per task. Pending progress is dispatched before
+    the task total is changed or the task is finished. The lock is not held
+    while dispatching, because the caller may block on a full UI queue.
+    """
+
+    interval: float
+    # Task name -> [absolute, delta, more_data list, last dispatch time].
+    _tasks: dict[str, list]
+    _lock: threading.RLock
+
+    def __init__(self, rate: float) -> None:
+        """Create a progress aggregator.
+
+        Args:
+            rate (float): The max dispatch rate (Hz) of a task.
+        """
+
+        self.interval = 1 / rate
+        self._tasks = {}
+        self._lock = threading.RLock()
+
+    def update(
+        self,
+        task_name: str,
+        current: int | float,
+        delta: bool = False,
+        more_data: dict[str, Any] | None = None,
+    ) -> None:
+        """Update the progress of a task.
+
+        Args:
+            task_name (str): Task name.
+            current (int | float): Current step.
+            delta (bool): If the current is delta.
+            more_data (dict[str, Any] | None): More data of the progress.
+        """
+
+        with self._lock:
+            state = self._tasks.get(task_name)
+            if state is None:
+                state = self._tasks[task_name] = [None, 0, [], 0.0]
+            if delta:
+                state[1] += current
+            else:
+                state[0], state[1] = current, 0
+            if more_data is not None:
+                state[2].append(more_data)
+            if time.monotonic() - state[3] < self.interval:
+                return
+            event = self._take(task_name, state)
+        _post_progress(event)
+
+    def _take(self, task_name: str, state: list) -> dict[str, Any] | None:
+        """Take the pending progress of a task. Call it with the lock held.
+
+        Args:
+            task_name (str): Task name.
+            state (list): The state of the task.
+
+        Returns:
+            dict[str, Any] | None: The arguments of `on_progress`. None if
+                nothing is pending.
+        """
+
+        absolute, delta, merged, _last = state
+        state[:] = [None, 0, [], time.monotonic()]
+        if absolute is None and not delta and not merged:
+            return None
+        more_data = None
+        if merged:
+            more_data = dict(merged[-1])
+            more_data["merged"] = merged
+        return {
+            "task_name": task_name,
+            "current": delta if absolute is None else absolute + delta,
+            "delta": absolute is None,
+            "more_data": more_data,
+        }
+
+    def flush(self, task_name: str) -> None:
+        """Dispatch the pending progress of a task.
+
+        Args:
+            task_name (str): Task name.
+        """
+
+        with self._lock:
+            state = self._tasks.get(task_name)
+            event = None if state is None else self._take(task_name, state)
+        _post_progress(event)
+
+    def finish(self, task_name: str) -> None:
+        """Dispatch the pending progress of a task and forget it.
+
+        Args:
+            task_name (str): Task name.
+        """
+
+        with self._lock:
+            state = self._tasks.pop(task_name, None)
+            event = None if state is None else self._take(task_name, state)
+        _post_progress(event)
+
+
+def _post_progress(event: dict[str, Any] | None) -> None:
+    """Dispatch the progress taken by `ProgressAggregator`.
+
+    Args:
+        event (dict[str, Any] | None): The arguments of `on_progress`.
+            Nothing is dispatched if it is None.
+    """
+
+    if event is not None:
+        _post("on_progress", (), event, log=False)  # Too frequent and large.
+
+
+progress = ProgressAggregator(PROGRESS_REFRESH_RATE)
+
+
+def _task_name(args: tuple, kwargs: dict) -> str:
+    return kwargs["task_name"] if "task_name" in kwargs else args[0]
+
+
 def call_ktrigger(name: str | Callable, *args, **kwargs) -> None:
     """Call a KTrigger.
 
@@ -416,17 +782,20 @@ def call_ktrigger(name: str | Callable, *args, **kwargs) -> None:
         more readable and avoid bug caused by the wrong order of arguments.
     """
 
-    if isinstance(name, Callable):
+    if not isinstance(name, str):
         name = name.__name__
-    logger.debug(
-        "Calling kernel trigger '%s'(%s, %s). %s",
-        name,
-        repr(args),
-        repr(kwargs),
-        repr(list(ktriggers.keys())),
-    )
-    for instance in ktriggers.values():
-        getattr(instance, name, partial(_null_trigger, name))(*args, **kwargs)
+    if name in lazy_ktriggers:
+        for loader in lazy_ktriggers.pop(name):
+            loader()
+
+    if name == "on_progress":
+        progress.update(*args, **kwargs)
+        return
+    if name == "set_progress_total":
+        progress.flush(_task_name(args, kwargs))
+    elif name in ("on_new_task", "on_finish_task"):
+        progress.finish(_task_name(args, kwargs))
+    _post(name, args, kwargs)
 
 
 if __name__ == "__main__":
@@ -487,6 +856,99 @@ if __name__ == "__main__":
     # Test: Call a non-exists KTrigger.
     call_ktrigger("non_exists")
 
+    # Test: Progress events are coalesced.
+    class _ProgressKTrigger(IKernelTrigger):
+        events: list[tuple] = []
+
+        def on_progress(self, task_name, current, delta=False, more_data=None):
+            self.events.append((task_name, current, delta, more_data))
+
+    pkt = _ProgressKTrigger()
+    bind_ktrigger_interface("progress", pkt)
+    call_ktrigger(IKernelTrigger.on_new_task, task_name="t", task_type="", total=9)  # noqa: E501
+    for i in range(1, 6):
+        call_ktrigger(
+            IKernelTrigger.on_progress,
+            task_name="t",
+            current=1,
+            delta=True,
+            more_data={"i": i},
+        )
+    assert pkt.events == [("t", 1, True, {"i": 1, "merged": [{"i": 1}]})]
+    call_ktrigger(IKernelTrigger.on_progress, task_name="t", current=7)
+    call_ktrigger(IKernelTrigger.on_progress, task_name="t", current=1, delta=True)  # noqa: E501
+    call_ktrigger(IKernelTrigger.on_finish_task, task_name="t")
+    assert pkt.events[1][:3] == ("t", 8, False)
+    assert [data["i"] for data in pkt.events[1][3]["merged"]] == [2, 3, 4, 5]
+    assert len(pkt.events) == 2
+
+    # Test: The aggregator does not hold its lock while dispatching.
+    class _LockKTrigger(IKernelTrigger):
+        free: list[bool] = []
+
+        def on_progress(self, task_name, current, delta=False, more_data=None):
+            def _try_lock() -> None:
+                lock_ = progress._lock  # pylint: disable=protected-access
+                acquired = lock_.acquire(  # pylint: disable=consider-using-with  # noqa: E501
+                    timeout=1,
+                )
+                self.free.append(acquired)
+                if self.free[-1]:
+                    lock_.release()
+
+            thread_ = threading.Thread(target=_try_lock)
+            thread_.start()
+            thread_.join()
+
+    lkt = _LockKTrigger()
+    bind_ktrigger_interface("lock", lkt)
+    call_ktrigger(IKernelTrigger.on_new_task, task_name="l", task_type=0, total=1)  # noqa: E501
+    call_ktrigger(IKernelTrigger.on_progress, task_name="l", current=1)
+    call_ktrigger(IKernelTrigger.on_finish_task, task_name="l")
+    assert lkt.free == [True]
+
+    # Test: Asynchronous dispatch keeps the order of the KTriggers.
+    class _SlowKTrigger(IKernelTrigger):
+        events: list[str] = []
+
+        def on_output(self, msg: str) -> None:
+            time.sleep(0.05)
+            self.events.append(msg)
+
+        def file_exists(self, path: Path) -> None:
+            self.events.append(str(path))
+
+    skt = _SlowKTrigger()
+    bind_ktrigger_interface("slow", skt)
+    set_async_dispatch(True)
+    start = time.monotonic()
+    for i in range(5):
+        call_ktrigger(IKernelTrigger.on_output, msg=str(i))
+    assert time.monotonic() - start < 0.1
+    call_ktrigger(IKernelTrigger.file_exists, path=Path("x"))
+    assert skt.events == ["0", "1", "2", "3", "4", "x"]
+    call_ktrigger(IKernelTrigger.on_output, msg="5")
+    set_async_dispatch(False)
+    assert skt.events[-1] == "5"
+
+    # Test: Queued KTriggers get the time when they were called.
+    class _TimedKTrigger(IKernelTrigger):
+        stamps: list[float] = []
+
+        def on_warning(self, message: str) -> None:
+            self.stamps.append(ktrigger_time()[1])
+            time.sleep(0.05)
+
+    tkt = _TimedKTrigger()
+    bind_ktrigger_interface("timed", tkt)
+    set_async_dispatch(True)
+    start = time.monotonic()
+    for i in range(3):
+        call_ktrigger(IKernelTrigger.on_warning, message=str(i))
+    set_async_dispatch(False)
+    assert all(stamp_ - start < 0.05 for stamp_ in tkt.stamps)
+    assert abs(ktrigger_time()[1] - time.monotonic()) < 0.01
+
 
 # So, death is best?
 # Yes, death is a form of liberation.
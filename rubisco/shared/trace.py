@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+# -*- mode: python -*-
+# vi: set ft=python :
+
+# Copyright (C) 2024 The C++ Plus Project.
+# This file is part of the Rubisco.
+#
+# Rubisco is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Rubisco is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+JSON-lines trace of the kernel events.
+Every line is a JSON object with the wall time ("time"), the monotonic
+seconds since the trace is started ("clock"), the event name ("event") and
+the event data. Durations are in seconds.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from rubisco.config import DEFAULT_CHARSET
+from rubisco.lib.exceptions import RUValueException
+from rubisco.lib.l10n import _
+from rubisco.lib.variable import format_str, make_pretty
+from rubisco.shared.ktrigger import IKernelTrigger, ktrigger_time
+
+__all__ = ["TraceKTrigger", "open_trace", "summarize_trace"]
+
+
+def open_trace(dest: str) -> IO[str]:
+    """Open the trace output.
+
+    Args:
+        dest (str): A file path, or "fd:N" for a file descriptor.
+
+    Returns:
+        IO[str]: The opened trace output. It is line buffered.
+    """
+
+    if dest.startswith("fd:"):
+        try:
+            fd = int(dest[3:])
+        except ValueError as exc:
+            raise RUValueException(
+                format_str(
+                    _("Invalid trace file descriptor: '${{dest}}'."),
+                    fmt={"dest": dest},
+                ),
+            ) from exc
+        return os.fdopen(
+            fd,
+            "w",
+            buffering=1,
+            encoding=DEFAULT_CHARSET,
+            closefd=False,
+        )
+    return open(  # pylint: disable=consider-using-with
+        dest,
+        "w",
+        buffering=1,
+        encoding=DEFAULT_CHARSET,
+    )
+
+
+class TraceKTrigger(IKernelTrigger):  # pylint: disable=too-many-public-methods
+    """Write the kernel events to a JSON-lines trace."""
+
+    _file: IO[str]
+    _start: float
+    _lock: threading.Lock
+    _spans: dict[tuple[str, int | str], float]
+
+    def __init__(self, file: IO[str]) -> None:
+        """Create a trace writer.
+
+        Args:
+            file (IO[str]): The trace output.
+        """
+
+        self._file = file
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def _write(self, event: str, **data: Any) -> None:
+        wall, clock = ktrigger_time()  # The UI thread may dispatch it later.
+        record = {
+            "time": wall,
+            "clock": round(clock - self._start, 6),
+            "event": event,
+            **data,
+        }
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def _begin(self, kind: str, key: int | str) -> None:
+        clock = ktrigger_time()[1]
+        with self._lock:
+            self._spans[(kind, key)] = clock
+
+    def _end(self, kind: str, key: int | str) -> float | None:
+        with self._lock:
+            start = self._spans.pop((kind, key), None)
+        if start is None:
+            return None
+        return round(ktrigger_time()[1] - start, 6)
+
+    def pre_run_hook(self, hook: Any) -> None:
+        self._begin("hook", id(hook))
+        self._write("hook.start", hook=hook.name)
+
+    def post_run_hook(self, hook: Any) -> None:
+        self._write(
+            "hook.end",
+            hook=hook.name,
+            duration=self._end("hook", id(hook)),
+        )
+
+    def pre_run_workflow(self, workflow: Any) -> None:
+        self._begin("workflow", id(workflow))
+        self._write(
+            "workflow.start",
+            workflow=workflow.id,
+            name=workflow.name,
+        )
+
+    def post_run_workflow(self, workflow: Any) -> None:
+        self._write(
+            "workflow.end",
+            workflow=workflow.id,
+            name=workflow.name,
+            duration=self._end("workflow", id(workflow)),
+        )
+
+    def pre_run_workflow_step(self, step: Any) -> None:
+        self._write(
+            "step.start",
+            step=step.global_id,
+            name=step.name,
+            type=type(step).__name__,
+        )
+
+    def post_run_workflow_step(self, step: Any) -> None:
+        self._write(
+            "step.end",
+            step=step.global_id,
+            name=step.name,
+            type=type(step).__name__,
+            duration=round(step.duration, 6),
+        )
+
+    def on_skip_workflow_step(self, step: Any) -> None:
+        self._write("step.skip", step=step.global_id, name=step.name)
+
+    def pre_exec_process(self, proc: Any) -> None:
+        self._begin("process", id(proc))
+        self._write(
+            "process.start",
+            cmd=proc.origin_cmd,
+            cwd=str(proc.cwd),
+        )
+
+    def post_exec_process(
+        self,
+        proc: Any,
+        retcode: int,
+        raise_exc: bool,
+        usage: Any = None,
+    ) -> None:
+        self._write(
+            "process.end",
+            cmd=proc.origin_cmd,
+            retcode=retcode,
+            duration=self._end("process", id(proc)),
+            usage=usage.as_dict() if usage is not None else None,
+        )
+
+    def on_new_task(
+        self,
+        task_name: str,
+        task_type: int,
+        total: int | float,
+    ) -> None:
+        self._begin("task", task_name)
+        self._write("task.start", task=task_name, type=task_type, total=total)
+
+    def on_progress(
+        self,
+        task_name: str,
+        current: int | float,
+        delta: bool = False,
+        more_data: dict[str, Any] | None = None,
+    ) -> None:
+        self._write(
+            "task.progress",
+            task=task_name,
+            current=current,
+            delta=delta,
+        )
+
+    def on_finish_task(self, task_name: str) -> None:
+        self._write(
+            "task.end",
+            task=task_name,
+            duration=self._end("task", task_name),
+        )
+
+    def on_warning(self, message: str) -> None:
+        self._write("warning", message=message)
+
+    def on_error(self, message: str) -> None:
+        self._write("error", message=message)
+
+
+# The summary, key field and name field of the span events.
+_SPAN_KINDS = {
+    "hook": ("hooks", "hook", "hook"),
+    "workflow": ("workflows", "workflow", "name"),
+    "step": ("steps", "step", "name"),
+    "process": ("processes", "cmd", "cmd"),
+}
+
+
+def _read_trace(file: Path) -> Iterator[tuple[str, str, dict[str, Any]]]:
+    """Read the events of a trace.
+
+    Args:
+        file (Path): The trace file.
+
+    Yields:
+        tuple[str, str, dict[str, Any]]: The event kind, the event phase
+            and the record. The "clock" of the record is a float.
+
+    Raises:
+        RUValueException: If a line is not a valid event.
+    """
+
+    with file.open("r", encoding=DEFAULT_CHARSET) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                record["clock"] = float(record["clock"])
+                kind, _sep, phase = str(record["event"]).partition(".")
+            except (ValueError, KeyError, TypeError) as exc:
+                raise RUValueException(
+                    format_str(
+                        _(
+                            "Invalid trace line ${{line}} in "
+                            "'[underline]${{path}}[/underline]'."
+                        ),
+                        fmt={
+                            "line": str(line_no),
+                            "path": make_pretty(file.absolute()),
+                        },
+                    ),
+                ) from exc
+            yield kind, phase, record
+
+
+def _add_span(
+    entries: dict[str, dict[str, Any]],
+    key: str,
+    name: str,
+    duration: float,
+) -> None:
+    entry = entries.setdefault(
+        key,
+        {"key": key, "name": name, "count": 0, "total": 0.0, "max": 0.0},
+    )
+    entry["count"] += 1
+    entry["total"] += duration
+    entry["max"] = max(entry["max"], duration)
+
+
+def _summarize_spans(
+    events: Iterable[tuple[str, str, dict[str, Any]]],
+) -> dict[str, Any]:
+    """Aggregate the spans of the trace events.
+
+    Args:
+        events (Iterable[tuple[str, str, dict[str, Any]]]): The events
+            yielded by `_read_trace()`.
+
+    Returns:
+        dict[str, Any]: The summary. See `summarize_trace()`.
+    """
+
+    stats: dict[str, dict[str, dict[str, Any]]] = {
+        summary: {} for summary, _key, _name in _SPAN_KINDS.values()
+    }
+    started: dict[tuple[str, str], list[float]] = {}
+    clock = 0.0
+    for kind, phase, record in events:
+        clock = max(clock, record["clock"])
+        if kind not in _SPAN_KINDS:
+            continue
+        summary, key_field, name_field = _SPAN_KINDS[kind]
+        key = str(record.get(key_field))
+        if phase == "start":
+            started.setdefault((kind, key), []).append(record["clock"])
+        elif phase == "end":
+            starts = started.get((kind, key))
+            start = starts.pop() if starts else record["clock"]
+            duration = record.get("duration")
+            _add_span(
+                stats[summary],
+                key,
+                str(record.get(name_field)),
+                record["clock"] - start if duration is None else duration,
+            )
+
+    for (kind, key), starts in started.items():  # Unfinished spans.
+        for start in starts:
+            _add_span(stats[_SPAN_KINDS[kind][0]], key, key, clock - start)
+
+    return {
+        "wall": clock,
+        **{
+            summary: sorted(
+                entries.values(),
+                key=lambda entry: entry["total"],
+                reverse=True,
+            )
+            for summary, entries in stats.items()
+        },
+    }
+
+
+def summarize_trace(file: Path) -> dict[str, Any]:
+    """Summarize the wall time of a trace.
+
+    Spans which are not finished (e.g. failed) last until the last event.
+
+    Args:
+        file (Path): The trace file.
+
+    Returns:
+        dict[str, Any]: The total wall time ("wall"), and the "hooks",
+            "workflows", "steps" and "processes" summaries. Each summary is
+            a list of {"key", "name", "count", "total", "max"} sorted by
+            the total time.
+    """
+
+    return _summarize_spans(_read_trace(file))
+
+
+if __name__ == "__main__":
+    import io
+    import tempfile
+
+    import rich
+
+    rich.print(f"{__file__}: {__doc__.strip()}")
+
+    class _Named:  # pylint: disable=too-few-public-methods
+        def __init__(self, **kwargs) -> None:
+            self.__dict__.update(kwargs)
+
+    buffer = io.StringIO()
+    tracer = TraceKTrigger(buffer)
+    hook_ = _Named(name="build")
+    step_ = _Named(global_id="wf.s1", name="Compile", duration=0.25)
+    proc_ = _Named(origin_cmd="make", cwd=Path("."))
+    tracer.pre_run_hook(hook_)
+    tracer.pre_run_workflow_step(step_)
+    tracer.pre_exec_process(proc_)
+    time.sleep(0.01)
+    tracer.post_exec_process(proc_, 0, False)
+    tracer.post_run_workflow_step(step_)
+    tracer.pre_run_workflow_step(_Named(global_id="wf.s2", name="Fail"))
+    tracer.on_error("Failed.")
+    lines = buffer.getvalue().splitlines()
+    assert [json.loads(line)["event"] for line in lines] == [
+        "hook.start",
+        "step.start",
+        "process.start",
+        "process.end",
+        "step.end",
+        "step.start",
+        "error",
+    ]
+
+    with tempfile.TemporaryDirectory() as temp:
+        trace_file = Path(temp) / "trace.jsonl"
+        trace_file.write_text(buffer.getvalue(), encoding=DEFAULT_CHARSET)
+        summary_ = summarize_trace(trace_file)
+        assert summary_["steps"][0]["key"] == "wf.s1"
+        assert summary_["steps"][0]["total"] == 0.25
+        assert summary_["processes"][0]["total"] >= 0.01
+        # Unfinished spans last until the last event.
+        first_clock = json.loads(lines[0])["clock"]
+        assert (
+            abs(summary_["hooks"][0]["total"] - summary_["wall"] + first_clock)
+            < 1e-6
+        )
+        assert {step["key"] for step in summary_["steps"]} == {
+            "wf.s1",
+            "wf.s2",
+        }